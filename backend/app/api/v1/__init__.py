@@ -1,8 +1,12 @@
 from fastapi import APIRouter
 
-from app.api.v1 import auth, chat
+from app.api.v1 import auth, chat, decisions, destinations, diagnostics, users
 
 api_router = APIRouter()
 
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
-api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
\ No newline at end of file
+api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
+api_router.include_router(decisions.router, prefix="/decisions", tags=["decisions"])
+api_router.include_router(destinations.router, prefix="/destinations", tags=["destinations"])
+api_router.include_router(diagnostics.router, prefix="/diagnostics", tags=["diagnostics"])
+api_router.include_router(users.router, prefix="/users", tags=["users"])
\ No newline at end of file
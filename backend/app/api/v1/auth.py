@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 from app.core.database import get_db
 from app.schemas.user import Token, User
-from app.services.auth import AuthService
+from app.services.auth import AuthService, google_oauth
 from app.api.deps import get_current_user
 
 router = APIRouter()
@@ -14,8 +14,7 @@ router = APIRouter()
 @router.get("/login/google")
 async def google_login():
     """Initiate Google OAuth login."""
-    auth_service = AuthService(None)  # No DB needed for this
-    auth_url = auth_service.google_oauth.get_authorization_url()
+    auth_url = await google_oauth.get_authorization_url()
     return {"auth_url": auth_url}
 
 
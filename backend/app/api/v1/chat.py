@@ -1,27 +1,45 @@
-from typing import Optional
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update
 
 from app.core.database import get_async_session
 from app.api.deps import get_current_user
-from app.models import User, Conversation, Message, ConversationState, MessageRole
+from app.models import User, Conversation
 from app.schemas.conversation import (
     ConversationCreate,
     ConversationUpdate,
     Conversation as ConversationSchema,
     ConversationWithMessages,
+    ConversationFork,
     MessageCreate,
     Message as MessageSchema,
     ChatRequest,
     ChatResponse,
+    MessageSearchResults,
+)
+from app.services.chat import ChatService, InvalidCursor, InvalidForkPoint, TurnBudget
+from app.services.chat_socket import ChatSocketSession
+from app.services.idempotency import (
+    IdempotencyConflict,
+    IdempotencyKeyReused,
+    fingerprint,
+    idempotency_store,
 )
 
 router = APIRouter()
 
+# Optional parts of a message, requested with `include` (comma-separated)
+MESSAGE_INCLUDES = {"metadata"}
+
+DISCONNECT_POLL_SECONDS = 0.5
+# Not sent to anyone; recorded so abandoned turns show up in request metrics
+CLIENT_CLOSED_REQUEST = 499
+
 
 @router.get("/conversations", response_model=list[ConversationSchema])
 async def list_conversations(
@@ -31,29 +49,59 @@ async def list_conversations(
     """List all conversations for the current user."""
     result = await db.execute(
         select(Conversation)
-        .where(Conversation.user_id == current_user.id)
+        .where(
+            Conversation.user_id == current_user.id,
+            Conversation.deleted_at.is_(None)
+        )
         .order_by(Conversation.updated_at.desc())
     )
     conversations = result.scalars().all()
-    return conversations
+    await ChatService(db).resolve_contexts([c for c in conversations if c.context is None])
+    return [ConversationSchema(**_conversation_fields(conversation)) for conversation in conversations]
 
 
 @router.get("/conversations/{conversation_id}", response_model=ConversationWithMessages)
 async def get_conversation(
     conversation_id: UUID,
+    include: Optional[str] = Query(None, max_length=100),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_async_session),
 ):
-    """Get a specific conversation with messages."""
-    result = await db.execute(
-        select(Conversation)
-        .where(
-            Conversation.id == conversation_id,
-            Conversation.user_id == current_user.id
+    """Get a specific conversation with messages (including those inherited by a fork).
+    
+    Messages come without their LLM metadata unless `include=metadata`.
+    """
+    includes = _parse_include(include)
+    chat_service = ChatService(db)
+    conversation = await chat_service.get_conversation(current_user.id, conversation_id)
+    
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
         )
-        .options(selectinload(Conversation.messages))
+    
+    history = await chat_service.get_history(conversation)
+    metadata = await chat_service.get_metadata(history) if "metadata" in includes else {}
+    return ConversationWithMessages(
+        **_conversation_fields(conversation),
+        messages=[
+            MessageSchema.from_model(message, llm_metadata=metadata.get(message.id))
+            for message in history
+        ]
     )
-    conversation = result.scalar_one_or_none()
+
+
+@router.post("/conversations/{conversation_id}/fork", response_model=ConversationSchema)
+async def fork_conversation(
+    conversation_id: UUID,
+    fork_data: ConversationFork,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """Branch a conversation at a message without copying its history."""
+    chat_service = ChatService(db)
+    conversation = await chat_service.get_conversation(current_user.id, conversation_id)
     
     if not conversation:
         raise HTTPException(
@@ -61,7 +109,16 @@ async def get_conversation(
             detail="Conversation not found"
         )
     
-    return conversation
+    try:
+        fork = await chat_service.fork_conversation(conversation, fork_data.message_id)
+    except InvalidForkPoint:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Message not found in conversation"
+        )
+    
+    await db.commit()
+    return ConversationSchema(**_conversation_fields(fork))
 
 
 @router.post("/conversations", response_model=ConversationSchema)
@@ -78,7 +135,7 @@ async def create_conversation(
     db.add(conversation)
     await db.commit()
     await db.refresh(conversation)
-    return conversation
+    return ConversationSchema(**_conversation_fields(conversation))
 
 
 @router.patch("/conversations/{conversation_id}", response_model=ConversationSchema)
@@ -89,14 +146,8 @@ async def update_conversation(
     db: AsyncSession = Depends(get_async_session),
 ):
     """Update a conversation."""
-    result = await db.execute(
-        select(Conversation)
-        .where(
-            Conversation.id == conversation_id,
-            Conversation.user_id == current_user.id
-        )
-    )
-    conversation = result.scalar_one_or_none()
+    chat_service = ChatService(db)
+    conversation = await chat_service.get_conversation(current_user.id, conversation_id)
     
     if not conversation:
         raise HTTPException(
@@ -105,148 +156,144 @@ async def update_conversation(
         )
     
     update_dict = update_data.dict(exclude_unset=True)
+    if "context" in update_dict:
+        await chat_service.set_context(conversation, update_dict.pop("context") or {})
     for field, value in update_dict.items():
         setattr(conversation, field, value)
     
     await db.commit()
     await db.refresh(conversation)
-    return conversation
+    if conversation.context is None:
+        await chat_service.resolve_context(conversation)
+    return ConversationSchema(**_conversation_fields(conversation))
+
+
+def _parse_include(include: Optional[str]) -> set:
+    includes = {part.strip() for part in (include or "").split(",") if part.strip()}
+    unknown = includes - MESSAGE_INCLUDES
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown include: {', '.join(sorted(unknown))}"
+        )
+    return includes
+
+
+def _conversation_fields(conversation: Conversation) -> dict:
+    """Column values for the conversation schemas, without touching the lazy `messages`."""
+    return {
+        field: getattr(conversation, field)
+        for field in ConversationSchema.model_fields
+        if field != "messages"
+    }
+
+
+@router.get("/search", response_model=MessageSearchResults)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, max_length=200),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """Full-text search across the current user's messages."""
+    try:
+        return await ChatService(db).search_messages(current_user.id, q, limit, cursor)
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
 
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
+    http_request: Request,
+    include: Optional[str] = Query(None, max_length=100),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_async_session),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
 ):
-    """Send a message and get a response."""
-    # Get or create conversation
-    if request.conversation_id:
-        result = await db.execute(
-            select(Conversation)
-            .where(
-                Conversation.id == request.conversation_id,
-                Conversation.user_id == current_user.id
+    """Send a message and get a response.
+    
+    Retries that repeat the `Idempotency-Key` header get the original
+    response back instead of running the turn again. The turn is cancelled
+    if the client disconnects, and answered with a templated reply if it
+    runs past `CHAT_TURN_BUDGET_SECONDS`. The reply's LLM metadata is only
+    returned with `include=metadata`.
+    """
+    include_metadata = "metadata" in _parse_include(include)
+    budget = TurnBudget()
+    
+    async def run_turn() -> dict:
+        chat_service = ChatService(db)
+        
+        # Get or create conversation
+        if request.conversation_id:
+            conversation = await chat_service.get_conversation(
+                current_user.id,
+                request.conversation_id
             )
+            
+            if not conversation:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Conversation not found"
+                )
+        else:
+            conversation = await chat_service.create_conversation(current_user.id)
+        
+        response = await chat_service.process_message(
+            conversation,
+            request.message,
+            budget=budget,
+            include_metadata=include_metadata
         )
-        conversation = result.scalar_one_or_none()
+        return response.model_dump(mode="json")
+    
+    async def respond() -> dict:
+        if idempotency_key is None:
+            return await run_turn()
         
-        if not conversation:
+        try:
+            return await idempotency_store.run(
+                f"idempotency:chat:{current_user.id}:{idempotency_key}",
+                fingerprint(request.model_dump(mode="json")),
+                run_turn
+            )
+        except IdempotencyKeyReused:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Conversation not found"
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
             )
-    else:
-        # Create new conversation
-        conversation = Conversation(
-            user_id=current_user.id,
-            state=ConversationState.INITIAL_INTENT,
-            context={}
-        )
-        db.add(conversation)
-        await db.flush()
-    
-    # Add user message
-    user_message = Message(
-        conversation_id=conversation.id,
-        role=MessageRole.USER,
-        content=request.message,
-        llm_metadata={}
-    )
-    db.add(user_message)
-    await db.flush()
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     
-    # TODO: Process message with AI and get response
-    # For now, return a mock response
-    assistant_response = await _generate_mock_response(
-        conversation, 
-        request.message
-    )
-    
-    # Add assistant message
-    assistant_message = Message(
-        conversation_id=conversation.id,
-        role=MessageRole.ASSISTANT,
-        content=assistant_response["content"],
-        llm_metadata=assistant_response.get("metadata", {})
-    )
-    db.add(assistant_message)
-    
-    # Update conversation state if needed
-    if assistant_response.get("new_state"):
-        conversation.state = assistant_response["new_state"]
-    
-    if assistant_response.get("context_update"):
-        conversation.context.update(assistant_response["context_update"])
-    
-    await db.commit()
-    await db.refresh(assistant_message)
-    await db.refresh(conversation)
-    
-    return ChatResponse(
-        conversation_id=conversation.id,
-        message=assistant_message,
-        state=conversation.state,
-        context=conversation.context
-    )
+    return await _cancel_on_disconnect(http_request, respond())
 
 
-async def _generate_mock_response(conversation: Conversation, user_message: str):
-    """Generate a mock AI response based on conversation state."""
-    
-    if conversation.state == ConversationState.INITIAL_INTENT:
-        return {
-            "content": (
-                "I'd love to help you plan your trip! To get started, could you tell me:\n\n"
-                "• Where are you thinking of going?\n"
-                "• When would you like to travel?\n"
-                "• Who's going with you?\n\n"
-                "This will help me understand what kind of experience you're looking for!"
-            ),
-            "new_state": ConversationState.GATHERING_CONTEXT,
-            "context_update": {"started": True},
-            "metadata": {"model": "mock", "tokens": 0}
-        }
-    
-    elif conversation.state == ConversationState.GATHERING_CONTEXT:
-        return {
-            "content": (
-                "Great! That sounds wonderful. Let me ask a few more questions to better understand your preferences:\n\n"
-                "• What's your approximate budget for this trip?\n"
-                "• Are you more interested in relaxation or adventure?\n"
-                "• Any specific activities or experiences you're hoping for?\n"
-                "• Are there any dietary restrictions or accessibility needs I should know about?"
-            ),
-            "new_state": ConversationState.REFINING_PREFERENCES,
-            "context_update": {"gathering_preferences": True},
-            "metadata": {"model": "mock", "tokens": 0}
-        }
-    
-    elif conversation.state == ConversationState.REFINING_PREFERENCES:
-        return {
-            "content": (
-                "Perfect! Based on what you've told me, I have some great ideas for your trip. "
-                "Let me put together a few options that match your preferences.\n\n"
-                "I'll include:\n"
-                "• Recommended accommodations\n"
-                "• Must-see attractions and hidden gems\n"
-                "• Restaurant suggestions\n"
-                "• A rough itinerary\n\n"
-                "Give me just a moment to prepare these options for you..."
-            ),
-            "new_state": ConversationState.PRESENTING_OPTIONS,
-            "context_update": {"ready_for_options": True},
-            "metadata": {"model": "mock", "tokens": 0}
-        }
-    
-    else:
-        return {
-            "content": (
-                "I understand! Let me help you with that. "
-                "Could you provide more details about what you're looking for?"
-            ),
-            "metadata": {"model": "mock", "tokens": 0}
-        }
+async def _cancel_on_disconnect(http_request: Request, work: Awaitable):
+    """Await `work`, cancelling it if the client goes away first."""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                return Response(status_code=CLIENT_CLOSED_REQUEST)
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """Persistent chat channel: authenticate once, then stream turns for any conversation."""
+    await ChatSocketSession(websocket).run()
 
 
 @router.delete("/conversations/{conversation_id}")
@@ -255,23 +302,24 @@ async def delete_conversation(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_async_session),
 ):
-    """Delete a conversation."""
+    """Soft-delete a conversation; its rows are purged in the background."""
     result = await db.execute(
-        select(Conversation)
+        update(Conversation)
         .where(
             Conversation.id == conversation_id,
-            Conversation.user_id == current_user.id
+            Conversation.user_id == current_user.id,
+            Conversation.deleted_at.is_(None)
         )
+        .values(deleted_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
     )
-    conversation = result.scalar_one_or_none()
     
-    if not conversation:
+    if result.rowcount == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
     
-    await db.delete(conversation)
     await db.commit()
     
     return {"message": "Conversation deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_current_user
+from app.core.database import get_async_session
+from app.models import Trip, User
+from app.schemas.decision import ComponentDecisionCreate
+from app.schemas.ranking import PreferenceWeights
+from app.services.decisions import decision_recorder, preference_cache
+
+router = APIRouter()
+
+
+@router.post("", status_code=status.HTTP_204_NO_CONTENT)
+async def record_decision(
+    decision: ComponentDecisionCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """Record a chosen, vetoed or considering decision on a trip component."""
+    if decision.trip_id is not None:
+        owner = await db.scalar(select(Trip.user_id).where(Trip.id == decision.trip_id))
+        if owner != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Trip not found"
+            )
+    # Release the connection (also used to load the user) while the decision waits for its batch
+    await db.commit()
+
+    await decision_recorder.record(
+        user_id=current_user.id,
+        component_id=decision.component_id,
+        decision=decision.decision,
+        tags=decision.tags,
+        price_level=decision.price_level,
+        time_slot=decision.time_slot,
+        trip_id=decision.trip_id,
+        reason=decision.reason
+    )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/weights", response_model=PreferenceWeights)
+async def get_preference_weights(
+    current_user: User = Depends(get_current_user),
+):
+    """Preference weights learned from the current user's decisions, as used for ranking."""
+    return await preference_cache.get(current_user.id)
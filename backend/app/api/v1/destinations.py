@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Query
+
+from app.schemas.destination import DestinationSearchResult
+from app.services.destinations import destination_catalog
+
+router = APIRouter()
+
+
+@router.get("/search", response_model=list[DestinationSearchResult])
+async def search_destinations(
+    q: str = Query(..., min_length=1, max_length=100, description="Search text"),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Typeahead search over the in-memory destination catalog."""
+    return destination_catalog.search(q, limit)
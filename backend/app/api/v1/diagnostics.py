@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_current_active_superuser
+from app.core.config import settings
+from app.core.database import get_async_session
+from app.core.profiler import PROFILE_TOKEN_HEADER, PROFILE_TOKEN_SCOPE, sample_worker
+from app.core.query_monitor import query_monitor
+from app.core.security import create_access_token
+from app.models import User
+from app.schemas.diagnostics import ProfileToken, QueryReport
+
+router = APIRouter()
+
+
+def _require_query_monitor() -> None:
+    if not settings.QUERY_MONITOR_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Query monitor is not enabled"
+        )
+
+
+@router.get("/queries", response_model=QueryReport)
+async def get_queries(
+    order_by: Literal["total_ms", "mean_ms", "max_ms", "p95_ms", "calls", "slow_calls"] = Query("total_ms"),
+    limit: int = Query(20, ge=1, le=500),
+    current_user: User = Depends(get_current_active_superuser),
+):
+    """Statement fingerprints seen by this worker, worst first (superusers only)."""
+    _require_query_monitor()
+    return query_monitor.report(order_by, limit)
+
+
+@router.post("/queries/explain", response_model=QueryReport)
+async def explain_queries(
+    current_user: User = Depends(get_current_active_superuser),
+):
+    """Sample plans for the worst statements now instead of waiting for the next run."""
+    _require_query_monitor()
+    await query_monitor.explain_worst()
+    return query_monitor.report("total_ms", query_monitor.explain_top)
+
+
+@router.delete("/queries", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_queries(
+    current_user: User = Depends(get_current_active_superuser),
+):
+    """Start collecting from scratch on this worker."""
+    _require_query_monitor()
+    query_monitor.reset()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+def _require_profiler() -> None:
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profiler is not enabled"
+        )
+
+
+@router.post("/profile", response_class=Response)
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=settings.PROFILER_MAX_SECONDS),
+    format: Literal["collapsed", "json"] = Query("collapsed"),
+    interval_ms: float = Query(settings.PROFILER_SAMPLE_INTERVAL_MS, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_superuser),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """Sample this worker's stacks and await chains for `seconds` (superusers only).
+    
+    `collapsed` is one `frame;frame;frame count` line per stack, as read by
+    flamegraph.pl and speedscope; `json` is a d3-flame-graph tree.
+    """
+    _require_profiler()
+    # Don't hold a pooled connection while sampling
+    await db.commit()
+    profile = await sample_worker(seconds, interval_ms / 1000)
+    body, media_type = profile.render(format)
+    return Response(content=body, media_type=media_type)
+
+
+@router.post("/profile/token", response_model=ProfileToken)
+async def create_profile_token(
+    current_user: User = Depends(get_current_active_superuser),
+):
+    """Token that profiles a single request when sent as `X-Profile-Token` (superusers only)."""
+    _require_profiler()
+    expires_delta = timedelta(minutes=settings.PROFILE_TOKEN_EXPIRE_MINUTES)
+    return ProfileToken(
+        token=create_access_token(
+            {"sub": str(current_user.id), "scope": PROFILE_TOKEN_SCOPE},
+            expires_delta=expires_delta
+        ),
+        header=PROFILE_TOKEN_HEADER.decode(),
+        expires_at=datetime.utcnow() + expires_delta
+    )
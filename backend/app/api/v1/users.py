@@ -0,0 +1,66 @@
+from datetime import date, datetime, timedelta
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_current_active_superuser, get_current_user
+from app.core.database import get_async_session
+from app.models import User
+from app.schemas.usage import UsageAggregate, UsageAggregateRow, UsageDay, UsageReport
+from app.services.usage import UsageService
+
+router = APIRouter()
+
+DEFAULT_USAGE_DAYS = 30
+MAX_USAGE_DAYS = 366
+
+
+def _date_range(start: Optional[date], end: Optional[date]) -> tuple[date, date]:
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=DEFAULT_USAGE_DAYS - 1)
+    if start > end or (end - start).days >= MAX_USAGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range must be between 1 and {MAX_USAGE_DAYS} days"
+        )
+    return start, end
+
+
+@router.get("/usage", response_model=UsageReport)
+async def get_usage(
+    start: Optional[date] = Query(None, description="First day (default: 30 days before end)"),
+    end: Optional[date] = Query(None, description="Last day, inclusive (default: today, UTC)"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """Token usage and cost per day and model for the current user."""
+    start, end = _date_range(start, end)
+    rows = await UsageService(db).get_daily(current_user.id, start, end)
+    return UsageReport(
+        start=start,
+        end=end,
+        days=[UsageDay.model_validate(row) for row in rows],
+        prompt_tokens=sum(row.prompt_tokens for row in rows),
+        completion_tokens=sum(row.completion_tokens for row in rows),
+        cost_usd=sum((row.cost_usd for row in rows), 0)
+    )
+
+
+@router.get("/usage/aggregate", response_model=UsageAggregate)
+async def get_usage_aggregate(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    group_by: Literal["day", "model", "user"] = Query("day"),
+    current_user: User = Depends(get_current_active_superuser),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """Usage totals across all users (superusers only)."""
+    start, end = _date_range(start, end)
+    rows = await UsageService(db).aggregate(start, end, group_by)
+    return UsageAggregate(
+        start=start,
+        end=end,
+        group_by=group_by,
+        rows=[UsageAggregateRow(**{**row, "key": str(row["key"])}) for row in rows]
+    )
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -14,15 +14,133 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
     
     # Google OAuth
     GOOGLE_CLIENT_ID: str
     GOOGLE_CLIENT_SECRET: str
     GOOGLE_REDIRECT_URI: str
+    GOOGLE_DISCOVERY_URL: str = "https://accounts.google.com/.well-known/openid-configuration"
+    GOOGLE_OIDC_CACHE_SECONDS: int = 3600
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
     
+    # Tool execution
+    TOOL_CALL_DEADLINE_SECONDS: float = 8.0
+    TOOL_CACHE_TTL_SECONDS: int = 300
+    TOOL_CACHE_MAX_ENTRIES: int = 1024
+    
+    # External provider cache (weather, availability, pricing)
+    PROVIDER_CACHE_MAX_ENTRIES: int = 10000
+    # Also share entries between workers through REDIS_URL
+    PROVIDER_CACHE_USE_REDIS: bool = False
+    
+    # Destination search
+    DESTINATION_CATALOG_PATH: str = "data/destinations.json"
+    DESTINATION_RELOAD_INTERVAL_SECONDS: float = 5.0
+    
+    # Itinerary planning
+    ITINERARY_TRAVEL_SPEED_KMH: float = 25.0
+    ITINERARY_DAY_START: str = "09:00"
+    
+    # Viability checks for in-progress trips
+    VIABILITY_CHECK_INTERVAL_SECONDS: int = 900  # 0 disables the scheduler
+    VIABILITY_BATCH_SIZE: int = 200
+    # A worker that dies mid-batch releases its trips when the lease runs out
+    VIABILITY_LEASE_SECONDS: int = 300
+    VIABILITY_HORIZON_DAYS: int = 2
+    VIABILITY_CHECK_CONCURRENCY: int = 16
+    
+    # Component decisions and learned preferences
+    # Decisions arriving within this window are written in one batch
+    DECISION_FLUSH_INTERVAL_SECONDS: float = 0.05
+    DECISION_BATCH_SIZE: int = 500
+    PREFERENCE_CACHE_TTL_SECONDS: int = 60
+    PREFERENCE_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Conversation purge
+    CONVERSATION_PURGE_INTERVAL_SECONDS: int = 300  # 0 disables the background purge
+    CONVERSATION_PURGE_BATCH_SIZE: int = 1000
+    
+    # Message partitions and cold archive
+    MESSAGE_ARCHIVE_INTERVAL_SECONDS: int = 86400  # 0 disables archiving and partition upkeep
+    # Months that ended longer ago than this are exported and detached
+    MESSAGE_RETENTION_MONTHS: int = 12
+    # Gzipped JSONL files, one per archived month. Archiving is off until this is
+    # set; it must be an absolute path on storage shared by every worker
+    MESSAGE_ARCHIVE_DIR: str = ""
+    # Monthly partitions kept created ahead of the current month
+    MESSAGE_PARTITION_MONTHS_AHEAD: int = 3
+    # Rehydrated conversations are dropped from the table again after this long
+    MESSAGE_REHYDRATED_TTL_DAYS: int = 7
+    
+    # Message traces (LLM metadata beyond the summary kept on the message)
+    # Traces larger than this are stored zlib-compressed
+    MESSAGE_TRACE_COMPRESS_BYTES: int = 1024
+    
+    # Chat turns
+    # Generation past this budget is cancelled and a templated reply is sent instead
+    CHAT_TURN_BUDGET_SECONDS: float = 20.0
+    
+    # Model call scheduling
+    LLM_MAX_CONCURRENCY: int = 16
+    # Slots only interactive turns may use
+    LLM_INTERACTIVE_RESERVED_SLOTS: int = 4
+    LLM_TOKENS_PER_MINUTE: int = 1_000_000
+    # Share of the token budget only interactive turns may use
+    LLM_INTERACTIVE_TOKEN_RESERVE: float = 0.2
+    # Charged per turn up front and settled against the tokens actually used
+    LLM_TURN_TOKEN_ESTIMATE: int = 1500
+    LLM_MAX_PREEMPTIONS: int = 3
+    
+    # Starter prompts (the openers offered by the frontend's StarterPrompts)
+    STARTER_PROMPTS: List[str] = [
+        "I'd like to plan a relaxing beach vacation for 7 days with my family",
+        "I'm looking for an adventurous trip with hiking and outdoor activities",
+        "I want to explore historical sites and immerse myself in local culture",
+        "I'm interested in a culinary journey with great restaurants and wine tasting",
+    ]
+    STARTER_WARMUP_INTERVAL_SECONDS: int = 3600  # 0 disables the warm-up
+    # Must outlast the warm-up interval so replies never lapse between runs
+    STARTER_REPLY_TTL_SECONDS: int = 86400
+    STARTER_REPLY_USE_REDIS: bool = False
+    # Bump when reply generation prompts change; cached replies from other versions are ignored
+    PROMPT_TEMPLATE_VERSION: str = "1"
+    
+    # Chat WebSocket
+    WS_HEARTBEAT_SECONDS: float = 25.0
+    WS_IDLE_TIMEOUT_SECONDS: float = 300.0
+    WS_MAX_INFLIGHT_TURNS: int = 4
+    WS_SEND_QUEUE_SIZE: int = 64
+    
+    # Idempotency keys (POST /chat)
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 86400
+    # How long a claimed key may stay pending; must outlast a chat turn
+    IDEMPOTENCY_PENDING_TTL_SECONDS: int = 60
+    # Share keys between workers through REDIS_URL; otherwise they live in process memory
+    IDEMPOTENCY_USE_REDIS: bool = False
+    
+    # Query monitor (per-statement latency, slow query log, sampled plans)
+    QUERY_MONITOR_ENABLED: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    QUERY_MONITOR_MAX_FINGERPRINTS: int = 2000
+    # How often the statements with the most total time are re-run under EXPLAIN ANALYZE
+    QUERY_EXPLAIN_INTERVAL_SECONDS: int = 300  # 0 disables plan sampling
+    QUERY_EXPLAIN_TOP: int = 5
+    QUERY_EXPLAIN_TIMEOUT_MS: int = 5000
+    
+    # Sampling profiler (diagnostics routes, X-Profile-Token requests)
+    PROFILER_ENABLED: bool = True
+    PROFILER_SAMPLE_INTERVAL_MS: float = 5.0
+    PROFILER_MAX_SECONDS: int = 60
+    PROFILE_TOKEN_EXPIRE_MINUTES: int = 10
+    
+    # Metrics
+    # Shared directory for multi-worker metrics; must be emptied before the workers start
+    PROMETHEUS_MULTIPROC_DIR: Optional[str] = None
+    
     # CORS
     FRONTEND_URL: str
     
@@ -1,23 +1,68 @@
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.core.query_monitor import query_monitor
 
-# Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.ENVIRONMENT == "development",
-    future=True
-)
+_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[sessionmaker] = None
 
-# Create async session factory
-async_session = sessionmaker(
-    engine, 
-    class_=AsyncSession, 
-    expire_on_commit=False
-)
+
+def get_engine() -> AsyncEngine:
+    """Create the async engine on first use."""
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            settings.DATABASE_URL,
+            echo=settings.ENVIRONMENT == "development",
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            future=True
+        )
+        instrument_engine(_engine)
+        if settings.QUERY_MONITOR_ENABLED:
+            query_monitor.attach(_engine)
+    return _engine
+
+
+def async_session() -> AsyncSession:
+    """Open a new session on the shared engine."""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(
+            get_engine(),
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+    return _session_factory()
+
+
+async def warm_pool(connections: int = settings.DB_POOL_SIZE) -> None:
+    """Open pool connections up front so the first requests skip connection setup."""
+    engine = get_engine()
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = await engine.connect()
+            opened.append(connection)
+            await connection.execute(text("SELECT 1"))
+    finally:
+        for connection in opened:
+            await connection.close()
+
+
+async def dispose_engine() -> None:
+    """Close every pooled connection."""
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = None
+    _session_factory = None
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -34,4 +79,4 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 
 # Alias for consistency
-get_async_session = get_db
\ No newline at end of file
+get_async_session = get_db
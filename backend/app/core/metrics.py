@@ -0,0 +1,218 @@
+"""Prometheus metrics.
+
+With several uvicorn workers each process keeps its own counters, so a
+scrape would only see whichever worker answered it. When
+`PROMETHEUS_MULTIPROC_DIR` is set, every process writes its samples to
+memory-mapped files in that directory and `/metrics` aggregates all of
+them. The directory must exist and be emptied before the workers start.
+"""
+import os
+import time
+
+from app.core.config import settings
+
+# prometheus_client picks its storage backend from the environment when the
+# first metric is created, so the setting has to be exported before import
+if settings.PROMETHEUS_MULTIPROC_DIR:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.PROMETHEUS_MULTIPROC_DIR)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncEngine  # noqa: E402
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"],
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Open database connections held by the pool.",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Database connections currently checked out of the pool.",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts",
+    "Connections handed out by the pool.",
+)
+DB_SLOW_QUERIES = Counter(
+    "db_slow_queries",
+    "Statements slower than SLOW_QUERY_THRESHOLD_MS, by the route that ran them.",
+    ["route"],
+)
+
+CHAT_TURNS = Counter(
+    "chat_turns",
+    "Chat turns processed, by conversation state at the start of the turn.",
+    ["state"],
+)
+CHAT_GENERATION_LATENCY = Histogram(
+    "chat_generation_duration_seconds",
+    "Time to generate an assistant reply.",
+    ["state"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+CHAT_DEGRADED_REPLIES = Counter(
+    "chat_degraded_replies",
+    "Turns answered with a templated reply instead of a generated one.",
+    ["state", "reason"],
+)
+CHAT_GENERATION_TOKENS = Counter(
+    "chat_generation_tokens",
+    "Tokens reported by the model for generated replies.",
+    ["state"],
+)
+
+VIABILITY_TRIPS_CHECKED = Counter(
+    "viability_trips_checked",
+    "In-progress trips checked by the viability scheduler.",
+)
+VIABILITY_COMPONENTS_CHECKED = Counter(
+    "viability_components_checked",
+    "Planned components checked against current conditions.",
+)
+VIABILITY_CONDITION_CHECKS = Counter(
+    "viability_condition_checks",
+    "Condition lookups, one per provider, location and date in a batch.",
+    ["provider", "result"],
+)
+VIABILITY_ADAPTATIONS = Counter(
+    "viability_adaptations",
+    "Components flagged as unviable, by the provider that flagged them.",
+    ["provider"],
+)
+VIABILITY_BATCH_LATENCY = Histogram(
+    "viability_batch_duration_seconds",
+    "Time to check and write one batch of trips.",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+VIABILITY_LAST_PASS = Gauge(
+    "viability_last_pass_timestamp_seconds",
+    "When a viability pass last completed.",
+    multiprocess_mode="max",
+)
+
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_queue_depth",
+    "Model calls waiting for admission, by priority class.",
+    ["priority"],
+    multiprocess_mode="livesum",
+)
+LLM_IN_FLIGHT = Gauge(
+    "llm_in_flight",
+    "Model calls running, by priority class.",
+    ["priority"],
+    multiprocess_mode="livesum",
+)
+LLM_QUEUE_WAIT = Histogram(
+    "llm_queue_wait_seconds",
+    "Time a model call waited for admission.",
+    ["priority"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+LLM_PREEMPTIONS = Counter(
+    "llm_preemptions",
+    "Lower-priority model calls cancelled to make room for interactive turns.",
+    ["priority"],
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests",
+    "Cache lookups by cache and result (hit or miss).",
+    ["cache", "result"],
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count one cache lookup."""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Track pool usage through pool events."""
+    pool = engine.sync_engine.pool
+
+    @event.listens_for(pool, "connect")
+    def _connect(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS.inc()
+
+    @event.listens_for(pool, "close")
+    def _close(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS.dec()
+
+    @event.listens_for(pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+        DB_POOL_CHECKOUTS.inc()
+
+    @event.listens_for(pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Return the exposition payload and its content type."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Drop this worker's live gauges from the aggregate when it exits."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """Record request latency labelled by route template.
+
+    The template (`/api/v1/chat/conversations/{conversation_id}`) rather than
+    the raw path keeps label cardinality bounded; requests that match no
+    route are counted as `unmatched`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method=scope["method"],
+                route=getattr(route, "path_format", None) or "unmatched",
+                status=str(status),
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,315 @@
+"""Sampling profiler for a running worker.
+
+A background thread wakes every few milliseconds and records two kinds of
+stacks, as counts per collapsed stack (`frame;frame;frame`):
+
+- `[running]`: what the event loop thread is executing, from the task or
+  callback being run down to the innermost frame. Samples taken while the
+  loop waits in `select` count as `[idle]`.
+- `[awaiting]`: for every other task, its await chain, i.e. the coroutine
+  the task started with and each coroutine it is suspended in down to the
+  future it waits for. This is what attributes wall-clock time to, say, the
+  `llm_scheduler.run` inside a chat turn rather than to the loop being idle.
+
+Output is collapsed stacks (`flamegraph.pl`, speedscope) or the nested
+`{name, value, children}` tree used by d3-flame-graph.
+
+A whole worker is sampled with `sample_worker`; a single request is
+sampled by `ProfileRequestMiddleware` when it carries a profiling token,
+counting only the request's task and the tasks it creates.
+"""
+import asyncio
+import contextvars
+import json
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core.security import verify_token
+
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+PROFILE_FORMAT_HEADER = b"x-profile-format"
+PROFILE_TOKEN_SCOPE = "profile"
+FORMATS = ("collapsed", "json")
+
+# Frames of the loop machinery above the callback or task step being run
+_LOOP_FRAME = ("asyncio.events", "Handle._run")
+# Tasks of the request being profiled in this context, if any
+_profiled_tasks: contextvars.ContextVar[Optional[weakref.WeakSet]] = contextvars.ContextVar(
+    "profiled_tasks", default=None
+)
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def await_chain(task: asyncio.Task) -> List[str]:
+    """Names of the coroutines a suspended task is waiting in, outermost first."""
+    names = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "ag_frame", None) \
+            or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        names.append(frame_name(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "ag_await", None) \
+            or getattr(awaitable, "gi_yieldfrom", None)
+    return names
+
+
+def running_stack(frame) -> Optional[List[str]]:
+    """Names from the callback the loop is running down to `frame`, or None when idle."""
+    names = []
+    while frame is not None:
+        if (frame.f_globals.get("__name__"), getattr(frame.f_code, "co_qualname", None)) == _LOOP_FRAME:
+            return names[::-1]
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return None
+
+
+class Profile:
+    """Sample counts per collapsed stack."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.started = time.monotonic()
+        self.seconds = 0.0
+
+    def add(self, names: List[str]) -> None:
+        self.stacks[";".join(names)] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def tree(self) -> Dict[str, Any]:
+        root = {"name": "root", "value": 0, "children": {}}
+        for stack, count in self.stacks.items():
+            root["value"] += count
+            node = root
+            for name in stack.split(";"):
+                child = node["children"].setdefault(name, {"name": name, "value": 0, "children": {}})
+                child["value"] += count
+                node = child
+
+        def listed(node):
+            return {
+                "name": node["name"],
+                "value": node["value"],
+                "children": sorted((listed(c) for c in node["children"].values()), key=lambda c: -c["value"]),
+            }
+        return {
+            **listed(root),
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "seconds": round(self.seconds, 3),
+        }
+
+    def render(self, fmt: str) -> tuple[str, str]:
+        """(body, media type) in the requested format."""
+        if fmt == "json":
+            return json.dumps(self.tree()), "application/json"
+        return self.collapsed(), "text/plain"
+
+
+class StackSampler:
+    """Sample an event loop's thread and tasks from a background thread.
+
+    With `task_filter`, only tasks it accepts are counted, both when
+    running and when awaiting; without one the whole loop is sampled.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        interval: float = settings.PROFILER_SAMPLE_INTERVAL_MS / 1000,
+        task_filter: Optional[Callable[[asyncio.Task], bool]] = None,
+        exclude: Optional[Set[asyncio.Task]] = None,
+    ):
+        self.loop = loop
+        self.profile = Profile(interval)
+        self.task_filter = task_filter
+        self.exclude = exclude or set()
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        self._thread.join()
+        self.profile.seconds = time.monotonic() - self.profile.started
+        return self.profile
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.profile.interval):
+            try:
+                self._sample()
+            except Exception:
+                # The loop mutates what we walk; drop the odd torn sample
+                continue
+
+    def _wanted(self, task: Optional[asyncio.Task]) -> bool:
+        if task is None:
+            return self.task_filter is None
+        if task in self.exclude:
+            return False
+        return self.task_filter is None or self.task_filter(task)
+
+    def _sample(self) -> None:
+        self.profile.samples += 1
+        current = asyncio.current_task(self.loop)
+        frame = sys._current_frames().get(self._loop_thread)
+        if self._wanted(current):
+            stack = running_stack(frame)
+            if stack is None:
+                if self.task_filter is None:
+                    self.profile.add(["[idle]"])
+            else:
+                self.profile.add(["[running]", *stack])
+
+        for task in asyncio.all_tasks(self.loop):
+            if task is current or not self._wanted(task):
+                continue
+            self.profile.add(["[awaiting]", *await_chain(task)])
+
+
+async def sample_worker(seconds: float, interval: float = settings.PROFILER_SAMPLE_INTERVAL_MS / 1000) -> Profile:
+    """Sample everything this worker's event loop does for `seconds`."""
+    sampler = StackSampler(
+        asyncio.get_running_loop(),
+        interval=interval,
+        exclude={asyncio.current_task()}
+    ).start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile = sampler.stop()
+    return profile
+
+
+class _TaskTracker:
+    """Task factory that adds tasks created by a profiled request to its task set.
+
+    Installed on the loop only while at least one request is being profiled.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self._previous = None
+
+    def __call__(self, loop, coro, context=None):
+        if self._previous is not None:
+            task = self._previous(loop, coro, context=context)
+        else:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        tasks = context.get(_profiled_tasks) if context is not None else _profiled_tasks.get()
+        if tasks is not None:
+            tasks.add(task)
+        return task
+
+    def enter(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self.active == 0:
+            self._previous = loop.get_task_factory()
+            loop.set_task_factory(self)
+        self.active += 1
+
+    def exit(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.active -= 1
+        if self.active == 0:
+            loop.set_task_factory(self._previous)
+            self._previous = None
+
+
+_task_tracker = _TaskTracker()
+
+
+def profile_token_user(token: str) -> Optional[str]:
+    """The superuser a profiling token was issued to, if it is valid."""
+    payload = verify_token(token, scope=PROFILE_TOKEN_SCOPE)
+    return payload.get("sub") if payload else None
+
+
+class ProfileRequestMiddleware:
+    """Profile a single request that carries an `X-Profile-Token` header.
+
+    The token comes from `POST /diagnostics/profile/token` (superusers only).
+    The request runs as usual, but the response is replaced by its profile
+    (`X-Profile-Format: collapsed` or `json`); the status the endpoint
+    returned is in `X-Profiled-Status`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        token = headers.get(PROFILE_TOKEN_HEADER)
+        if token is None:
+            await self.app(scope, receive, send)
+            return
+
+        if profile_token_user(token.decode("latin-1")) is None:
+            await _send_text(send, 403, "Invalid or expired profiling token")
+            return
+        fmt = headers.get(PROFILE_FORMAT_HEADER, b"collapsed").decode("latin-1")
+        if fmt not in FORMATS:
+            await _send_text(send, 400, f"{PROFILE_FORMAT_HEADER.decode()} must be one of {', '.join(FORMATS)}")
+            return
+
+        loop = asyncio.get_running_loop()
+        tasks = weakref.WeakSet([asyncio.current_task()])
+        status = 500
+
+        async def capture(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        _task_tracker.enter(loop)
+        context_token = _profiled_tasks.set(tasks)
+        sampler = StackSampler(loop, task_filter=tasks.__contains__).start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            profile = sampler.stop()
+            _profiled_tasks.reset(context_token)
+            _task_tracker.exit(loop)
+
+        body, media_type = profile.render(fmt)
+        await _send_text(send, 200, body, media_type, [(b"x-profiled-status", str(status).encode())])
+
+
+async def _send_text(
+    send,
+    status: int,
+    body: str,
+    media_type: str = "text/plain",
+    headers: Optional[List[tuple]] = None,
+) -> None:
+    payload = body.encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", f"{media_type}; charset=utf-8".encode()),
+            (b"content-length", str(len(payload)).encode()),
+            *(headers or []),
+        ],
+    })
+    await send({"type": "http.response.body", "body": payload})
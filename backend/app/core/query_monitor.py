@@ -0,0 +1,298 @@
+"""Per-statement latency tracking on the SQLAlchemy engine.
+
+Opt-in with `QUERY_MONITOR_ENABLED`. Every statement is reduced to a
+fingerprint (literals, bound parameters and IN/VALUES lists collapsed) and
+timed between the engine's `before_cursor_execute` and
+`after_cursor_execute` events. Statements slower than
+`SLOW_QUERY_THRESHOLD_MS` are logged with the route of the request that ran
+them. Periodically, the fingerprints with the most total time are
+re-run under `EXPLAIN (ANALYZE, BUFFERS)` with the parameters of their
+slowest execution, in a transaction that is always rolled back.
+
+Statistics are per worker process.
+"""
+import asyncio
+import bisect
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.metrics import DB_SLOW_QUERIES
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds; the last bucket is everything above
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Only statements that read can be re-run for a plan
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PARAMS = re.compile(r"\$\d+|%\(\w+\)s|%s")
+# A placeholder, possibly with a cast such as ::TIMESTAMP WITHOUT TIME ZONE
+_ITEM = r"\?(?:::[A-Za-z_]\w*(?: [A-Za-z_]\w*)*(?:\[\])?)?"
+_LISTS = re.compile(rf"\(\s*{_ITEM}(?:\s*,\s*{_ITEM})*\s*\)")
+_ROWS = re.compile(r"(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+")
+_SPACES = re.compile(r"\s+")
+
+# The ASGI scope of the request being served, if any
+_request_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("query_monitor_scope", default=None)
+
+
+def fingerprint(statement: str) -> str:
+    """Normalized statement text: same shape, same fingerprint."""
+    text = _COMMENTS.sub(" ", statement)
+    text = _STRINGS.sub("?", text)
+    text = _PARAMS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _LISTS.sub("(...)", text)
+    text = _ROWS.sub(r"\1", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def fingerprint_id(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def current_route() -> str:
+    """Route template of the request running this code, or `background`."""
+    scope = _request_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    path = getattr(route, "path_format", None) or "unmatched"
+    return f"{scope.get('method', 'WS')} {path}"
+
+
+@dataclass
+class QueryStats:
+    id: str
+    statement: str
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    slow_calls: int = 0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    routes: Dict[str, int] = field(default_factory=dict)
+    # Driver-level statement and parameters of the slowest execution, for EXPLAIN
+    worst_statement: Optional[str] = None
+    worst_parameters: Any = None
+    plan: Any = None
+    explained_at: Optional[datetime] = None
+    explained_calls: int = 0
+
+    def observe(self, elapsed_ms: float, route: str, slow: bool) -> None:
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.routes[route] = self.routes.get(route, 0) + 1
+        if slow:
+            self.slow_calls += 1
+
+    def percentile(self, q: float) -> float:
+        """Bucket upper bound below which `q` of the calls fall, capped at the max seen."""
+        target = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS + (self.max_ms,), self.buckets):
+            seen += count
+            if seen >= target:
+                return min(float(bound), self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "statement": self.statement,
+            "calls": self.calls,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": round(self.percentile(0.5), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "slow_calls": self.slow_calls,
+            "histogram": {
+                str(bound): count
+                for bound, count in zip(LATENCY_BUCKETS_MS + ("+Inf",), self.buckets)
+            },
+            "routes": dict(sorted(self.routes.items(), key=lambda item: -item[1])),
+            "plan": self.plan,
+            "explained_at": self.explained_at,
+        }
+
+
+class QueryMonitor:
+    """Fingerprint, time and sample the statements run through an engine."""
+
+    def __init__(
+        self,
+        threshold_ms: float = settings.SLOW_QUERY_THRESHOLD_MS,
+        max_fingerprints: int = settings.QUERY_MONITOR_MAX_FINGERPRINTS,
+        explain_top: int = settings.QUERY_EXPLAIN_TOP,
+        explain_timeout_ms: int = settings.QUERY_EXPLAIN_TIMEOUT_MS,
+    ):
+        self.threshold_ms = threshold_ms
+        self.max_fingerprints = max_fingerprints
+        self.explain_top = explain_top
+        self.explain_timeout_ms = explain_timeout_ms
+        self.started_at = datetime.utcnow()
+        # Statements seen once the table is full are only counted here
+        self.untracked_calls = 0
+        self._stats: Dict[str, QueryStats] = {}
+        # Raw statement text -> fingerprint id, so each shape is normalized once
+        self._fingerprints: Dict[str, str] = {}
+        self._engine: Optional[AsyncEngine] = None
+
+    def attach(self, engine: AsyncEngine) -> None:
+        """Start timing every statement the engine runs."""
+        self._engine = engine
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            context._query_monitor_started = time.perf_counter()
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            elapsed_ms = (time.perf_counter() - context._query_monitor_started) * 1000
+            self.observe(statement, parameters, elapsed_ms, executemany)
+
+    def observe(self, statement: str, parameters: Any, elapsed_ms: float, executemany: bool = False) -> None:
+        if statement.lstrip()[:7].upper() == "EXPLAIN":
+            return
+        key = self._fingerprints.get(statement)
+        if key is None:
+            normalized = fingerprint(statement)
+            key = fingerprint_id(normalized)
+            if key not in self._stats:
+                if len(self._stats) >= self.max_fingerprints:
+                    self.untracked_calls += 1
+                    return
+                self._stats[key] = QueryStats(id=key, statement=normalized)
+            if len(self._fingerprints) < 4 * self.max_fingerprints:
+                self._fingerprints[statement] = key
+
+        stats = self._stats[key]
+        route = current_route()
+        slow = elapsed_ms >= self.threshold_ms
+        stats.observe(elapsed_ms, route, slow)
+        if elapsed_ms > stats.max_ms:
+            stats.max_ms = elapsed_ms
+            if not executemany:
+                stats.worst_statement = statement
+                stats.worst_parameters = parameters
+        if slow:
+            DB_SLOW_QUERIES.labels(route=route).inc()
+            logger.warning(
+                "Slow query (%.1f ms, %s) on %s: %s",
+                elapsed_ms, key, route, _SPACES.sub(" ", statement).strip()[:2000]
+            )
+
+    def report(self, order_by: str = "total_ms", limit: int = 20) -> Dict[str, Any]:
+        queries = sorted(
+            (stats.to_dict() for stats in self._stats.values()),
+            key=lambda stats: stats[order_by],
+            reverse=True
+        )
+        return {
+            "worker": os.getpid(),
+            "since": self.started_at,
+            "threshold_ms": self.threshold_ms,
+            "fingerprints": len(self._stats),
+            "untracked_calls": self.untracked_calls,
+            "queries": queries[:limit],
+        }
+
+    def reset(self) -> None:
+        self._stats.clear()
+        self._fingerprints.clear()
+        self.untracked_calls = 0
+        self.started_at = datetime.utcnow()
+
+    def explain_candidates(self) -> List[QueryStats]:
+        """The read statements with the most total time whose plan is missing or out of date."""
+        candidates = [
+            stats for stats in self._stats.values()
+            if stats.worst_statement is not None
+            and EXPLAINABLE.match(stats.worst_statement)
+            and not WRITES.search(stats.worst_statement)
+            and stats.calls > stats.explained_calls
+        ]
+        candidates.sort(key=lambda stats: stats.total_ms, reverse=True)
+        return candidates[:self.explain_top]
+
+    async def explain(self, stats: QueryStats) -> None:
+        """Run the slowest execution again under EXPLAIN ANALYZE and keep the plan."""
+        async with self._engine.connect() as connection:
+            transaction = await connection.begin()
+            try:
+                await connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+                result = await connection.exec_driver_sql(
+                    f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {stats.worst_statement}",
+                    stats.worst_parameters or ()
+                )
+                plan = result.scalar()
+            finally:
+                await transaction.rollback()
+        stats.plan = plan[0] if isinstance(plan, list) and plan else plan
+        stats.explained_at = datetime.utcnow()
+        stats.explained_calls = stats.calls
+
+    async def explain_worst(self) -> int:
+        """Refresh the plans of the current worst statements; return how many were explained."""
+        explained = 0
+        for stats in self.explain_candidates():
+            try:
+                await self.explain(stats)
+                explained += 1
+            except Exception as e:
+                logger.warning("EXPLAIN failed for query %s: %s", stats.id, e)
+                # Don't retry it until it has run again
+                stats.explained_calls = stats.calls
+        return explained
+
+    async def run_forever(self, interval: float = settings.QUERY_EXPLAIN_INTERVAL_SECONDS) -> None:
+        """Sample plans periodically until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                explained = await self.explain_worst()
+                if explained:
+                    logger.info("Sampled query plans for %d statements", explained)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Query plan sampling failed")
+
+
+class QueryRouteMiddleware:
+    """Make the current request's route available to the query monitor."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        # The router fills in scope["route"] later; it is read at query time
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+query_monitor = QueryMonitor()
@@ -0,0 +1,9 @@
+"""Start of the app's imports, for the startup timings.
+
+`app.main` imports this before anything else, so the time between
+`IMPORT_STARTED` and the end of its own imports is what loading the app
+costs.
+"""
+import time
+
+IMPORT_STARTED = time.perf_counter()
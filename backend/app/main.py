@@ -1,39 +1,158 @@
-from fastapi import FastAPI
+# Must stay the first import: it timestamps the start of the ones below
+from app.core.startup import IMPORT_STARTED
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1 import api_router
 from app.core.config import settings
+from app.core.database import dispose_engine, warm_pool
+from app.core.http import close_http_client, get_http_client
+from app.core.metrics import MetricsMiddleware, mark_process_dead, render_metrics
+from app.core.profiler import ProfileRequestMiddleware
+from app.core.query_monitor import QueryRouteMiddleware, query_monitor
+from app.services.auth import google_oauth
+from app.services.chat import generate_mock_response
+from app.services.decisions import decision_recorder
+from app.services.destinations import destination_catalog
+from app.services.idempotency import idempotency_store
+from app.services.message_archive import message_archiver
+from app.services.provider_cache import provider_cache
+from app.services.purge import conversation_purger
+from app.services.starter_replies import starter_reply_cache
+from app.services.viability import viability_scheduler
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm shared resources before serving and release them on shutdown."""
+    timings = {"import_ms": round(IMPORT_SECONDS * 1000, 1)}
+    started = time.perf_counter()
+
+    step = time.perf_counter()
+    destination_catalog.load()
+    timings["destination_index_ms"] = round((time.perf_counter() - step) * 1000, 1)
+
+    step = time.perf_counter()
+    try:
+        await warm_pool()
+    except Exception:
+        logger.warning("Database pool warm-up failed; connections will open on demand", exc_info=True)
+    timings["db_pool_ms"] = round((time.perf_counter() - step) * 1000, 1)
+
+    get_http_client()
+    # Discovery and JWKS are fetched in the background so startup never waits on Google
+    oauth_warmup = asyncio.create_task(google_oauth.warm())
+    oauth_warmup.add_done_callback(_log_warmup_failure)
+
+    purge_task = None
+    if settings.CONVERSATION_PURGE_INTERVAL_SECONDS > 0:
+        purge_task = asyncio.create_task(conversation_purger.run_forever())
+    archive_task = None
+    if settings.MESSAGE_ARCHIVE_INTERVAL_SECONDS > 0:
+        archive_task = asyncio.create_task(message_archiver.run_forever())
+    starter_task = None
+    if settings.STARTER_WARMUP_INTERVAL_SECONDS > 0:
+        starter_task = asyncio.create_task(starter_reply_cache.run_forever(generate_mock_response))
+    viability_task = None
+    if settings.VIABILITY_CHECK_INTERVAL_SECONDS > 0:
+        viability_task = asyncio.create_task(viability_scheduler.run_forever())
+    explain_task = None
+    if settings.QUERY_MONITOR_ENABLED and settings.QUERY_EXPLAIN_INTERVAL_SECONDS > 0:
+        explain_task = asyncio.create_task(query_monitor.run_forever())
+
+    timings["startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    app.state.startup_timings = timings
+    logger.info("Startup timings: %s", timings)
+
+    yield
+
+    oauth_warmup.cancel()
+    if purge_task is not None:
+        purge_task.cancel()
+    if archive_task is not None:
+        archive_task.cancel()
+    if viability_task is not None:
+        viability_task.cancel()
+    if starter_task is not None:
+        starter_task.cancel()
+    if explain_task is not None:
+        explain_task.cancel()
+    await google_oauth.close()
+    await decision_recorder.close()
+    await idempotency_store.close()
+    await provider_cache.close()
+    await starter_reply_cache.close()
+    await close_http_client()
+    await dispose_engine()
+    mark_process_dead()
+
+
+def _log_warmup_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("OAuth warm-up failed: %s", task.exception())
+
+
+def create_app() -> FastAPI:
+    """Build the FastAPI application."""
+    app = FastAPI(
+        title=settings.PROJECT_NAME,
+        openapi_url=f"{settings.API_V1_STR}/openapi.json",
+        lifespan=lifespan,
+    )
+
+    # Set up CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[settings.FRONTEND_URL],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.add_middleware(MetricsMiddleware)
+    if settings.QUERY_MONITOR_ENABLED:
+        app.add_middleware(QueryRouteMiddleware)
+    if settings.PROFILER_ENABLED:
+        app.add_middleware(ProfileRequestMiddleware)
+
+    # Include API router
+    app.include_router(api_router, prefix=settings.API_V1_STR)
+
+    @app.get("/")
+    async def root():
+        """Root endpoint."""
+        return {
+            "message": f"Welcome to {settings.PROJECT_NAME} API",
+            "docs": "/docs",
+            "redoc": "/redoc",
+            "health": "/health"
+        }
+
+    @app.get("/health")
+    async def health_check():
+        """Health check endpoint."""
+        return {
+            "status": "healthy",
+            "startup": getattr(app.state, "startup_timings", None)
+        }
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics, aggregated across workers."""
+        payload, content_type = render_metrics()
+        return Response(content=payload, media_type=content_type)
+
+    return app
+
 
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json",
-)
-
-# Set up CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[settings.FRONTEND_URL],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include API router
-app.include_router(api_router, prefix=settings.API_V1_STR)
-
-
-@app.get("/")
-async def root():
-    """Root endpoint."""
-    return {
-        "message": f"Welcome to {settings.PROJECT_NAME} API",
-        "docs": "/docs",
-        "redoc": "/redoc",
-        "health": "/health"
-    }
-
-
-@app.get("/health")
-async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy"}
\ No newline at end of file
+app = create_app()
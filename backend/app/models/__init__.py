@@ -1,14 +1,25 @@
 from app.models.user import User, Base
-from app.models.conversation import Conversation, Message, ConversationState, MessageRole
-from app.models.trip import Trip, TripStatus
+from app.models.conversation import Conversation, Message, MessageTrace, ConversationState, MessageRole
+from app.models.trip import Trip, TripAdaptation, TripStatus
+from app.models.usage import UsageDaily
+from app.models.decision import ComponentDecision, ComponentDecisionEvent, UserPreferenceWeights
+from app.models.message_archive import MessageArchive, MessageArchiveSegment
 
 __all__ = [
     "User", 
     "Base",
     "Conversation",
     "Message",
+    "MessageTrace",
     "ConversationState",
     "MessageRole",
     "Trip",
-    "TripStatus"
+    "TripStatus",
+    "TripAdaptation",
+    "UsageDaily",
+    "ComponentDecision",
+    "ComponentDecisionEvent",
+    "UserPreferenceWeights",
+    "MessageArchive",
+    "MessageArchiveSegment"
 ]
\ No newline at end of file
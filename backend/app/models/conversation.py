@@ -3,9 +3,11 @@ from typing import Optional, List, Dict, Any
 from uuid import uuid4
 from enum import Enum
 
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, JSON, Enum as SQLEnum
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column, Computed, String, DateTime, ForeignKey, Index, Integer, LargeBinary, Text, JSON, Enum as SQLEnum, text
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import deferred, relationship
 
 from app.models.user import Base
 
@@ -21,25 +23,47 @@ class ConversationState(str, Enum):
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        Index(
+            "ix_conversations_deleted_at",
+            "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL")
+        ),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     trip_id = Column(UUID(as_uuid=True), ForeignKey("trips.id"), nullable=True)
     
+    # Forks share their parent's history up to and including the fork point.
+    # No foreign key: messages is partitioned, so its id alone isn't unique
+    parent_id = Column(UUID(as_uuid=True), ForeignKey("conversations.id"), nullable=True, index=True)
+    fork_point_message_id = Column(UUID(as_uuid=True), nullable=True)
+    
     state = Column(
         SQLEnum(ConversationState),
         default=ConversationState.INITIAL_INTENT,
         nullable=False
     )
+    # NULL on a fork until it writes its own: read through the parent instead
     context = Column(JSON, default=dict)
     
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set when the user deletes the conversation; rows are purged in the background
+    deleted_at = Column(DateTime, nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="conversations")
     trip = relationship("Trip", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", order_by="Message.created_at")
+    messages = relationship(
+        "Message",
+        back_populates="conversation",
+        foreign_keys="Message.conversation_id",
+        order_by="Message.created_at",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
     
     def __repr__(self):
         return f"<Conversation {self.id} - State: {self.state}>"
@@ -52,21 +76,64 @@ class MessageRole(str, Enum):
 
 
 class Message(Base):
+    """A chat message.
+    
+    The table is range-partitioned by month on `created_at` (hence the
+    composite primary key); old months are exported and detached by
+    `MessageArchiver` and rehydrated when an archived conversation is read.
+    """
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_content_tsv", "content_tsv", postgresql_using="gin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    # Don't read content_tsv back after every INSERT
+    __mapper_args__ = {"eager_defaults": False}
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    conversation_id = Column(UUID(as_uuid=True), ForeignKey("conversations.id"), nullable=False)
+    conversation_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("conversations.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
     
     role = Column(SQLEnum(MessageRole), nullable=False)
     content = Column(Text, nullable=False)
+    # Maintained by Postgres for full-text search; never loaded with the row
+    content_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True)))
     
-    # For storing LLM metadata (tokens used, model, etc.)
-    llm_metadata = Column(JSON, default=dict)
+    # Summary of the LLM call (model, token counts, flags); only loaded when asked for.
+    # Anything bulkier (raw prompts, tool traces) lives in message_traces
+    llm_metadata = deferred(Column(JSON, default=dict))
     
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, primary_key=True, nullable=False)
     
     # Relationships
-    conversation = relationship("Conversation", back_populates="messages")
+    conversation = relationship(
+        "Conversation",
+        back_populates="messages",
+        foreign_keys=[conversation_id]
+    )
+    
+    def __repr__(self):
+        return f"<Message {self.id} - {self.role}: {self.content[:50]}...>"
+
+
+class MessageTrace(Base):
+    """Bulky LLM metadata of a message, kept out of the messages rows."""
+    __tablename__ = "message_traces"
+    
+    # Deleted along with the message by the purge and the archiver (no foreign key
+    # into the partitioned messages table)
+    message_id = Column(UUID(as_uuid=True), primary_key=True)
+    # "json" (UTF-8 JSON as is) or "zlib" (the same, compressed)
+    encoding = Column(String(8), nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    # Uncompressed size, for monitoring how much compression saves
+    raw_bytes = Column(Integer, nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     def __repr__(self):
-        return f"<Message {self.id} - {self.role}: {self.content[:50]}...>"
\ No newline at end of file
+        return f"<MessageTrace {self.message_id} - {self.encoding}: {self.raw_bytes} bytes>"
@@ -0,0 +1,59 @@
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Identity, Index, Integer, JSON, String, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.models.user import Base
+
+
+class ComponentDecision(str, Enum):
+    CHOSEN = "chosen"
+    VETOED = "vetoed"
+    CONSIDERING = "considering"
+
+
+class ComponentDecisionEvent(Base):
+    """One decision a user made about a trip component. Rows are only ever inserted."""
+    __tablename__ = "component_decisions"
+    __table_args__ = (
+        Index("ix_component_decisions_user_id_id", "user_id", "id"),
+    )
+    
+    id = Column(BigInteger, Identity(), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    trip_id = Column(UUID(as_uuid=True), ForeignKey("trips.id", ondelete="SET NULL"), nullable=True)
+    component_id = Column(String, nullable=False)
+    decision = Column(SQLEnum(ComponentDecision), nullable=False)
+    
+    # What was decided on, as seen at the time
+    tags = Column(JSON, default=list)
+    price_level = Column(Integer, nullable=True)
+    time_slot = Column(String, nullable=True)
+    reason = Column(String, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f"<ComponentDecisionEvent {self.id} {self.component_id} {self.decision}>"
+
+
+class UserPreferenceWeights(Base):
+    """Running sums of decision signals per user, folded in as decisions are recorded."""
+    __tablename__ = "user_preference_weights"
+    
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    tag_sums = Column(JSON, nullable=False, default=dict)
+    price_sums = Column(JSON, nullable=False, default=dict)
+    timing_sums = Column(JSON, nullable=False, default=dict)
+    decisions = Column(Integer, nullable=False, default=0)
+    last_event_id = Column(BigInteger, nullable=False, default=0)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<UserPreferenceWeights {self.user_id} ({self.decisions} decisions)>"
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer, String, text
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.models.user import Base
+
+
+class MessageArchive(Base):
+    """A month of messages exported to a gzipped JSONL file and detached from `messages`."""
+    __tablename__ = "message_archives"
+    
+    id = Column(Integer, primary_key=True)
+    partition = Column(String, nullable=False, unique=True)
+    range_start = Column(DateTime, nullable=False)
+    range_end = Column(DateTime, nullable=False)
+    path = Column(String, nullable=False)
+    rows = Column(BigInteger, nullable=False)
+    bytes = Column(BigInteger, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f"<MessageArchive {self.partition}: {self.rows} rows>"
+
+
+class MessageArchiveSegment(Base):
+    """Where one conversation's messages are in an archive file.
+    
+    Each conversation is its own gzip member at `offset`, so it can be read
+    back without decompressing the rest of the month.
+    """
+    __tablename__ = "message_archive_segments"
+    __table_args__ = (
+        Index(
+            "ix_message_archive_segments_rehydrated_at",
+            "rehydrated_at",
+            postgresql_where=text("rehydrated_at IS NOT NULL")
+        ),
+    )
+    
+    conversation_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("conversations.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    archive_id = Column(
+        Integer,
+        ForeignKey("message_archives.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True
+    )
+    offset = Column(BigInteger, nullable=False)
+    length = Column(Integer, nullable=False)
+    rows = Column(Integer, nullable=False)
+    # Set while the messages are back in the table; cleared when they are evicted again
+    rehydrated_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<MessageArchiveSegment {self.conversation_id} in {self.archive_id}>"
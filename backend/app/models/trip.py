@@ -3,7 +3,7 @@ from typing import Optional
 from uuid import uuid4
 from enum import Enum
 
-from sqlalchemy import Column, String, DateTime, ForeignKey, Date, Integer, Numeric, JSON, Enum as SQLEnum
+from sqlalchemy import Column, String, DateTime, ForeignKey, Date, Index, Integer, Numeric, JSON, UniqueConstraint, Enum as SQLEnum, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -20,6 +20,14 @@ class TripStatus(str, Enum):
 
 class Trip(Base):
     __tablename__ = "trips"
+    __table_args__ = (
+        # Keyset scan of active trips for the viability scheduler
+        Index(
+            "ix_trips_in_progress",
+            "id",
+            postgresql_where=text("status = 'IN_PROGRESS'")
+        ),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
@@ -49,12 +57,42 @@ class Trip(Base):
     preferences = Column(JSON, default=dict)
     itinerary = Column(JSON, default=dict)
     
+    # Viability scheduler lease: the worker holding it checks the trip
+    viability_lease_owner = Column(String, nullable=True)
+    viability_lease_expires_at = Column(DateTime, nullable=True)
+    viability_checked_at = Column(DateTime, nullable=True)
+    
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="trips")
     conversations = relationship("Conversation", back_populates="trip")
+    adaptations = relationship("TripAdaptation", back_populates="trip", passive_deletes=True)
+    
+    def __repr__(self):
+        return f"<Trip {self.id} - {self.title or 'Untitled'} ({self.status})>"
+
+
+class TripAdaptation(Base):
+    """A planned component that current conditions make unviable, with its proposed backup."""
+    __tablename__ = "trip_adaptations"
+    __table_args__ = (
+        UniqueConstraint("trip_id", "day", "component_id", name="uq_trip_adaptations_component"),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    trip_id = Column(UUID(as_uuid=True), ForeignKey("trips.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    component_id = Column(String, nullable=False)
+    
+    reason = Column(String, nullable=False)
+    replacement = Column(JSON, nullable=True)  # the first viable backup, if any
+    conditions = Column(JSON, default=dict)
+    
+    detected_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    trip = relationship("Trip", back_populates="adaptations")
     
     def __repr__(self):
-        return f"<Trip {self.id} - {self.title or 'Untitled'} ({self.status})>"
\ No newline at end of file
+        return f"<TripAdaptation {self.trip_id} {self.day} {self.component_id}>"
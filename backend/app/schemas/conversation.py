@@ -21,10 +21,23 @@ class Message(MessageBase):
     id: UUID
     conversation_id: UUID
     created_at: datetime
-    llm_metadata: Dict[str, Any] = Field(default_factory=dict)
+    # Only sent when asked for (`include=metadata`); an object, except on some legacy rows
+    llm_metadata: Any = None
     
     class Config:
         from_attributes = True
+    
+    @classmethod
+    def from_model(cls, message: Any, llm_metadata: Any = None) -> "Message":
+        """Build from an ORM message without touching its deferred `llm_metadata`."""
+        return cls(
+            id=message.id,
+            conversation_id=message.conversation_id,
+            role=message.role,
+            content=message.content,
+            created_at=message.created_at,
+            llm_metadata=llm_metadata
+        )
 
 
 class ConversationBase(BaseModel):
@@ -46,6 +59,8 @@ class Conversation(ConversationBase):
     id: UUID
     user_id: UUID
     trip_id: Optional[UUID]
+    parent_id: Optional[UUID] = None
+    fork_point_message_id: Optional[UUID] = None
     created_at: datetime
     updated_at: datetime
     messages: List[Message] = []
@@ -58,6 +73,11 @@ class ConversationWithMessages(Conversation):
     messages: List[Message]
 
 
+class ConversationFork(BaseModel):
+    # Message to branch after; defaults to the latest message
+    message_id: Optional[UUID] = None
+
+
 class ChatRequest(BaseModel):
     message: str
     conversation_id: Optional[UUID] = None
@@ -67,4 +87,20 @@ class ChatResponse(BaseModel):
     conversation_id: UUID
     message: Message
     state: ConversationState
-    context: Dict[str, Any]
\ No newline at end of file
+    context: Dict[str, Any]
+
+
+class MessageSearchHit(BaseModel):
+    message_id: UUID
+    conversation_id: UUID
+    role: MessageRole
+    created_at: datetime
+    rank: float
+    # Matching fragment with terms wrapped in <mark></mark>
+    headline: str
+
+
+class MessageSearchResults(BaseModel):
+    hits: List[MessageSearchHit]
+    # Pass back as `cursor` for the next page; null on the last page
+    next_cursor: Optional[str] = None
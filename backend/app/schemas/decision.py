@@ -0,0 +1,16 @@
+from typing import List, Literal, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from app.models.decision import ComponentDecision
+
+
+class ComponentDecisionCreate(BaseModel):
+    component_id: str = Field(..., min_length=1, max_length=255)
+    decision: ComponentDecision
+    trip_id: Optional[UUID] = None
+    tags: List[str] = Field(default_factory=list, max_length=50)
+    price_level: Optional[int] = Field(None, ge=0, le=4)
+    time_slot: Optional[Literal["morning", "afternoon", "evening", "night"]] = None
+    reason: Optional[str] = Field(None, max_length=1000)
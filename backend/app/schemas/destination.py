@@ -0,0 +1,25 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class Destination(BaseModel):
+    id: str
+    name: str
+    country: Optional[str] = None
+    region: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    popularity: float = 0.0
+    aliases: List[str] = Field(default_factory=list)
+
+
+class DestinationSearchResult(BaseModel):
+    id: str
+    name: str
+    country: Optional[str] = None
+    region: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    popularity: float = 0.0
+    score: float
@@ -0,0 +1,37 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class QueryFingerprint(BaseModel):
+    id: str
+    statement: str  # normalized: literals and parameters replaced by ?
+    calls: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    # Estimated from the histogram buckets
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    slow_calls: int
+    histogram: Dict[str, int]  # calls per bucket, keyed by upper bound in ms
+    routes: Dict[str, int]  # calls per route template
+    plan: Optional[Any] = None  # EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) of the slowest call
+    explained_at: Optional[datetime] = None
+
+
+class QueryReport(BaseModel):
+    worker: int  # statistics are per worker process
+    since: datetime
+    threshold_ms: float
+    fingerprints: int
+    untracked_calls: int
+    queries: List[QueryFingerprint]
+
+
+class ProfileToken(BaseModel):
+    token: str
+    header: str  # send the token in this header; the response is the request's profile
+    expires_at: datetime
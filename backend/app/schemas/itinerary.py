@@ -0,0 +1,45 @@
+import math
+from datetime import date, time
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class ItineraryStop(BaseModel):
+    id: str
+    name: Optional[str] = None
+    latitude: float
+    longitude: float
+    duration_minutes: int = 60
+    opens_at: Optional[time] = None
+    closes_at: Optional[time] = None
+
+    @field_validator("duration_minutes", mode="before")
+    @classmethod
+    def round_duration(cls, value: Any) -> Any:
+        """Providers and models send durations like 90.0 or "45.5"; round them to whole minutes."""
+        if value is None:
+            return 60
+        if isinstance(value, str):
+            try:
+                value = float(value)
+            except ValueError:
+                return value
+        if isinstance(value, float) and math.isfinite(value):
+            return round(value)
+        return value
+
+
+class ScheduledStop(BaseModel):
+    id: str
+    name: Optional[str] = None
+    arrival: time
+    departure: time
+    travel_minutes: float = 0.0
+
+
+class DayPlan(BaseModel):
+    day: Optional[date] = None
+    stops: List[ScheduledStop] = Field(default_factory=list)
+    unscheduled: List[str] = Field(default_factory=list)
+    total_distance_km: float = 0.0
@@ -0,0 +1,21 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class RankingCandidate(BaseModel):
+    id: str
+    tags: List[str] = Field(default_factory=list)
+    price_level: int = 0  # 0 (free) to 4 (luxury)
+    time_slot: Optional[str] = None  # "morning", "afternoon", "evening", "night"
+
+
+class PreferenceWeights(BaseModel):
+    tag_weights: Dict[str, float] = Field(default_factory=dict)
+    price_weights: Dict[int, float] = Field(default_factory=dict)
+    timing_weights: Dict[str, float] = Field(default_factory=dict)
+
+
+class RankedCandidate(BaseModel):
+    id: str
+    score: float
@@ -0,0 +1,42 @@
+from datetime import date
+from decimal import Decimal
+from typing import List, Literal
+
+from pydantic import BaseModel
+
+
+class UsageDay(BaseModel):
+    day: date
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: Decimal
+    messages: int
+    
+    class Config:
+        from_attributes = True
+
+
+class UsageReport(BaseModel):
+    start: date
+    end: date
+    days: List[UsageDay]
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: Decimal
+
+
+class UsageAggregateRow(BaseModel):
+    key: str  # the day, model or user id, depending on `group_by`
+    users: int
+    messages: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: Decimal
+
+
+class UsageAggregate(BaseModel):
+    start: date
+    end: date
+    group_by: Literal["day", "model", "user"]
+    rows: List[UsageAggregateRow]
@@ -1,8 +1,10 @@
+import asyncio
+import time
 from datetime import datetime
 from typing import Optional
+from uuid import uuid4
 
-from authlib.integrations.httpx_client import AsyncOAuth2Client
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
@@ -10,24 +12,135 @@ from app.core.security import create_access_token
 from app.models.user import User
 from app.schemas.user import UserCreate
 
+JWKS_MIN_REFRESH_SECONDS = 60
+
+# Find, link or create the user for a Google identity in one round trip:
+# - a user with this Google ID only has `last_login` bumped
+# - otherwise a user with the same email is linked to the Google ID and has
+#   their picture/name refreshed
+# - otherwise a new user is inserted
+# Kept as text so the statement is compiled once; SQLAlchemy does not cache
+# `ON CONFLICT DO UPDATE` constructs.
+GOOGLE_LOGIN_UPSERT = text("""
+    WITH by_google_id AS (
+        UPDATE users
+        SET last_login = :login_at, updated_at = :login_at
+        WHERE google_id = :user_google_id
+        RETURNING *
+    ), upserted AS (
+        INSERT INTO users (
+            id, email, full_name, google_id, profile_picture, is_active,
+            is_superuser, preferences, created_at, updated_at, last_login
+        )
+        SELECT
+            :user_id, :user_email, :user_full_name, :user_google_id, :user_picture, true,
+            false, '{}'::json, :login_at, :login_at, :login_at
+        WHERE NOT EXISTS (SELECT 1 FROM by_google_id)
+        ON CONFLICT (email) DO UPDATE SET
+            google_id = excluded.google_id,
+            profile_picture = excluded.profile_picture,
+            full_name = coalesce(excluded.full_name, users.full_name),
+            last_login = excluded.last_login,
+            updated_at = excluded.updated_at
+        RETURNING *
+    )
+    SELECT * FROM by_google_id
+    UNION ALL
+    SELECT * FROM upserted
+""")
+
 
 class GoogleOAuth:
-    """Handle Google OAuth authentication."""
+    """Handle Google OAuth authentication.
     
-    def __init__(self):
-        self.client = AsyncOAuth2Client(
-            client_id=settings.GOOGLE_CLIENT_ID,
-            client_secret=settings.GOOGLE_CLIENT_SECRET,
-            redirect_uri=settings.GOOGLE_REDIRECT_URI,
-        )
-        self.authorize_url = "https://accounts.google.com/o/oauth2/v2/auth"
-        self.token_url = "https://oauth2.googleapis.com/token"
-        self.userinfo_url = "https://www.googleapis.com/oauth2/v2/userinfo"
+    One instance is shared by the whole process: the underlying
+    `AsyncOAuth2Client` keeps a pooled connection to the token endpoint, and
+    the OpenID discovery document and signing keys (JWKS) are cached, so a
+    login costs a single network round trip. User identity comes from the
+    `id_token` returned by the token exchange, verified locally.
+    """
+    
+    def __init__(
+        self,
+        discovery_url: str = settings.GOOGLE_DISCOVERY_URL,
+        cache_seconds: int = settings.GOOGLE_OIDC_CACHE_SECONDS,
+        **client_kwargs,
+    ):
+        self.discovery_url = discovery_url
+        self.cache_seconds = cache_seconds
+        # Extra httpx options (e.g. a transport for a local fake IdP)
+        self.client_kwargs = client_kwargs
+        self._client = None
+        self._discovery: Optional[dict] = None
+        self._discovery_expires = 0.0
+        self._jwks: dict = {}
+        self._jwks_expires = 0.0
+        self._jwks_fetched_at = 0.0
+        self._lock = asyncio.Lock()
+    
+    @property
+    def client(self):
+        """Shared OAuth client, created on first use."""
+        if self._client is None or self._client.is_closed:
+            # Imported lazily: authlib is one of the slowest imports at startup
+            from authlib.integrations.httpx_client import AsyncOAuth2Client
+            
+            self._client = AsyncOAuth2Client(
+                client_id=settings.GOOGLE_CLIENT_ID,
+                client_secret=settings.GOOGLE_CLIENT_SECRET,
+                redirect_uri=settings.GOOGLE_REDIRECT_URI,
+                **self.client_kwargs
+            )
+        return self._client
     
-    def get_authorization_url(self) -> str:
+    async def close(self) -> None:
+        """Close the pooled client."""
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+    
+    async def warm(self) -> None:
+        """Prefetch the discovery document and signing keys."""
+        await self.get_discovery()
+        await self._get_jwks()
+    
+    async def get_discovery(self) -> dict:
+        """Get the OpenID configuration, refreshing it when the cache expires."""
+        if self._discovery is not None and time.monotonic() < self._discovery_expires:
+            return self._discovery
+        async with self._lock:
+            return await self._get_discovery_unlocked()
+    
+    async def _get_jwks(self, force: bool = False) -> dict:
+        """Get signing keys by `kid`; `force` refetches (at most once a minute)."""
+        now = time.monotonic()
+        if not force and self._jwks and now < self._jwks_expires:
+            return self._jwks
+        async with self._lock:
+            now = time.monotonic()
+            stale = not self._jwks or now >= self._jwks_expires
+            if stale or (force and now - self._jwks_fetched_at >= JWKS_MIN_REFRESH_SECONDS):
+                discovery = await self._get_discovery_unlocked()
+                resp = await self.client.request("GET", discovery["jwks_uri"], withhold_token=True)
+                resp.raise_for_status()
+                self._jwks = {key["kid"]: key for key in resp.json().get("keys", [])}
+                self._jwks_fetched_at = now
+                self._jwks_expires = now + _max_age(resp, self.cache_seconds)
+        return self._jwks
+    
+    async def _get_discovery_unlocked(self) -> dict:
+        if self._discovery is None or time.monotonic() >= self._discovery_expires:
+            resp = await self.client.request("GET", self.discovery_url, withhold_token=True)
+            resp.raise_for_status()
+            self._discovery = resp.json()
+            self._discovery_expires = time.monotonic() + _max_age(resp, self.cache_seconds)
+        return self._discovery
+    
+    async def get_authorization_url(self) -> str:
         """Get the Google OAuth authorization URL."""
+        discovery = await self.get_discovery()
         authorization_url, _ = self.client.create_authorization_url(
-            self.authorize_url,
+            discovery["authorization_endpoint"],
             scope="openid email profile",
             access_type="offline",
             prompt="select_account"
@@ -36,19 +149,55 @@ class GoogleOAuth:
     
     async def get_access_token(self, code: str) -> dict:
         """Exchange authorization code for access token."""
+        discovery = await self.get_discovery()
         token = await self.client.fetch_token(
-            self.token_url,
+            discovery["token_endpoint"],
             authorization_response=f"{settings.GOOGLE_REDIRECT_URI}?code={code}",
             code=code
         )
         return token
     
-    async def get_user_info(self, token: dict) -> dict:
-        """Get user information from Google."""
-        self.client.token = token
-        resp = await self.client.get(self.userinfo_url)
-        resp.raise_for_status()
-        return resp.json()
+    async def verify_id_token(self, token: dict) -> dict:
+        """Verify the `id_token` from a token response and return its claims."""
+        id_token = token.get("id_token")
+        if not id_token:
+            raise ValueError("Token response did not include an id_token")
+        
+        from jose import jwt
+
+        kid = jwt.get_unverified_header(id_token).get("kid")
+        keys = await self._get_jwks()
+        if kid not in keys:
+            # Keys rotate; refetch once before giving up
+            keys = await self._get_jwks(force=True)
+        if kid not in keys:
+            raise ValueError("id_token signed with an unknown key")
+        
+        discovery = await self.get_discovery()
+        issuer = discovery["issuer"]
+        claims = jwt.decode(
+            id_token,
+            keys[kid],
+            algorithms=[keys[kid].get("alg", "RS256")],
+            audience=settings.GOOGLE_CLIENT_ID,
+            issuer=[issuer, issuer.removeprefix("https://")],
+            access_token=token.get("access_token")
+        )
+        if not claims.get("email_verified"):
+            raise ValueError("Google account email is not verified")
+        return claims
+
+
+def _max_age(resp, default: int) -> int:
+    """Cache lifetime from the response's Cache-Control max-age, if any."""
+    for directive in resp.headers.get("cache-control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name == "max-age" and value.isdigit():
+            return int(value)
+    return default
+
+
+google_oauth = GoogleOAuth()
 
 
 class AuthService:
@@ -56,7 +205,7 @@ class AuthService:
     
     def __init__(self, db: AsyncSession):
         self.db = db
-        self.google_oauth = GoogleOAuth()
+        self.google_oauth = google_oauth
     
     async def get_user_by_email(self, email: str) -> Optional[User]:
         """Get user by email."""
@@ -85,38 +234,38 @@ class AuthService:
         await self.db.refresh(user)
         return user
     
+    async def upsert_google_user(self, user_info: dict) -> User:
+        """Find, link or create the user for a Google identity in one statement."""
+        result = await self.db.execute(
+            select(User)
+            .from_statement(GOOGLE_LOGIN_UPSERT)
+            .execution_options(populate_existing=True),
+            {
+                "user_id": uuid4(),
+                "user_email": user_info["email"],
+                "user_full_name": user_info.get("name"),
+                "user_google_id": user_info["id"],
+                "user_picture": user_info.get("picture"),
+                "login_at": datetime.utcnow(),
+            }
+        )
+        return result.scalars().one()
+    
     async def authenticate_google_user(self, code: str) -> tuple[User, str]:
         """Authenticate user with Google OAuth code."""
         # Exchange code for token
         token = await self.google_oauth.get_access_token(code)
         
-        # Get user info from Google
-        user_info = await self.google_oauth.get_user_info(token)
-        
-        # Check if user exists
-        user = await self.get_user_by_google_id(user_info["id"])
-        
-        if not user:
-            # Check by email
-            user = await self.get_user_by_email(user_info["email"])
-            
-            if user:
-                # Update existing user with Google ID
-                user.google_id = user_info["id"]
-                user.profile_picture = user_info.get("picture")
-                user.full_name = user_info.get("name", user.full_name)
-            else:
-                # Create new user
-                user_data = UserCreate(
-                    email=user_info["email"],
-                    full_name=user_info.get("name"),
-                    google_id=user_info["id"],
-                    profile_picture=user_info.get("picture")
-                )
-                user = await self.create_user(user_data)
+        # Verify the id_token locally instead of calling the userinfo endpoint
+        claims = await self.google_oauth.verify_id_token(token)
+        user_info = {
+            "id": claims["sub"],
+            "email": claims["email"],
+            "name": claims.get("name"),
+            "picture": claims.get("picture"),
+        }
         
-        # Update last login
-        user.last_login = datetime.utcnow()
+        user = await self.upsert_google_user(user_info)
         await self.db.commit()
         
         # Create access token
@@ -127,4 +276,4 @@ class AuthService:
             }
         )
         
-        return user, access_token
\ No newline at end of file
+        return user, access_token
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.security import verify_token
+from app.models import User
+from app.schemas.conversation import ChatRequest
+from app.services.chat import ChatService, TurnBudget
+
+logger = logging.getLogger(__name__)
+
+AUTH_TIMEOUT_SECONDS = 10.0
+# Per-conversation turn locks kept for the most recently used conversations
+MAX_CONVERSATION_LOCKS = 16
+
+
+class ChatSocketSession:
+    """One authenticated chat WebSocket connection.
+
+    The bearer token is verified and the user loaded once, when the socket
+    opens. Each turn re-reads its conversation in a short-lived DB session,
+    so changes made over HTTP or another connection (including deletion)
+    are seen, and an idle connection holds no database connection. Turns
+    for different conversations run concurrently; turns within one
+    conversation are serialized.
+
+    Frames are JSON objects with a `type`:
+
+    - client: `auth`, `message` (`message`, optional `conversation_id` and
+      `client_id`), `ping`, `pong`
+    - server: `ready`, `delta`, `message` (a `ChatResponse`), `error`,
+      `ping`, `pong`
+
+    Backpressure: once `WS_MAX_INFLIGHT_TURNS` turns are running the socket
+    is not read until one finishes, and outgoing frames go through a bounded
+    queue so a slow reader pauses generation instead of buffering it.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.user: Optional[User] = None
+        self._locks: "OrderedDict[UUID, asyncio.Lock]" = OrderedDict()
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self._turn_slots = asyncio.Semaphore(settings.WS_MAX_INFLIGHT_TURNS)
+        self._turns: set[asyncio.Task] = set()
+        self._last_received = 0.0
+
+    async def run(self) -> None:
+        """Serve the connection until the client goes away."""
+        await self.websocket.accept()
+        if not await self._authenticate():
+            return
+
+        writer = asyncio.create_task(self._write_loop())
+        try:
+            await self._send({"type": "ready", "user_id": str(self.user.id)})
+            await self._read_loop()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for turn in self._turns:
+                turn.cancel()
+            writer.cancel()
+
+    async def _authenticate(self) -> bool:
+        token = self.websocket.query_params.get("token")
+        if token is None:
+            try:
+                frame = await asyncio.wait_for(self.websocket.receive_json(), AUTH_TIMEOUT_SECONDS)
+            except (asyncio.TimeoutError, ValueError, WebSocketDisconnect):
+                frame = {}
+            if frame.get("type") == "auth":
+                token = frame.get("token")
+
+        payload = verify_token(token) if token else None
+        user_id = payload.get("sub") if payload else None
+        if user_id:
+            async with async_session() as db:
+                result = await db.execute(select(User).where(User.id == user_id))
+                self.user = result.scalar_one_or_none()
+
+        if self.user is None or not self.user.is_active:
+            await self.websocket.close(
+                code=status.WS_1008_POLICY_VIOLATION,
+                reason="Could not validate credentials"
+            )
+            return False
+        return True
+
+    async def _read_loop(self) -> None:
+        while True:
+            await self._turn_slots.acquire()
+            try:
+                frame = await self._receive()
+            except BaseException:
+                self._turn_slots.release()
+                raise
+            if not self._dispatch(frame):
+                self._turn_slots.release()
+
+    async def _receive(self) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        self._last_received = loop.time()
+        while True:
+            try:
+                frame = await asyncio.wait_for(
+                    self.websocket.receive_json(),
+                    settings.WS_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                idle = loop.time() - self._last_received
+                if not self._turns and idle >= settings.WS_IDLE_TIMEOUT_SECONDS:
+                    await self.websocket.close(code=status.WS_1001_GOING_AWAY)
+                    raise WebSocketDisconnect(status.WS_1001_GOING_AWAY)
+                await self._send({"type": "ping"})
+                continue
+            except ValueError:
+                await self._send({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+
+            self._last_received = loop.time()
+            if isinstance(frame, dict):
+                return frame
+            await self._send({"type": "error", "detail": "Frames must be JSON objects"})
+
+    def _dispatch(self, frame: Dict[str, Any]) -> bool:
+        """Handle one frame; return True if it started a turn holding a slot."""
+        frame_type = frame.get("type")
+        client_id = frame.get("client_id")
+
+        if frame_type == "ping":
+            self._send_nowait({"type": "pong"})
+            return False
+        if frame_type in ("pong", "auth"):
+            return False
+        if frame_type != "message":
+            self._send_nowait({
+                "type": "error",
+                "client_id": client_id,
+                "detail": f"Unknown frame type: {frame_type}"
+            })
+            return False
+
+        try:
+            request = ChatRequest(
+                message=frame.get("message"),
+                conversation_id=frame.get("conversation_id")
+            )
+        except ValidationError as e:
+            self._send_nowait({"type": "error", "client_id": client_id, "detail": e.errors()})
+            return False
+
+        turn = asyncio.create_task(self._run_turn(request, client_id, TurnBudget()))
+        self._turns.add(turn)
+
+        def _finished(task: asyncio.Task) -> None:
+            self._turns.discard(task)
+            self._turn_slots.release()
+
+        turn.add_done_callback(_finished)
+        return True
+
+    async def _run_turn(self, request: ChatRequest, client_id: Optional[str], budget: TurnBudget) -> None:
+        conversation_id = request.conversation_id
+        lock = self._lock(conversation_id) if conversation_id else asyncio.Lock()
+
+        try:
+            async with lock:
+                async with async_session() as db:
+                    chat_service = ChatService(db)
+                    if conversation_id is None:
+                        conversation = await chat_service.create_conversation(self.user.id)
+                    else:
+                        conversation = await chat_service.get_conversation(self.user.id, conversation_id)
+                    if conversation is None:
+                        await self._send({
+                            "type": "error",
+                            "client_id": client_id,
+                            "conversation_id": str(conversation_id),
+                            "detail": "Conversation not found"
+                        })
+                        return
+
+                    async def on_delta(delta: str) -> None:
+                        await self._send({
+                            "type": "delta",
+                            "client_id": client_id,
+                            "conversation_id": str(conversation.id),
+                            "delta": delta
+                        })
+
+                    response = await chat_service.process_message(
+                        conversation,
+                        request.message,
+                        on_delta,
+                        budget
+                    )
+
+            await self._send({
+                "type": "message",
+                "client_id": client_id,
+                **response.model_dump(mode="json")
+            })
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Chat turn failed")
+            await self._send({
+                "type": "error",
+                "client_id": client_id,
+                "detail": "Failed to process message"
+            })
+
+    def _lock(self, conversation_id: UUID) -> asyncio.Lock:
+        lock = self._locks.get(conversation_id)
+        if lock is None:
+            lock = self._locks[conversation_id] = asyncio.Lock()
+        self._locks.move_to_end(conversation_id)
+        # Forget idle locks of conversations not used for a while
+        for stale in list(self._locks)[:-MAX_CONVERSATION_LOCKS]:
+            if not self._locks[stale].locked():
+                del self._locks[stale]
+        return lock
+
+    async def _send(self, frame: Dict[str, Any]) -> None:
+        await self._outbox.put(frame)
+
+    def _send_nowait(self, frame: Dict[str, Any]) -> None:
+        try:
+            self._outbox.put_nowait(frame)
+        except asyncio.QueueFull:
+            logger.warning("Dropping control frame for a slow WebSocket client")
+
+    async def _write_loop(self) -> None:
+        while True:
+            frame = await self._outbox.get()
+            await self.websocket.send_json(frame)
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.metrics import record_cache
+from app.models import ComponentDecision, ComponentDecisionEvent, UserPreferenceWeights
+from app.schemas.ranking import PreferenceWeights
+
+logger = logging.getLogger(__name__)
+
+# How much one decision moves the weights of the component's tags, price and timing
+DECISION_SIGNALS = {
+    ComponentDecision.CHOSEN: 1.0,
+    ComponentDecision.VETOED: -1.0,
+    ComponentDecision.CONSIDERING: 0.25,
+}
+
+
+def fold_events(aggregate: UserPreferenceWeights, events: Iterable[Dict[str, Any]]) -> None:
+    """Add decision events to a user's running sums."""
+    tag_sums = dict(aggregate.tag_sums or {})
+    price_sums = dict(aggregate.price_sums or {})
+    timing_sums = dict(aggregate.timing_sums or {})
+    decisions = aggregate.decisions or 0
+    last_event_id = aggregate.last_event_id or 0
+
+    for event in events:
+        signal = DECISION_SIGNALS[event["decision"]]
+        for tag in set(event.get("tags") or []):
+            tag_sums[tag] = tag_sums.get(tag, 0.0) + signal
+        if event.get("price_level") is not None:
+            level = str(event["price_level"])
+            price_sums[level] = price_sums.get(level, 0.0) + signal
+        if event.get("time_slot"):
+            timing_sums[event["time_slot"]] = timing_sums.get(event["time_slot"], 0.0) + signal
+        decisions += 1
+        last_event_id = max(last_event_id, event["id"])
+
+    # New dicts, so the JSON columns are flagged as changed
+    aggregate.tag_sums = tag_sums
+    aggregate.price_sums = price_sums
+    aggregate.timing_sums = timing_sums
+    aggregate.decisions = decisions
+    aggregate.last_event_id = last_event_id
+
+
+def to_weights(aggregate: Optional[UserPreferenceWeights]) -> PreferenceWeights:
+    """Average signal per decision, which keeps every weight within [-1, 1]."""
+    if aggregate is None or not aggregate.decisions:
+        return PreferenceWeights()
+    n = aggregate.decisions
+    return PreferenceWeights(
+        tag_weights={tag: total / n for tag, total in aggregate.tag_sums.items()},
+        price_weights={int(level): total / n for level, total in aggregate.price_sums.items()},
+        timing_weights={slot: total / n for slot, total in aggregate.timing_sums.items()},
+    )
+
+
+class PreferenceCache:
+    """Per-user `PreferenceWeights` for ranking, read from `user_preference_weights`.
+
+    Entries are dropped as soon as this process records a decision for the
+    user; decisions recorded by other workers show up within `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        ttl: float = settings.PREFERENCE_CACHE_TTL_SECONDS,
+        max_entries: int = settings.PREFERENCE_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[UUID, tuple[float, PreferenceWeights]]" = OrderedDict()
+
+    async def get(self, user_id: UUID) -> PreferenceWeights:
+        """The user's current weights (empty for a user with no decisions)."""
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            record_cache("preference_weights", True)
+            return entry[1]
+
+        record_cache("preference_weights", False)
+        async with async_session() as session:
+            aggregate = await session.get(UserPreferenceWeights, user_id)
+            weights = to_weights(aggregate)
+        self._entries[user_id] = (time.monotonic() + self.ttl, weights)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return weights
+
+    def invalidate(self, user_ids: Iterable[UUID]) -> None:
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+
+
+class DecisionRecorder:
+    """Append component decisions in batches and fold them into the users' aggregates.
+
+    `record` waits until its event is committed, but events arriving within
+    `flush_interval` of each other (or up to `batch_size` of them) share one
+    multi-row INSERT and one transaction. The same transaction locks the
+    affected `user_preference_weights` rows and adds the new events to them,
+    so every event is counted exactly once and no aggregate is ever rebuilt
+    from the full history. A batch rejected for its data is retried one event
+    at a time, so only the offending event's caller gets the error.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.DECISION_BATCH_SIZE,
+        flush_interval: float = settings.DECISION_FLUSH_INTERVAL_SECONDS,
+        cache: Optional[PreferenceCache] = None,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.cache = cache
+        self._pending: List[tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def record(
+        self,
+        user_id: UUID,
+        component_id: str,
+        decision: ComponentDecision,
+        tags: Sequence[str] = (),
+        price_level: Optional[int] = None,
+        time_slot: Optional[str] = None,
+        trip_id: Optional[UUID] = None,
+        reason: Optional[str] = None,
+    ) -> None:
+        """Store a decision; returns once it is committed."""
+        event = {
+            "user_id": user_id,
+            "trip_id": trip_id,
+            "component_id": component_id,
+            "decision": decision,
+            "tags": list(tags),
+            "price_level": price_level,
+            "time_slot": time_slot,
+            "reason": reason,
+            "created_at": datetime.utcnow(),
+        }
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((event, future))
+        if len(self._pending) >= self.batch_size:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._schedule_flush)
+        # The flush owns the write; a cancelled caller doesn't take its event back
+        await asyncio.shield(future)
+
+    def _schedule_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        events = [event for event, _ in batch]
+        try:
+            await self._write(events)
+        except Exception as e:
+            if len(batch) > 1 and isinstance(e, (IntegrityError, DataError)):
+                # e.g. a trip deleted after its owner was checked
+                logger.warning("A batch of %d component decisions was rejected (%s); writing them one by one", len(batch), e)
+                for item in batch:
+                    await self._flush([item])
+                return
+            logger.exception("Failed to record %d component decisions", len(events))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def _write(self, events: List[Dict[str, Any]]) -> None:
+        user_ids = sorted({event["user_id"] for event in events})
+        async with async_session() as session:
+            result = await session.execute(
+                insert(ComponentDecisionEvent).returning(
+                    ComponentDecisionEvent.id,
+                    sort_by_parameter_order=True
+                ),
+                events
+            )
+            for event, event_id in zip(events, result.scalars().all()):
+                event["id"] = event_id
+
+            await session.execute(
+                pg_insert(UserPreferenceWeights)
+                .values([{"user_id": user_id} for user_id in user_ids])
+                .on_conflict_do_nothing(index_elements=[UserPreferenceWeights.user_id])
+            )
+            # Locked in user_id order, so concurrent batches can't deadlock
+            aggregates = await session.execute(
+                select(UserPreferenceWeights)
+                .where(UserPreferenceWeights.user_id.in_(user_ids))
+                .order_by(UserPreferenceWeights.user_id)
+                .with_for_update()
+            )
+            by_user = {aggregate.user_id: aggregate for aggregate in aggregates.scalars()}
+            for user_id in user_ids:
+                fold_events(by_user[user_id], (e for e in events if e["user_id"] == user_id))
+            await session.commit()
+
+        if self.cache is not None:
+            self.cache.invalidate(user_ids)
+
+    async def close(self) -> None:
+        """Write whatever is still buffered."""
+        self._schedule_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+preference_cache = PreferenceCache()
+decision_recorder = DecisionRecorder(cache=preference_cache)
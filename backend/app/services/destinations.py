@@ -0,0 +1,259 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import record_cache
+from app.schemas.destination import Destination, DestinationSearchResult
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Prefixes up to this length match too many keys to rank per keystroke,
+# so their top results are precomputed when the index is built.
+_PRECOMPUTED_PREFIX_LENGTH = 3
+_PRECOMPUTED_RESULTS = 50
+_MIN_FUZZY_SIMILARITY = 0.3
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse punctuation to single spaces."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    """Padded character trigrams of an already normalized string."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DestinationIndex:
+    """Immutable in-memory search index over a destination catalog.
+
+    Prefix lookups use a sorted key array searched with `bisect`, which is the
+    flattened form of a prefix trie; every destination is keyed by its full
+    name, each name token and each alias. Misspellings fall back to trigram
+    similarity over names and aliases. Results are ranked by match quality, then popularity.
+    """
+
+    def __init__(self, destinations: List[Destination]):
+        self.destinations = destinations
+        max_popularity = max((d.popularity for d in destinations), default=0.0) or 1.0
+        self._popularity = [d.popularity / max_popularity for d in destinations]
+        self._names = [normalize(d.name) for d in destinations]
+
+        entries: List[Tuple[str, int]] = []
+        for idx, destination in enumerate(destinations):
+            terms = {self._names[idx]}
+            for label in [destination.name, *destination.aliases]:
+                normalized = normalize(label)
+                terms.add(normalized)
+                terms.update(normalized.split())
+            entries.extend((term, idx) for term in terms if term)
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._key_ids = [idx for _, idx in entries]
+
+        by_popularity = sorted(range(len(destinations)), key=lambda i: -self._popularity[i])
+        rank = {idx: position for position, idx in enumerate(by_popularity)}
+        prefix_ids: Dict[str, List[int]] = defaultdict(list)
+        for key, idx in entries:
+            for length in range(1, min(len(key), _PRECOMPUTED_PREFIX_LENGTH) + 1):
+                prefix_ids[key[:length]].append(idx)
+        self._top_by_prefix = {
+            prefix: sorted(set(ids), key=rank.__getitem__)[:_PRECOMPUTED_RESULTS]
+            for prefix, ids in prefix_ids.items()
+        }
+
+        # Fuzzy matching runs over every label (name and aliases); postings
+        # hold label positions, which map back to destinations
+        self._label_ids: List[int] = []
+        self._trigram_counts = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for idx, destination in enumerate(destinations):
+            labels = {self._names[idx], *(normalize(alias) for alias in destination.aliases)}
+            for label in sorted(labels):
+                if not label:
+                    continue
+                grams = trigrams(label)
+                for gram in grams:
+                    self._postings[gram].append(len(self._label_ids))
+                self._label_ids.append(idx)
+                self._trigram_counts.append(len(grams))
+
+    def __len__(self) -> int:
+        return len(self.destinations)
+
+    def search(self, query: str, limit: int = 10) -> List[DestinationSearchResult]:
+        """Return the best matches for a (possibly partial) query."""
+        q = normalize(query)
+        if not q or not self.destinations:
+            return []
+
+        scored: Dict[int, float] = {}
+        for idx in self._prefix_matches(q, limit):
+            score = 1.0 + self._popularity[idx]
+            if self._names[idx] == q:
+                score += 1.0
+            elif self._names[idx].startswith(q):
+                score += 0.5
+            scored[idx] = score
+
+        if len(scored) < limit and len(q) >= 3:
+            for idx, similarity in self._fuzzy_matches(q):
+                if idx not in scored:
+                    scored[idx] = similarity + 0.1 * self._popularity[idx]
+
+        ranked = sorted(scored.items(), key=lambda item: -item[1])[:limit]
+        return [self._to_result(idx, score) for idx, score in ranked]
+
+    def _prefix_matches(self, q: str, limit: int) -> List[int]:
+        if len(q) <= _PRECOMPUTED_PREFIX_LENGTH:
+            record_cache("destination_prefix", True)
+            return self._top_by_prefix.get(q, [])
+        record_cache("destination_prefix", False)
+
+        lo = bisect_left(self._keys, q)
+        hi = bisect_left(self._keys, q + "\uffff", lo)
+        ids = set(self._key_ids[lo:hi])
+        return sorted(ids, key=lambda i: -self._popularity[i])[:max(limit, _PRECOMPUTED_RESULTS)]
+
+    def _fuzzy_matches(self, q: str) -> List[Tuple[int, float]]:
+        grams = trigrams(q)
+        postings = sorted(
+            (self._postings.get(gram, []) for gram in grams),
+            key=len,
+        )
+        # A match needs at least `min_shared` query trigrams, so it must appear
+        # in one of the rarest len(grams) - min_shared + 1 posting lists. The
+        # remaining (common) lists are only probed for those candidates.
+        min_shared = math.ceil(_MIN_FUZZY_SIMILARITY * len(grams))
+        split = len(grams) - min_shared + 1
+        shared: Dict[int, int] = defaultdict(int)
+        for posting in postings[:split]:
+            for label in posting:
+                shared[label] += 1
+        for posting in postings[split:]:
+            for label in shared:
+                position = bisect_left(posting, label)
+                if position < len(posting) and posting[position] == label:
+                    shared[label] += 1
+
+        # A destination scores as its best-matching label
+        best: Dict[int, float] = {}
+        for label, count in shared.items():
+            similarity = count / (len(grams) + self._trigram_counts[label] - count)
+            idx = self._label_ids[label]
+            if similarity >= _MIN_FUZZY_SIMILARITY and similarity > best.get(idx, 0.0):
+                best[idx] = similarity
+        return list(best.items())
+
+    def _to_result(self, idx: int, score: float) -> DestinationSearchResult:
+        destination = self.destinations[idx]
+        return DestinationSearchResult(
+            id=destination.id,
+            name=destination.name,
+            country=destination.country,
+            region=destination.region,
+            latitude=destination.latitude,
+            longitude=destination.longitude,
+            popularity=destination.popularity,
+            score=round(score, 4),
+        )
+
+
+def load_catalog(path: str) -> List[Destination]:
+    """Read a JSON destination catalog."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.strip():
+        return []
+    raw = json.loads(data)
+
+    if isinstance(raw, dict):
+        raw = raw.get("destinations", [])
+    return [Destination(**item) for item in raw]
+
+
+class DestinationCatalog:
+    """Serve searches from the current index and hot-reload it on change.
+
+    The catalog file is stat'ed at most once per reload interval. When it
+    changes, a new index is built in a worker thread and swapped in, while
+    searches keep using the previous one.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.DESTINATION_CATALOG_PATH,
+        reload_interval: float = settings.DESTINATION_RELOAD_INTERVAL_SECONDS,
+    ):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.index = DestinationIndex([])
+        self._signature: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._reload_task: Optional[asyncio.Task] = None
+
+    def _stat_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> None:
+        """Build the index synchronously from the catalog file."""
+        signature = self._stat_signature()
+        if signature is None:
+            logger.warning("Destination catalog not found at %s", self.path)
+            self.index = DestinationIndex([])
+        else:
+            started = time.perf_counter()
+            self.index = DestinationIndex(load_catalog(self.path))
+            logger.info(
+                "Loaded %d destinations in %.1f ms",
+                len(self.index),
+                (time.perf_counter() - started) * 1000,
+            )
+        self._signature = signature
+        self._checked_at = time.monotonic()
+
+    def maybe_reload(self) -> None:
+        """Schedule a background rebuild if the catalog file has changed."""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+
+        if self._reload_task is not None and not self._reload_task.done():
+            return
+        if self._stat_signature() == self._signature:
+            return
+
+        self._reload_task = asyncio.get_running_loop().create_task(asyncio.to_thread(self.load))
+        self._reload_task.add_done_callback(self._reload_finished)
+
+    def _reload_finished(self, task: asyncio.Task) -> None:
+        # Searches keep the previous index; the next check retries the reload
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Reloading destination catalog from %s failed", self.path, exc_info=task.exception())
+
+    def search(self, query: str, limit: int = 10) -> List[DestinationSearchResult]:
+        """Search the current index."""
+        self.maybe_reload()
+        return self.index.search(query, limit)
+
+
+destination_catalog = DestinationCatalog()
@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+MAX_MEMORY_ENTRIES = 4096
+
+
+class IdempotencyConflict(Exception):
+    """No result is available for the key: still running, or the original failed."""
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used for a different request."""
+
+
+def fingerprint(payload: Any) -> str:
+    """Stable hash of a request body, to detect a key reused for another request."""
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class _MemoryBackend:
+    """Process-local stand-in for Redis with the same SET NX / EX semantics."""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, str]] = {}
+
+    async def set(self, key: str, value: str, ttl: float, nx: bool = False) -> bool:
+        now = time.monotonic()
+        if nx:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return False
+        self._entries[key] = (now + ttl, value)
+        if len(self._entries) > MAX_MEMORY_ENTRIES:
+            self._entries = {k: e for k, e in self._entries.items() if e[0] > now}
+        return True
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+class _RedisBackend:
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        from redis.exceptions import RedisError
+
+        self._redis = redis.from_url(url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        # Failures that mean Redis is unavailable rather than a bug
+        self.errors = (RedisError, OSError)
+
+    async def set(self, key: str, value: str, ttl: float, nx: bool = False) -> bool:
+        return bool(await self._redis.set(key, value, px=int(ttl * 1000), nx=nx))
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._redis.get(key)
+        return value.decode() if value is not None else None
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(key)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class IdempotencyStore:
+    """Run an operation at most once per idempotency key.
+
+    A key is claimed with `SET NX` holding a short-lived pending marker, so
+    only one worker runs the operation; its JSON result then replaces the
+    marker for `ttl` seconds and later retries get it back unchanged.
+    Duplicates arriving while the operation is still running attach to the
+    in-flight result: directly when it runs in this process, otherwise by
+    polling the store until it completes. A failed operation releases the
+    key so the client can retry.
+
+    With a `redis_url`, Redis is used while it is reachable; otherwise
+    entries live in process memory, which still covers retries that land
+    on the same worker.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = settings.REDIS_URL if settings.IDEMPOTENCY_USE_REDIS else None,
+        ttl: float = settings.IDEMPOTENCY_KEY_TTL_SECONDS,
+        pending_ttl: float = settings.IDEMPOTENCY_PENDING_TTL_SECONDS,
+        poll_interval: float = 0.1,
+        redis_retry_seconds: float = 30.0,
+    ):
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.poll_interval = poll_interval
+        self.redis_retry_seconds = redis_retry_seconds
+        self._redis: Optional[_RedisBackend] = None
+        self._redis_down_until = 0.0
+        self._memory = _MemoryBackend()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    async def run(
+        self,
+        key: str,
+        request_fingerprint: str,
+        operation: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Return the stored result for `key`, running `operation` if it is new."""
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            owner_fingerprint, future = in_flight
+            if owner_fingerprint != request_fingerprint:
+                raise IdempotencyKeyReused(key)
+            return await asyncio.shield(future)
+
+        pending = json.dumps({"status": PENDING, "fingerprint": request_fingerprint})
+        if not await self._call("set", key, pending, self.pending_ttl, nx=True):
+            return await self._wait_for_result(key, request_fingerprint)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (request_fingerprint, future)
+        try:
+            result = await operation()
+        except BaseException as e:
+            await self._call("delete", key)
+            if not isinstance(e, Exception):
+                e = IdempotencyConflict("The original request was interrupted; retry")
+            future.set_exception(e)
+            # Retrieve it so an un-joined future doesn't log "never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+        stored = json.dumps({"status": DONE, "fingerprint": request_fingerprint, "result": result})
+        await self._call("set", key, stored, self.ttl)
+        future.set_result(result)
+        return result
+
+    async def _wait_for_result(self, key: str, request_fingerprint: str) -> Dict[str, Any]:
+        deadline = time.monotonic() + self.pending_ttl
+        while True:
+            raw = await self._call("get", key)
+            if raw is None:
+                raise IdempotencyConflict("The original request failed; retry")
+
+            entry = json.loads(raw)
+            if entry["fingerprint"] != request_fingerprint:
+                raise IdempotencyKeyReused(key)
+            if entry["status"] == DONE:
+                return entry["result"]
+            if time.monotonic() >= deadline:
+                raise IdempotencyConflict("A request with this key is still in progress")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _call(self, method: str, *args, **kwargs):
+        backend = self._backend()
+        if backend is not self._memory:
+            try:
+                return await getattr(backend, method)(*args, **kwargs)
+            except backend.errors as e:
+                self._redis_unavailable(e)
+        return await getattr(self._memory, method)(*args, **kwargs)
+
+    def _backend(self):
+        if not self.redis_url or time.monotonic() < self._redis_down_until:
+            return self._memory
+        if self._redis is None:
+            self._redis = _RedisBackend(self.redis_url)
+        return self._redis
+
+    def _redis_unavailable(self, error: Exception) -> None:
+        logger.warning(
+            "Redis unavailable for idempotency keys (%s); using process memory for %.0fs",
+            error,
+            self.redis_retry_seconds,
+        )
+        self._redis_down_until = time.monotonic() + self.redis_retry_seconds
+
+    async def close(self) -> None:
+        """Close the Redis connection pool."""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,311 @@
+from datetime import date, time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.schemas.itinerary import DayPlan, ItineraryStop, ScheduledStop
+from app.services.locations import coordinates
+
+EARTH_RADIUS_KM = 6371.0088
+MINUTES_PER_DAY = 24 * 60
+
+
+def haversine_matrix(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Pairwise great-circle distances in km for arrays of coordinates."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lng = np.radians(np.asarray(longitudes, dtype=np.float64))
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _to_minutes(value: Optional[time], default: float) -> float:
+    if value is None:
+        return default
+    return value.hour * 60 + value.minute
+
+
+def _to_time(minutes: float) -> time:
+    """Clock time of a minute offset; offsets past midnight wrap to the next day's clock."""
+    minutes = int(round(max(minutes, 0))) % MINUTES_PER_DAY
+    return time(minutes // 60, minutes % 60)
+
+
+class ItineraryOptimizer:
+    """Order a day's components into a short route that respects opening hours.
+
+    Travel times come from a NumPy haversine matrix at a flat average speed.
+    The route is seeded with a time-aware nearest-neighbour pass and then
+    improved with 2-opt, where all segment reversals are scored in one
+    vectorized step and only the improving ones are checked against the
+    opening-hour windows. Each pass applies every improving reversal that
+    doesn't overlap one already taken, best first, so a route converges in
+    a few passes rather than one move per pass.
+    """
+
+    def __init__(
+        self,
+        speed_kmh: float = settings.ITINERARY_TRAVEL_SPEED_KMH,
+        day_start: time = time.fromisoformat(settings.ITINERARY_DAY_START),
+        max_iterations: int = 200,
+    ):
+        self.speed_kmh = speed_kmh
+        self.day_start = day_start
+        self.max_iterations = max_iterations
+
+    def optimize_day(
+        self,
+        stops: List[ItineraryStop],
+        start: Optional[Tuple[float, float]] = None,
+        day: Optional[date] = None,
+        day_start: Optional[time] = None,
+    ) -> DayPlan:
+        """Plan one day, optionally starting from a fixed (lat, lng) such as the hotel."""
+        if not stops:
+            return DayPlan(day=day)
+
+        latitudes = [stop.latitude for stop in stops]
+        longitudes = [stop.longitude for stop in stops]
+        if start is not None:
+            latitudes.insert(0, start[0])
+            longitudes.insert(0, start[1])
+        distances = haversine_matrix(np.array(latitudes), np.array(longitudes))
+        offset = 1 if start is not None else 0
+
+        n = len(latitudes)
+        opens = np.zeros(n)
+        closes = np.full(n, float(MINUTES_PER_DAY))
+        service = np.zeros(n)
+        for i, stop in enumerate(stops, start=offset):
+            opens[i] = _to_minutes(stop.opens_at, 0.0)
+            closes[i] = _to_minutes(stop.closes_at, float(MINUTES_PER_DAY))
+            service[i] = stop.duration_minutes
+
+        travel = distances / self.speed_kmh * 60.0
+        begin = _to_minutes(day_start or self.day_start, 0.0)
+
+        route, unscheduled = self._nearest_neighbour(travel, opens, closes, service, begin, offset)
+        route = self._two_opt(route, travel, opens, closes, service, begin, fixed_start=offset == 1)
+
+        _, arrivals, departures = self._schedule(route, travel, opens, closes, service, begin)
+        plan = DayPlan(day=day)
+        previous = None
+        for position, node in enumerate(route):
+            if node < offset:
+                previous = node
+                continue
+            stop = stops[node - offset]
+            plan.stops.append(ScheduledStop(
+                id=stop.id,
+                name=stop.name,
+                arrival=_to_time(arrivals[position]),
+                departure=_to_time(departures[position]),
+                travel_minutes=round(float(travel[previous, node]), 1) if previous is not None else 0.0,
+            ))
+            previous = node
+        plan.unscheduled = [stops[node - offset].id for node in unscheduled]
+        plan.total_distance_km = round(float(sum(distances[a, b] for a, b in zip(route, route[1:]))), 3)
+        return plan
+
+    def optimize_itinerary(self, itinerary: Dict[str, Any]) -> Dict[str, Any]:
+        """Reorder every day of a `Trip.itinerary` document.
+
+        Expects `{"days": [{"date": ..., "start": {...}, "components": [...]}]}`
+        where each component has a `location` with `lat`/`lng` (and usually an
+        `id`, which is what `unscheduled` lists). Components without
+        coordinates are kept at the end in their original order.
+        """
+        days = []
+        for day in itinerary.get("days", []):
+            components = day.get("components", [])
+            # Stops are keyed by position: ids may be missing or repeated
+            stops, unplaced = [], []
+            for position, component in enumerate(components):
+                stop = _component_to_stop(component, str(position))
+                if stop is None:
+                    unplaced.append(component)
+                else:
+                    stops.append(stop)
+
+            start = coordinates(day.get("start"))
+            day_date = date.fromisoformat(day["date"]) if day.get("date") else None
+            plan = self.optimize_day(stops, start=start, day=day_date)
+
+            ordered = []
+            for scheduled in plan.stops:
+                component = dict(components[int(scheduled.id)])
+                component["arrival"] = scheduled.arrival.isoformat(timespec="minutes")
+                component["departure"] = scheduled.departure.isoformat(timespec="minutes")
+                ordered.append(component)
+            unscheduled = [components[int(position)] for position in plan.unscheduled]
+            ordered.extend(unscheduled)
+            ordered.extend(unplaced)
+
+            days.append({
+                **day,
+                "components": ordered,
+                "unscheduled": [component.get("id") for component in unscheduled],
+                "total_distance_km": plan.total_distance_km,
+            })
+        return {**itinerary, "days": days}
+
+    def _nearest_neighbour(
+        self,
+        travel: np.ndarray,
+        opens: np.ndarray,
+        closes: np.ndarray,
+        service: np.ndarray,
+        begin: float,
+        offset: int,
+    ) -> Tuple[List[int], List[int]]:
+        n = len(opens)
+        unvisited = np.ones(n, dtype=bool)
+        if offset:
+            route = [0]
+            unvisited[0] = False
+            clock = begin
+        else:
+            # Start with the stop that can be served earliest within its window
+            start_service = np.maximum(begin, opens)
+            feasible = start_service + service <= closes
+            if not feasible.any():
+                return [], list(range(n))
+            first = int(np.argmin(np.where(feasible, start_service + service * 1e-6, np.inf)))
+            route = [first]
+            unvisited[first] = False
+            clock = start_service[first] + service[first]
+
+        while unvisited.any():
+            candidates = np.flatnonzero(unvisited)
+            arrival = clock + travel[route[-1], candidates]
+            start_service = np.maximum(arrival, opens[candidates])
+            feasible = start_service + service[candidates] <= closes[candidates]
+            if not feasible.any():
+                break
+            cost = np.where(feasible, start_service - clock, np.inf)
+            chosen = int(candidates[np.argmin(cost)])
+            route.append(chosen)
+            unvisited[chosen] = False
+            clock = max(clock + travel[route[-2], chosen], opens[chosen]) + service[chosen]
+
+        return route, [int(node) for node in np.flatnonzero(unvisited)]
+
+    def _two_opt(
+        self,
+        route: List[int],
+        travel: np.ndarray,
+        opens: np.ndarray,
+        closes: np.ndarray,
+        service: np.ndarray,
+        begin: float,
+        fixed_start: bool,
+    ) -> List[int]:
+        if len(route) < 3:
+            return route
+
+        # Plain lists make the per-candidate schedule simulation much cheaper than numpy scalars
+        windows = (travel.tolist(), opens.tolist(), closes.tolist(), service.tolist())
+        route = np.array(route)
+        first = 1 if fixed_start else 0
+        for _ in range(self.max_iterations):
+            n = len(route)
+            i, j = np.triu_indices(n, k=1)
+            keep = i >= first
+            i, j = i[keep], j[keep]
+
+            # Reversing route[i..j] swaps edges (i-1, i) and (j, j+1) for (i-1, j) and (i, j+1)
+            has_prev = i > 0
+            has_next = j < n - 1
+            prev = route[np.maximum(i - 1, 0)]
+            nxt = route[np.minimum(j + 1, n - 1)]
+            before = (
+                np.where(has_prev, travel[prev, route[i]], 0.0)
+                + np.where(has_next, travel[route[j], nxt], 0.0)
+            )
+            after = (
+                np.where(has_prev, travel[prev, route[j]], 0.0)
+                + np.where(has_next, travel[route[i], nxt], 0.0)
+            )
+            delta = after - before
+
+            # Reversals whose positions i-1..j+1 don't overlap change disjoint
+            # edges, so their deltas stay valid after the others are applied
+            taken = np.zeros(n, dtype=bool)
+            improved = False
+            improving = np.flatnonzero(delta < -1e-9)
+            for k in improving[np.argsort(delta[improving])]:
+                lo, hi = max(i[k] - 1, 0), min(j[k] + 1, n - 1)
+                if taken[lo:hi + 1].any():
+                    continue
+                candidate = route.copy()
+                candidate[i[k]:j[k] + 1] = candidate[i[k]:j[k] + 1][::-1]
+                if self._feasible(candidate, begin, *windows):
+                    route = candidate
+                    taken[lo:hi + 1] = True
+                    improved = True
+            if not improved:
+                break
+
+        return [int(node) for node in route]
+
+    @staticmethod
+    def _feasible(route, begin: float, travel, opens, closes, service) -> bool:
+        """Whether every stop of the route finishes before it closes (list inputs)."""
+        clock = begin
+        previous = None
+        for node in route.tolist():
+            if previous is not None:
+                clock += travel[previous][node]
+            clock = max(clock, opens[node]) + service[node]
+            if clock > closes[node]:
+                return False
+            previous = node
+        return True
+
+    def _schedule(
+        self,
+        route,
+        travel: np.ndarray,
+        opens: np.ndarray,
+        closes: np.ndarray,
+        service: np.ndarray,
+        begin: float,
+    ) -> Tuple[bool, List[float], List[float]]:
+        """Simulate the route, returning feasibility plus arrival/departure minutes."""
+        arrivals, departures = [], []
+        clock = begin
+        previous = None
+        feasible = True
+        for node in route:
+            if previous is not None:
+                clock += travel[previous, node]
+            start_service = max(clock, opens[node])
+            end = start_service + service[node]
+            if end > closes[node]:
+                feasible = False
+            arrivals.append(float(start_service))
+            departures.append(float(end))
+            clock = end
+            previous = node
+        return feasible, arrivals, departures
+
+
+def _component_to_stop(component: Dict[str, Any], stop_id: str) -> Optional[ItineraryStop]:
+    point = coordinates(component.get("location"))
+    if point is None:
+        return None
+    timing = component.get("timing") or {}
+    return ItineraryStop(
+        id=stop_id,
+        name=component.get("name"),
+        latitude=point[0],
+        longitude=point[1],
+        duration_minutes=component.get("duration_minutes", timing.get("duration_minutes", 60)),
+        opens_at=timing.get("opens_at"),
+        closes_at=timing.get("closes_at"),
+    )
+
+
+itinerary_optimizer = ItineraryOptimizer()
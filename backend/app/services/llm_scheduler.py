@@ -0,0 +1,268 @@
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import LLM_IN_FLIGHT, LLM_PREEMPTIONS, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # a live chat turn
+    SPECULATIVE = 1  # work a user will probably need soon (e.g. option pre-generation)
+    BACKGROUND = 2  # summarization, preference extraction
+
+
+class Preempted(Exception):
+    """Low-priority work was preempted more often than it may be retried."""
+
+
+@dataclass(order=True)
+class _Job:
+    finish: float
+    seq: int
+    start: float = field(compare=False)
+    priority: Priority = field(compare=False)
+    flow: Any = field(compare=False)
+    tokens: int = field(compare=False)
+    weight: float = field(compare=False)
+    call: Callable[[], Awaitable[Any]] = field(compare=False)
+    actual_tokens: Optional[Callable[[Any], int]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    attempts: int = field(compare=False, default=0)
+    task: Optional[asyncio.Task] = field(compare=False, default=None)
+    started_at: float = field(compare=False, default=0.0)
+    preempted: bool = field(compare=False, default=False)
+    # Tokens taken from the bucket when it last started
+    charged: float = field(compare=False, default=0.0)
+
+
+class LLMScheduler:
+    """Admission control in front of model calls.
+
+    Calls are queued per priority class and the highest non-empty class is
+    always served first. Within a class, users share capacity by weighted
+    fair queuing on estimated tokens: each call gets a virtual finish tag,
+    so one user with many queued calls cannot starve another with one.
+
+    A call starts only when a concurrency slot and enough tokens in the
+    tokens-per-minute bucket are free. The last `interactive_slots` slots
+    and `interactive_token_reserve` of the bucket are held back for
+    interactive turns. When an interactive turn finds every slot busy, the
+    newest lower-priority call is cancelled and queued again at the front
+    of its class, up to `max_preemptions` times before it fails with
+    `Preempted`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        interactive_slots: int = settings.LLM_INTERACTIVE_RESERVED_SLOTS,
+        tokens_per_minute: int = settings.LLM_TOKENS_PER_MINUTE,
+        interactive_token_reserve: float = settings.LLM_INTERACTIVE_TOKEN_RESERVE,
+        max_preemptions: int = settings.LLM_MAX_PREEMPTIONS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.interactive_slots = min(interactive_slots, max_concurrency - 1)
+        self.capacity = float(tokens_per_minute)
+        self.refill_per_second = tokens_per_minute / 60.0
+        self.token_reserve = self.capacity * interactive_token_reserve
+        self.max_preemptions = max_preemptions
+
+        self._tokens = self.capacity
+        self._refilled_at = time.monotonic()
+        self._queues: Dict[Priority, List[_Job]] = {priority: [] for priority in Priority}
+        self._virtual_time: Dict[Priority, float] = {priority: 0.0 for priority in Priority}
+        self._flow_finish: Dict[Tuple[Priority, Any], float] = {}
+        self._running: List[_Job] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        user_id: Any = None,
+        priority: Priority = Priority.INTERACTIVE,
+        tokens: int = settings.LLM_TURN_TOKEN_ESTIMATE,
+        actual_tokens: Optional[Callable[[T], int]] = None,
+        weight: float = 1.0,
+    ) -> T:
+        """Run `call` once the scheduler admits it and return its result.
+
+        `tokens` is the estimate charged against the per-minute budget up
+        front; `actual_tokens`, if given, reads the real count from the
+        result so the difference is settled afterwards. A user with
+        `weight` 2 gets twice the share of one with weight 1 when both
+        have calls queued in the same class. Cancelling the
+        caller removes a queued call or cancels a running one.
+        """
+        now = time.monotonic()
+        job = _Job(
+            finish=0.0,
+            seq=next(self._seq),
+            start=0.0,
+            priority=priority,
+            flow=user_id,
+            tokens=max(int(tokens), 1),
+            weight=weight,
+            call=call,
+            actual_tokens=actual_tokens,
+            future=asyncio.get_running_loop().create_future(),
+            enqueued_at=now,
+        )
+        self._tag(job)
+        self._enqueue(job)
+        self._dispatch()
+        try:
+            return await job.future
+        finally:
+            if job.task is None:
+                self._dequeue(job)
+            elif not job.task.done():
+                job.task.cancel()
+
+    def queue_depth(self, priority: Priority) -> int:
+        return len(self._queues[priority])
+
+    def _tag(self, job: _Job) -> None:
+        key = (job.priority, job.flow)
+        job.start = max(self._virtual_time[job.priority], self._flow_finish.get(key, 0.0))
+        job.finish = job.start + job.tokens / job.weight
+        self._flow_finish[key] = job.finish
+
+    def _enqueue(self, job: _Job) -> None:
+        heapq.heappush(self._queues[job.priority], job)
+        LLM_QUEUE_DEPTH.labels(priority=job.priority.name.lower()).inc()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.refill_per_second)
+        self._refilled_at = now
+
+    def _dispatch(self) -> None:
+        while True:
+            job = self._head()
+            if job is None:
+                return
+
+            interactive = job.priority == Priority.INTERACTIVE
+            slots = self.max_concurrency if interactive else self.max_concurrency - self.interactive_slots
+            if len(self._running) >= slots:
+                if interactive:
+                    self._preempt()
+                return
+
+            self._refill()
+            need = min(job.tokens, self.capacity)
+            reserve = 0.0 if interactive else self.token_reserve
+            if self._tokens < need + reserve:
+                self._wake_in((need + reserve - self._tokens) / self.refill_per_second)
+                return
+
+            self._tokens -= need
+            job.charged = need
+            self._start(job)
+
+    def _dequeue(self, job: _Job) -> None:
+        queue = self._queues[job.priority]
+        if job in queue:
+            queue.remove(job)
+            heapq.heapify(queue)
+            LLM_QUEUE_DEPTH.labels(priority=job.priority.name.lower()).dec()
+
+    def _head(self) -> Optional[_Job]:
+        """The next call to admit: the lowest finish tag in the highest non-empty class."""
+        for priority in Priority:
+            if self._queues[priority]:
+                return self._queues[priority][0]
+        return None
+
+    def _start(self, job: _Job) -> None:
+        heapq.heappop(self._queues[job.priority])
+        label = job.priority.name.lower()
+        LLM_QUEUE_DEPTH.labels(priority=label).dec()
+        LLM_QUEUE_WAIT.labels(priority=label).observe(time.monotonic() - job.enqueued_at)
+        LLM_IN_FLIGHT.labels(priority=label).inc()
+
+        self._virtual_time[job.priority] = max(self._virtual_time[job.priority], job.start)
+        if len(self._flow_finish) > 10000:
+            self._forget_idle_flows()
+
+        job.preempted = False
+        job.started_at = time.monotonic()
+        job.task = asyncio.create_task(self._execute(job))
+        self._running.append(job)
+
+    async def _execute(self, job: _Job) -> None:
+        try:
+            result = await job.call()
+        except asyncio.CancelledError:
+            if job.preempted and not job.future.done():
+                # It is charged again when it restarts
+                self._tokens = min(self.capacity, self._tokens + job.charged)
+                self._requeue(job)
+            elif not job.future.done():
+                job.future.cancel()
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if job.actual_tokens is not None:
+                try:
+                    used = job.actual_tokens(result)
+                except Exception:
+                    used = job.tokens
+                # Settle the estimate; an overrun may push the bucket below zero
+                self._tokens -= used - job.charged
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._running.remove(job)
+            LLM_IN_FLIGHT.labels(priority=job.priority.name.lower()).dec()
+            self._dispatch()
+
+    def _preempt(self) -> None:
+        """Cancel the newest lower-priority call, unless one is already being preempted."""
+        if any(job.preempted for job in self._running):
+            return
+        victims = [job for job in self._running if job.priority > Priority.INTERACTIVE]
+        if not victims:
+            return
+        victim = max(victims, key=lambda job: (job.priority, job.started_at))
+        victim.preempted = True
+        LLM_PREEMPTIONS.labels(priority=victim.priority.name.lower()).inc()
+        victim.task.cancel()
+
+    def _requeue(self, job: _Job) -> None:
+        job.attempts += 1
+        if job.attempts > self.max_preemptions:
+            job.future.set_exception(Preempted(f"Preempted {job.attempts} times"))
+            return
+        # Same tags, so it goes back ahead of work queued after it
+        job.task = None
+        heapq.heappush(self._queues[job.priority], job)
+        LLM_QUEUE_DEPTH.labels(priority=job.priority.name.lower()).inc()
+
+    def _wake_in(self, seconds: float) -> None:
+        if self._timer is not None:
+            return
+
+        def wake() -> None:
+            self._timer = None
+            self._dispatch()
+
+        self._timer = asyncio.get_running_loop().call_later(max(seconds, 0.001), wake)
+
+    def _forget_idle_flows(self) -> None:
+        for key, finish in list(self._flow_finish.items()):
+            if finish <= self._virtual_time[key[0]]:
+                del self._flow_finish[key]
+
+
+llm_scheduler = LLMScheduler()
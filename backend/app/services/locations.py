@@ -0,0 +1,12 @@
+from typing import Any, Dict, Optional, Tuple
+
+
+def coordinates(location: Optional[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    """(latitude, longitude) of a component's location, if it has both."""
+    if not location:
+        return None
+    lat = location.get("lat", location.get("latitude"))
+    lng = location.get("lng", location.get("longitude"))
+    if lat is None or lng is None:
+        return None
+    return float(lat), float(lng)
@@ -0,0 +1,544 @@
+import asyncio
+import base64
+import glob
+import gzip
+import json
+import logging
+import os
+import re
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models import Message, MessageArchive, MessageArchiveSegment, MessageRole, MessageTrace
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^messages_(\d{4})_(\d{2})$")
+# Compressed segments are written to disk in batches of about this many raw bytes
+WRITE_BATCH_BYTES = 1 << 20
+INSERT_BATCH_SIZE = 1000
+# How long a worker trusts its view of which months are archived
+ARCHIVED_UNTIL_TTL_SECONDS = 60
+# Advisory lock held for a whole pass, so one worker archives at a time
+PASS_LOCK_NAME = "message_archive_pass"
+# Smallest and largest empty gzip member used to overwrite a purged segment:
+# header, one FEXTRA subfield of zeros, an empty deflate block, CRC and size
+MIN_EMPTY_MEMBER = 26
+MAX_EMPTY_MEMBER = MIN_EMPTY_MEMBER + 0xFFFF - 4
+
+
+class ArchiveMismatch(Exception):
+    """An export does not match the partition it was taken from."""
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"messages_{month:%Y_%m}"
+
+
+def _to_line(row: Any) -> bytes:
+    trace = None
+    if row.encoding is not None:
+        trace = {
+            "encoding": row.encoding,
+            "payload": base64.b64encode(row.payload).decode(),
+            "raw_bytes": row.raw_bytes,
+            "created_at": row.trace_created_at.isoformat(),
+        }
+    return json.dumps({
+        "id": str(row.id),
+        "conversation_id": str(row.conversation_id),
+        "role": row.role.name,
+        "content": row.content,
+        "llm_metadata": row.llm_metadata,
+        "created_at": row.created_at.isoformat(),
+        "trace": trace,
+    }, separators=(",", ":")).encode() + b"\n"
+
+
+def _from_line(line: bytes) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    data = json.loads(line)
+    message = {
+        "id": UUID(data["id"]),
+        "conversation_id": UUID(data["conversation_id"]),
+        "role": MessageRole[data["role"]],
+        "content": data["content"],
+        "llm_metadata": data["llm_metadata"],
+        "created_at": datetime.fromisoformat(data["created_at"]),
+    }
+    trace = data.get("trace")
+    if trace is not None:
+        trace = {
+            "message_id": message["id"],
+            "encoding": trace["encoding"],
+            "payload": base64.b64decode(trace["payload"]),
+            "raw_bytes": trace["raw_bytes"],
+            "created_at": datetime.fromisoformat(trace["created_at"]),
+        }
+    return message, trace
+
+
+def _write_members(path: str, members: List[bytes]) -> None:
+    with open(path, "ab") as f:
+        for member in members:
+            f.write(member)
+
+
+def _read_segment(path: str, offset: int, length: int) -> List[bytes]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        member = f.read(length)
+    return gzip.decompress(member).splitlines()
+
+
+def _finish_file(tmp_path: str, path: str, segments: List[Dict[str, Any]], checksums: List[int]) -> int:
+    """Sync the export, read every segment back, and move it into place."""
+    with open(tmp_path, "ab") as f:
+        f.flush()
+        os.fsync(f.fileno())
+    with open(tmp_path, "rb") as f:
+        for segment, checksum in zip(segments, checksums):
+            f.seek(segment["offset"])
+            raw = gzip.decompress(f.read(segment["length"]))
+            if zlib.crc32(raw) != checksum or raw.count(b"\n") != segment["rows"]:
+                raise ArchiveMismatch(f"Segment of {segment['conversation_id']} in {tmp_path} does not read back")
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def _empty_member(length: int) -> bytes:
+    """A gzip member of exactly `length` bytes that decompresses to nothing."""
+    padding = length - MIN_EMPTY_MEMBER
+    return (
+        b"\x1f\x8b\x08\x04" + b"\x00" * 4 + b"\x00\xff"
+        + struct.pack("<H", padding + 4) + b"PD" + struct.pack("<H", padding) + b"\x00" * padding
+        + b"\x03\x00" + b"\x00" * 8
+    )
+
+
+def _scrub_segment(path: str, offset: int, length: int) -> None:
+    """Overwrite a segment with empty gzip members of the same total length.
+
+    The file stays a valid gzip stream and every other segment keeps its offset.
+    """
+    if length < MIN_EMPTY_MEMBER:
+        raise ValueError(f"Cannot scrub a {length}-byte segment")
+    members = []
+    remaining = length
+    while remaining:
+        size = min(remaining, MAX_EMPTY_MEMBER)
+        if 0 < remaining - size < MIN_EMPTY_MEMBER:
+            size = remaining - MIN_EMPTY_MEMBER
+        members.append(_empty_member(size))
+        remaining -= size
+    try:
+        with open(path, "r+b") as f:
+            f.seek(offset)
+            f.write(b"".join(members))
+            f.flush()
+            os.fsync(f.fileno())
+    except FileNotFoundError:
+        # Nothing left to erase
+        pass
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class _SegmentWriter:
+    """Append one gzip member per conversation to a file, off the event loop.
+
+    A file of concatenated gzip members is still a valid gzip file, so the
+    whole month reads back with `zcat`, while each conversation can be
+    decompressed on its own from its offset.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.segments: List[Dict[str, Any]] = []
+        # CRC32 of each segment's raw lines, to verify the file before it is trusted
+        self.checksums: List[int] = []
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self._conversation_id: Optional[UUID] = None
+        self._lines: List[bytes] = []
+
+    async def add(self, conversation_id: UUID, line: bytes) -> None:
+        if conversation_id != self._conversation_id:
+            await self._close_segment()
+            self._conversation_id = conversation_id
+        self._lines.append(line)
+
+    async def close(self) -> None:
+        await self._close_segment()
+        await self._flush()
+
+    async def _close_segment(self) -> None:
+        if not self._lines:
+            return
+        raw = b"".join(self._lines)
+        member = gzip.compress(raw, mtime=0)
+        self.segments.append({
+            "conversation_id": self._conversation_id,
+            "offset": self.offset,
+            "length": len(member),
+            "rows": len(self._lines),
+        })
+        self.checksums.append(zlib.crc32(raw))
+        self.offset += len(member)
+        self._pending.append(member)
+        self._pending_bytes += len(raw)
+        self._lines = []
+        if self._pending_bytes >= WRITE_BATCH_BYTES:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if self._pending:
+            members, self._pending, self._pending_bytes = self._pending, [], 0
+            await asyncio.to_thread(_write_members, self.path, members)
+
+
+class MessageArchiver:
+    """Keep `messages` partitioned by month and move old months to cold storage.
+
+    Each pass creates the partitions for the coming months, then exports
+    every month that ended more than `retention_months` ago to a gzipped
+    JSONL file under `archive_dir` (one gzip member per conversation, with
+    the messages' traces inline), records where each conversation is, and
+    detaches and drops the partition. Hot indexes then only cover the
+    retention window. Archiving is off unless `archive_dir` is an absolute
+    path, which must be storage every worker can read; partitions are kept
+    up either way. Passes hold an advisory lock, so workers take turns.
+
+    Reading an archived conversation puts its messages back (into the
+    default partition) through `rehydrate`; a later pass evicts them again
+    once they have been back for `rehydrated_ttl`.
+    """
+
+    def __init__(
+        self,
+        archive_dir: str = settings.MESSAGE_ARCHIVE_DIR,
+        retention_months: int = settings.MESSAGE_RETENTION_MONTHS,
+        months_ahead: int = settings.MESSAGE_PARTITION_MONTHS_AHEAD,
+        rehydrated_ttl: timedelta = timedelta(days=settings.MESSAGE_REHYDRATED_TTL_DAYS),
+    ):
+        self.archive_dir = archive_dir
+        self.retention_months = retention_months
+        self.months_ahead = months_ahead
+        self.rehydrated_ttl = rehydrated_ttl
+        self._archived_until: Optional[datetime] = None
+        self._archived_until_checked = 0.0
+
+    async def run_pass(self, now: Optional[datetime] = None) -> int:
+        """Create upcoming partitions, archive due months and evict stale rehydrations.
+
+        Returns how many months were archived.
+        """
+        now = now or datetime.utcnow()
+        async with async_session() as lock:
+            # Released with the transaction when the session closes, even if the pass fails
+            locked = await lock.scalar(select(func.pg_try_advisory_xact_lock(func.hashtext(PASS_LOCK_NAME))))
+            if not locked:
+                logger.debug("Another worker is running the message archive pass")
+                return 0
+
+            await self.ensure_partitions(now)
+            archived = 0
+            if self.archiving:
+                for month, name in sorted((await self._partitions()).items()):
+                    if add_months(month, 1) > self._cutoff(now):
+                        continue
+                    try:
+                        await self.archive_partition(name, month, add_months(month, 1))
+                        archived += 1
+                    except Exception:
+                        logger.exception("Failed to archive %s", name)
+            elif self.archive_dir:
+                logger.error("MESSAGE_ARCHIVE_DIR must be an absolute path, not %r; not archiving", self.archive_dir)
+            evicted = await self.evict_rehydrated(now)
+            if evicted:
+                logger.info("Evicted %d rehydrated conversations", evicted)
+            return archived
+
+    @property
+    def archiving(self) -> bool:
+        return os.path.isabs(self.archive_dir)
+
+    def _cutoff(self, now: datetime) -> datetime:
+        """Months ending by this are due for archiving."""
+        return add_months(month_start(now), -self.retention_months)
+
+    async def _partitions(self) -> Dict[datetime, str]:
+        """The monthly partitions attached to `messages`, by month."""
+        async with async_session() as session:
+            result = await session.execute(text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'messages'::regclass"
+            ))
+            names = result.scalars().all()
+        partitions = {}
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match:
+                partitions[datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+        return partitions
+
+    async def ensure_partitions(self, now: Optional[datetime] = None) -> int:
+        """Create the partitions for this month and the next `months_ahead`; return how many were new."""
+        current = month_start(now or datetime.utcnow())
+        existing = await self._partitions()
+        created = 0
+        for i in range(self.months_ahead + 1):
+            month = add_months(current, i)
+            if month in existing:
+                continue
+            try:
+                async with async_session() as session:
+                    await session.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF messages "
+                        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+                    ))
+                    await session.commit()
+                created += 1
+            except Exception:
+                # e.g. another worker won the race, or the default partition holds rows for the month
+                logger.exception("Failed to create partition %s", partition_name(month))
+        return created
+
+    async def archive_partition(self, name: str, start: datetime, end: datetime) -> MessageArchive:
+        """Export one month, verify the file, record its segments, then detach and drop its partition."""
+        if not self.archiving:
+            raise ValueError(f"Archive directory must be an absolute path, not {self.archive_dir!r}")
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{name}.jsonl.gz")
+        # Left behind by a pass that died; passes hold the lock, so none is being written
+        for stale in glob.glob(f"{glob.escape(path)}.*.tmp"):
+            _remove(stale)
+        tmp_path = f"{path}.{os.getpid()}.{uuid4().hex}.tmp"
+        try:
+            return await self._export(name, start, end, path, tmp_path)
+        finally:
+            await asyncio.to_thread(_remove, tmp_path)
+
+    async def _export(self, name: str, start: datetime, end: datetime, path: str, tmp_path: str) -> MessageArchive:
+        writer = _SegmentWriter(tmp_path)
+        rows = 0
+        async with async_session() as session:
+            result = await session.stream(
+                select(
+                    Message.id,
+                    Message.conversation_id,
+                    Message.role,
+                    Message.content,
+                    Message.llm_metadata,
+                    Message.created_at,
+                    MessageTrace.encoding,
+                    MessageTrace.payload,
+                    MessageTrace.raw_bytes,
+                    MessageTrace.created_at.label("trace_created_at")
+                )
+                .outerjoin(MessageTrace, MessageTrace.message_id == Message.id)
+                .where(Message.created_at >= start, Message.created_at < end)
+                .order_by(Message.conversation_id, Message.created_at, Message.id)
+                .execution_options(yield_per=INSERT_BATCH_SIZE)
+            )
+            async for row in result:
+                await writer.add(row.conversation_id, _to_line(row))
+                rows += 1
+        await writer.close()
+        size = await asyncio.to_thread(_finish_file, tmp_path, path, writer.segments, writer.checksums)
+
+        async with async_session() as session:
+            # Wait briefly for the lock on messages rather than queueing every chat turn behind us
+            await session.execute(text("SET LOCAL lock_timeout = '5s'"))
+            current = await session.scalar(text(f"SELECT count(*) FROM {name}"))
+            if current != rows:
+                raise ArchiveMismatch(f"{name} has {current} rows, exported {rows}")
+
+            archive = MessageArchive(
+                partition=name,
+                range_start=start,
+                range_end=end,
+                path=path,
+                rows=rows,
+                bytes=size
+            )
+            session.add(archive)
+            await session.flush()
+            for i in range(0, len(writer.segments), INSERT_BATCH_SIZE):
+                await session.execute(
+                    insert(MessageArchiveSegment),
+                    [
+                        {**segment, "archive_id": archive.id}
+                        for segment in writer.segments[i:i + INSERT_BATCH_SIZE]
+                    ]
+                )
+            await session.execute(text(
+                f"DELETE FROM message_traces t USING {name} m WHERE t.message_id = m.id"
+            ))
+            await session.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+            await session.execute(text(f"DROP TABLE {name}"))
+            await session.commit()
+
+        self._archived_until_checked = 0.0
+        logger.info("Archived %s: %d messages, %d bytes in %s", name, rows, size, path)
+        return archive
+
+    async def _archived_up_to(self, db: AsyncSession) -> datetime:
+        """Messages created before this may have been archived.
+
+        Passes only archive months that end by the retention cutoff, so the
+        cutoff covers whatever any worker archived since this one last read
+        `max(range_end)`; the recorded bound, cached briefly, covers months
+        archived under a shorter retention.
+        """
+        if time.monotonic() - self._archived_until_checked > ARCHIVED_UNTIL_TTL_SECONDS:
+            self._archived_until = await db.scalar(select(func.max(MessageArchive.range_end)))
+            self._archived_until_checked = time.monotonic()
+        cutoff = self._cutoff(datetime.utcnow())
+        return max(cutoff, self._archived_until or cutoff)
+
+    async def rehydrate(self, db: AsyncSession, conversation_ids: Any, oldest: datetime) -> int:
+        """Put archived messages of the conversations back into the table; return how many.
+
+        `conversation_ids` is a list or a select of ids; `oldest` is when the
+        oldest of them was created, which rules out most reads with no query.
+        The rows are added to `db`'s transaction.
+        """
+        if oldest >= await self._archived_up_to(db):
+            return 0
+
+        result = await db.execute(
+            select(MessageArchiveSegment, MessageArchive.path)
+            .join(MessageArchive, MessageArchive.id == MessageArchiveSegment.archive_id)
+            .where(
+                MessageArchiveSegment.conversation_id.in_(conversation_ids),
+                MessageArchiveSegment.rehydrated_at.is_(None)
+            )
+            .with_for_update(of=MessageArchiveSegment)
+        )
+        restored = 0
+        for segment, path in result.all():
+            try:
+                lines = await asyncio.to_thread(_read_segment, path, segment.offset, segment.length)
+            except OSError:
+                # The conversation reads without these messages and is retried on the next read
+                logger.exception("Cannot read archived messages of %s from %s", segment.conversation_id, path)
+                continue
+            parsed = [_from_line(line) for line in lines]
+            messages = [message for message, _ in parsed]
+            traces = [trace for _, trace in parsed if trace is not None]
+            for i in range(0, len(messages), INSERT_BATCH_SIZE):
+                await db.execute(
+                    pg_insert(Message.__table__)
+                    .values(messages[i:i + INSERT_BATCH_SIZE])
+                    .on_conflict_do_nothing(index_elements=["id", "created_at"])
+                )
+            for i in range(0, len(traces), INSERT_BATCH_SIZE):
+                await db.execute(
+                    pg_insert(MessageTrace)
+                    .values(traces[i:i + INSERT_BATCH_SIZE])
+                    .on_conflict_do_nothing(index_elements=[MessageTrace.message_id])
+                )
+            segment.rehydrated_at = datetime.utcnow()
+            restored += len(messages)
+        if restored:
+            await db.flush()
+        return restored
+
+    async def forget(self, db: AsyncSession, conversation_ids: List[UUID]) -> int:
+        """Erase the conversations' messages from the archive files; return how many segments.
+
+        Used when conversations are purged: the segment rows go with the
+        conversation, but the bytes would otherwise stay on disk. The rows
+        are deleted in `db`'s transaction.
+        """
+        result = await db.execute(
+            select(MessageArchiveSegment, MessageArchive.path)
+            .join(MessageArchive, MessageArchive.id == MessageArchiveSegment.archive_id)
+            .where(MessageArchiveSegment.conversation_id.in_(conversation_ids))
+            .with_for_update(of=MessageArchiveSegment)
+        )
+        segments = result.all()
+        for segment, path in segments:
+            await asyncio.to_thread(_scrub_segment, path, segment.offset, segment.length)
+        if segments:
+            await db.execute(
+                delete(MessageArchiveSegment)
+                .where(MessageArchiveSegment.conversation_id.in_(conversation_ids))
+            )
+        return len(segments)
+
+    async def evict_rehydrated(self, now: Optional[datetime] = None) -> int:
+        """Drop rehydrated messages that have been back longer than `rehydrated_ttl`."""
+        cutoff = (now or datetime.utcnow()) - self.rehydrated_ttl
+        evicted = 0
+        while True:
+            async with async_session() as session:
+                result = await session.execute(
+                    select(MessageArchiveSegment, MessageArchive.range_start, MessageArchive.range_end)
+                    .join(MessageArchive, MessageArchive.id == MessageArchiveSegment.archive_id)
+                    .where(MessageArchiveSegment.rehydrated_at < cutoff)
+                    .limit(INSERT_BATCH_SIZE)
+                    .with_for_update(of=MessageArchiveSegment, skip_locked=True)
+                )
+                stale = result.all()
+                for segment, range_start, range_end in stale:
+                    # The month's partition is gone, so its rows here are the rehydrated ones
+                    deleted = await session.execute(
+                        delete(Message)
+                        .where(
+                            Message.conversation_id == segment.conversation_id,
+                            Message.created_at >= range_start,
+                            Message.created_at < range_end
+                        )
+                        .returning(Message.id)
+                        .execution_options(synchronize_session=False)
+                    )
+                    message_ids = deleted.scalars().all()
+                    if message_ids:
+                        await session.execute(delete(MessageTrace).where(MessageTrace.message_id.in_(message_ids)))
+                    segment.rehydrated_at = None
+                await session.commit()
+            evicted += len(stale)
+            if len(stale) < INSERT_BATCH_SIZE:
+                return evicted
+
+    async def run_forever(self, interval: float = settings.MESSAGE_ARCHIVE_INTERVAL_SECONDS) -> None:
+        """Run a pass periodically until cancelled."""
+        while True:
+            try:
+                archived = await self.run_pass()
+                if archived:
+                    logger.info("Archived %d months of messages", archived)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Message archive pass failed")
+            await asyncio.sleep(interval)
+
+
+message_archiver = MessageArchiver()
@@ -0,0 +1,69 @@
+import json
+import zlib
+from typing import Any, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import Message, MessageTrace
+
+# Kept on the message itself: small, and what usage accounting reads
+SUMMARY_KEYS = frozenset({
+    "model",
+    "tokens",
+    "prompt_tokens",
+    "completion_tokens",
+    "degraded",
+    "starter_cache",
+})
+
+
+def split_metadata(metadata: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(summary, trace): the keys stored on the message and everything else."""
+    summary, trace = {}, {}
+    for key, value in (metadata or {}).items():
+        (summary if key in SUMMARY_KEYS else trace)[key] = value
+    return summary, trace
+
+
+def encode_trace(
+    message_id: UUID,
+    trace: Dict[str, Any],
+    compress_bytes: int = settings.MESSAGE_TRACE_COMPRESS_BYTES,
+) -> MessageTrace:
+    raw = json.dumps(trace, separators=(",", ":"), default=str).encode()
+    if len(raw) > compress_bytes:
+        return MessageTrace(message_id=message_id, encoding="zlib", payload=zlib.compress(raw), raw_bytes=len(raw))
+    return MessageTrace(message_id=message_id, encoding="json", payload=raw, raw_bytes=len(raw))
+
+
+def decode_trace(encoding: str, payload: bytes) -> Dict[str, Any]:
+    if encoding == "zlib":
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+async def load_metadata(db: AsyncSession, message_ids: Iterable[UUID]) -> Dict[UUID, Any]:
+    """Full `llm_metadata` (summary and trace) of the given messages, in one query.
+
+    Legacy rows whose metadata is a JSON array or scalar have no trace and
+    are returned as they are.
+    """
+    message_ids = list(message_ids)
+    if not message_ids:
+        return {}
+    result = await db.execute(
+        select(Message.id, Message.llm_metadata, MessageTrace.encoding, MessageTrace.payload)
+        .outerjoin(MessageTrace, MessageTrace.message_id == Message.id)
+        .where(Message.id.in_(message_ids))
+    )
+    metadata = {}
+    for message_id, summary, encoding, payload in result.all():
+        if summary is not None and not isinstance(summary, dict):
+            metadata[message_id] = summary
+            continue
+        trace = decode_trace(encoding, payload) if payload is not None else {}
+        metadata[message_id] = {**trace, **(summary or {})}
+    return metadata
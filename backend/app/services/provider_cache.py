@@ -0,0 +1,259 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+ProviderFetch = Callable[..., Awaitable[Any]]
+
+
+@dataclass
+class ProviderPolicy:
+    ttl: float  # seconds a value is fresh
+    stale_ttl: float = 0.0  # further seconds it may be served while it is refreshed
+
+
+# Weather moves slowly; availability and prices go stale quickly
+DEFAULT_POLICIES: Dict[str, ProviderPolicy] = {
+    "weather": ProviderPolicy(ttl=1800, stale_ttl=7200),
+    "availability": ProviderPolicy(ttl=300, stale_ttl=600),
+    "pricing": ProviderPolicy(ttl=900, stale_ttl=3600),
+}
+
+
+@dataclass
+class _Entry:
+    value: Any
+    fresh_until: float
+    stale_until: float
+
+
+def normalize_args(value: Any) -> Any:
+    """Canonical form of provider arguments, so equivalent lookups share a key."""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, datetime):
+        return value.replace(microsecond=0).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float):
+        return round(value, 4)
+    if isinstance(value, dict):
+        return {str(k): normalize_args(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [normalize_args(v) for v in value]
+        return sorted(items, key=repr) if isinstance(value, set) else items
+    return value
+
+
+def cache_key(provider: str, arguments: Dict[str, Any]) -> str:
+    encoded = json.dumps(normalize_args(arguments), sort_keys=True, separators=(",", ":"), default=str)
+    return f"provider:{provider}:{encoded}"
+
+
+class ProviderCache:
+    """Stale-while-revalidate cache in front of external travel data providers.
+
+    Lookups are keyed by (provider, normalized arguments). A fresh value is
+    returned as is; a stale one (past `ttl` but within `stale_ttl`) is
+    returned immediately while a single background request refreshes it;
+    anything older is fetched before returning. Concurrent requests for
+    the same key share one upstream call, and a failed refresh keeps
+    serving the stale value until it expires.
+
+    The in-process tier is an LRU bounded to `max_entries`. When
+    `redis_url` is set, entries are also shared through Redis so workers
+    warm each other, with the same fresh/stale handling on a local miss;
+    values must then be JSON-serializable.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.PROVIDER_CACHE_MAX_ENTRIES,
+        redis_url: Optional[str] = settings.REDIS_URL if settings.PROVIDER_CACHE_USE_REDIS else None,
+        redis_retry_seconds: float = 30.0,
+    ):
+        self.max_entries = max_entries
+        self.redis_url = redis_url
+        self.redis_retry_seconds = redis_retry_seconds
+        self._providers: Dict[str, tuple[ProviderFetch, ProviderPolicy]] = {}
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._redis = None
+        self._redis_errors: tuple = (OSError,)
+        self._redis_down_until = 0.0
+
+    def register(
+        self,
+        provider: str,
+        fetch: ProviderFetch,
+        policy: Optional[ProviderPolicy] = None,
+    ) -> None:
+        """Route lookups for `provider` to `fetch`, with its default policy unless given one."""
+        policy = policy or DEFAULT_POLICIES.get(provider)
+        if policy is None:
+            raise ValueError(f"No cache policy for provider {provider!r}")
+        self._providers[provider] = (fetch, policy)
+
+    def has_provider(self, provider: str) -> bool:
+        return provider in self._providers
+
+    async def get(self, provider: str, **arguments) -> Any:
+        """Return the provider's answer for `arguments`, from cache when possible."""
+        if provider not in self._providers:
+            raise KeyError(f"Unknown provider: {provider}")
+
+        key = cache_key(provider, arguments)
+        entry = self._local_get(key) or await self._shared_get(key)
+        if entry is not None:
+            record_cache(f"provider_{provider}", True)
+            if time.time() >= entry.fresh_until:
+                self._refresh(key, provider, arguments)
+            return entry.value
+
+        record_cache(f"provider_{provider}", False)
+        # Redis was just checked; don't ask it again before fetching
+        return await asyncio.shield(self._refresh(key, provider, arguments, check_shared=False))
+
+    async def peek(self, provider: str, **arguments) -> Optional[Any]:
+        """The cached answer if there is a usable one, without ever calling the provider."""
+        key = cache_key(provider, arguments)
+        entry = self._local_get(key) or await self._shared_get(key)
+        record_cache(f"provider_{provider}", entry is not None)
+        return entry.value if entry is not None else None
+
+    def invalidate(self, provider: str, **arguments) -> None:
+        """Forget the local entry for a lookup (e.g. after a booking changes availability)."""
+        self._entries.pop(cache_key(provider, arguments), None)
+
+    def clear(self) -> None:
+        """Drop every local entry."""
+        self._entries.clear()
+
+    def _refresh(
+        self,
+        key: str,
+        provider: str,
+        arguments: Dict[str, Any],
+        check_shared: bool = True,
+    ) -> asyncio.Task:
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, provider, arguments, check_shared))
+            self._refreshing[key] = task
+            task.add_done_callback(lambda done: self._refresh_done(key, done))
+        return task
+
+    async def _fetch(self, key: str, provider: str, arguments: Dict[str, Any], check_shared: bool = True) -> Any:
+        # Another worker may already have refreshed it
+        shared = await self._redis_get(key) if check_shared else None
+        if shared is not None and time.time() < shared.fresh_until:
+            self._local_set(key, shared)
+            return shared.value
+
+        fetch, policy = self._providers[provider]
+        value = await fetch(**arguments)
+        now = time.time()
+        entry = _Entry(value, now + policy.ttl, now + policy.ttl + policy.stale_ttl)
+        self._local_set(key, entry)
+        await self._redis_set(key, entry)
+        return value
+
+    def _refresh_done(self, key: str, task: asyncio.Task) -> None:
+        if self._refreshing.get(key) is task:
+            del self._refreshing[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Provider refresh failed for %s: %s", key, task.exception())
+
+    def _local_get(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.stale_until <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _shared_get(self, key: str) -> Optional[_Entry]:
+        """A usable (fresh or stale) entry from Redis, copied into the local tier."""
+        entry = await self._redis_get(key)
+        if entry is None or entry.stale_until <= time.time():
+            return None
+        self._local_set(key, entry)
+        return entry
+
+    def _local_set(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _redis_client(self):
+        if not self.redis_url or time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            import redis.asyncio as redis
+            from redis.exceptions import RedisError
+
+            self._redis = redis.from_url(self.redis_url, socket_connect_timeout=0.5, socket_timeout=0.5)
+            self._redis_errors = (RedisError, OSError)
+        return self._redis
+
+    async def _redis_get(self, key: str) -> Optional[_Entry]:
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(key)
+        except self._redis_errors as e:
+            self._redis_unavailable(e)
+            return None
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return _Entry(data["value"], data["fresh_until"], data["stale_until"])
+
+    async def _redis_set(self, key: str, entry: _Entry) -> None:
+        client = self._redis_client()
+        if client is None:
+            return
+        payload = json.dumps({
+            "value": entry.value,
+            "fresh_until": entry.fresh_until,
+            "stale_until": entry.stale_until,
+        })
+        try:
+            await client.set(key, payload, px=max(int((entry.stale_until - time.time()) * 1000), 1))
+        except self._redis_errors as e:
+            self._redis_unavailable(e)
+
+    def _redis_unavailable(self, error: Exception) -> None:
+        if time.monotonic() < self._redis_down_until:
+            return
+        logger.warning(
+            "Redis unavailable for the provider cache (%s); using process memory only for %.0fs",
+            error,
+            self.redis_retry_seconds,
+        )
+        self._redis_down_until = time.monotonic() + self.redis_retry_seconds
+
+    async def close(self) -> None:
+        """Cancel background refreshes and close the Redis connection pool."""
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+# Shared by the viability checks (weather, availability, pricing)
+provider_cache = ProviderCache()
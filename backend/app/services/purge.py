@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import List
+from uuid import UUID
+
+from sqlalchemy import delete, exists, select
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models import Conversation, Message, MessageTrace
+from app.services.message_archive import message_archiver
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationPurger:
+    """Remove soft-deleted conversations and their messages in bounded batches.
+
+    Every batch runs in its own short transaction, so a very long conversation
+    is removed as many small deletes instead of one statement holding row
+    locks on thousands of messages. Archived messages are erased from the
+    archive files as well.
+    """
+
+    def __init__(self, batch_size: int = settings.CONVERSATION_PURGE_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    async def purge(self) -> int:
+        """Purge every soft-deleted conversation; return how many were removed."""
+        purged = 0
+        while True:
+            conversation_ids = await self._next_conversations()
+            if not conversation_ids:
+                return purged
+            await self._delete_messages(conversation_ids)
+            async with async_session() as session:
+                await message_archiver.forget(session, conversation_ids)
+                await session.execute(
+                    delete(Conversation).where(Conversation.id.in_(conversation_ids))
+                )
+                await session.commit()
+            purged += len(conversation_ids)
+
+    async def _next_conversations(self) -> List[UUID]:
+        # A conversation with forks is kept until they are gone: forks read its messages
+        fork = aliased(Conversation)
+        async with async_session() as session:
+            result = await session.execute(
+                select(Conversation.id)
+                .where(
+                    Conversation.deleted_at.is_not(None),
+                    ~exists().where(fork.parent_id == Conversation.id)
+                )
+                .order_by(Conversation.deleted_at)
+                .limit(self.batch_size)
+            )
+            return list(result.scalars().all())
+
+    async def _delete_messages(self, conversation_ids: List[UUID]) -> None:
+        while True:
+            async with async_session() as session:
+                batch = (
+                    select(Message.id)
+                    .where(Message.conversation_id.in_(conversation_ids))
+                    .limit(self.batch_size)
+                    .scalar_subquery()
+                )
+                result = await session.execute(
+                    delete(Message).where(Message.id.in_(batch)).returning(Message.id)
+                )
+                message_ids = result.scalars().all()
+                # Traces have no foreign key into the partitioned messages table
+                if message_ids:
+                    await session.execute(delete(MessageTrace).where(MessageTrace.message_id.in_(message_ids)))
+                await session.commit()
+            if len(message_ids) < self.batch_size:
+                return
+
+    async def run_forever(self, interval: float = settings.CONVERSATION_PURGE_INTERVAL_SECONDS) -> None:
+        """Purge periodically until cancelled."""
+        while True:
+            try:
+                purged = await self.purge()
+                if purged:
+                    logger.info("Purged %d deleted conversations", purged)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Conversation purge failed")
+            await asyncio.sleep(interval)
+
+
+conversation_purger = ConversationPurger()
@@ -0,0 +1,122 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.schemas.ranking import PreferenceWeights, RankedCandidate, RankingCandidate
+
+TIME_SLOTS = ("morning", "afternoon", "evening", "night")
+PRICE_LEVELS = 5
+
+
+class EncodedCandidates:
+    """Dense array form of a candidate set, reusable across users."""
+
+    def __init__(self, candidates: Sequence[RankingCandidate]):
+        self.ids = [candidate.id for candidate in candidates]
+        self.vocabulary: Dict[str, int] = {}
+        rows, cols = [], []
+        for row, candidate in enumerate(candidates):
+            for tag in set(candidate.tags):
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(tag, len(self.vocabulary)))
+
+        self.tags = np.zeros((len(candidates), len(self.vocabulary)), dtype=np.float32)
+        self.tags[rows, cols] = 1.0
+        self.price = np.array(
+            [min(max(candidate.price_level, 0), PRICE_LEVELS - 1) for candidate in candidates],
+            dtype=np.intp,
+        )
+        # Slot 0 means "no timing"; known slots are shifted by one
+        slot_index = {slot: i + 1 for i, slot in enumerate(TIME_SLOTS)}
+        self.slot = np.array(
+            [slot_index.get(candidate.time_slot, 0) for candidate in candidates],
+            dtype=np.intp,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class RankingEngine:
+    """Score candidate components against learned preference weights.
+
+    Candidates are encoded once as a multi-hot tag matrix plus price and
+    time-slot indices, so scoring a user is a single matrix-vector product
+    and two gathers. Top-k selection uses `argpartition` and only sorts the
+    k winners.
+    """
+
+    def encode(self, candidates: Sequence[RankingCandidate]) -> EncodedCandidates:
+        """Encode candidates into dense arrays."""
+        return EncodedCandidates(candidates)
+
+    def score(self, encoded: EncodedCandidates, weights: PreferenceWeights) -> np.ndarray:
+        """Score every encoded candidate in one vectorized pass."""
+        tag_vector = np.zeros(len(encoded.vocabulary), dtype=np.float32)
+        for tag, weight in weights.tag_weights.items():
+            column = encoded.vocabulary.get(tag)
+            if column is not None:
+                tag_vector[column] = weight
+
+        price_vector = np.zeros(PRICE_LEVELS, dtype=np.float32)
+        for level, weight in weights.price_weights.items():
+            if 0 <= int(level) < PRICE_LEVELS:
+                price_vector[int(level)] = weight
+
+        slot_vector = np.zeros(len(TIME_SLOTS) + 1, dtype=np.float32)
+        for i, slot in enumerate(TIME_SLOTS):
+            slot_vector[i + 1] = weights.timing_weights.get(slot, 0.0)
+
+        return encoded.tags @ tag_vector + price_vector[encoded.price] + slot_vector[encoded.slot]
+
+    def top_k(
+        self,
+        encoded: EncodedCandidates,
+        weights: PreferenceWeights,
+        k: int = 5,
+        exclude_ids: Optional[set[str]] = None,
+    ) -> List[RankedCandidate]:
+        """Return the k highest scoring candidates, best first."""
+        scores = self.score(encoded, weights)
+        if exclude_ids:
+            mask = np.fromiter((i in exclude_ids for i in encoded.ids), dtype=bool, count=len(encoded))
+            scores = np.where(mask, -np.inf, scores)
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            RankedCandidate(id=encoded.ids[i], score=float(scores[i]))
+            for i in top
+            if np.isfinite(scores[i])
+        ]
+
+    def rank(
+        self,
+        candidates: Sequence[RankingCandidate],
+        weights: PreferenceWeights,
+        k: int = 5,
+    ) -> List[RankedCandidate]:
+        """Encode and rank in one call, for candidate sets that are not reused."""
+        return self.top_k(self.encode(candidates), weights, k)
+
+
+def rank_reference(
+    candidates: Sequence[RankingCandidate],
+    weights: PreferenceWeights,
+    k: int = 5,
+) -> List[RankedCandidate]:
+    """Per-item dict-based ranking, kept as the baseline for benchmarks."""
+    scored = []
+    for candidate in candidates:
+        score = sum(weights.tag_weights.get(tag, 0.0) for tag in set(candidate.tags))
+        score += weights.price_weights.get(min(max(candidate.price_level, 0), PRICE_LEVELS - 1), 0.0)
+        score += weights.timing_weights.get(candidate.time_slot, 0.0) if candidate.time_slot in TIME_SLOTS else 0.0
+        scored.append(RankedCandidate(id=candidate.id, score=score))
+    ranked = sorted(scored, key=lambda item: -item.score)
+    return ranked[:k]
+
+
+ranking_engine = RankingEngine()
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.models import Conversation, ConversationState
+from app.services.llm_scheduler import Priority, llm_scheduler
+from app.services.provider_cache import ProviderCache, ProviderPolicy, normalize_args
+
+logger = logging.getLogger(__name__)
+
+STARTER_PROVIDER = "starter_reply"
+
+# (conversation, user message) -> reply dict, as ChatService.generate
+ReplyGenerator = Callable[[Conversation, str], Awaitable[Dict[str, Any]]]
+
+
+def _to_json(response: Dict[str, Any]) -> Dict[str, Any]:
+    new_state = response.get("new_state")
+    return {
+        "content": response["content"],
+        "new_state": new_state.value if new_state is not None else None,
+        "context_update": response.get("context_update") or {},
+        "metadata": response.get("metadata") or {},
+    }
+
+
+def _from_json(cached: Dict[str, Any]) -> Dict[str, Any]:
+    # The tokens were spent once, by the warm-up, not by this conversation
+    metadata = {**cached["metadata"], "tokens": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    metadata["starter_cache"] = True
+    return {
+        "content": cached["content"],
+        "new_state": ConversationState(cached["new_state"]) if cached["new_state"] else None,
+        "context_update": dict(cached["context_update"]),
+        "metadata": metadata,
+    }
+
+
+class StarterReplyCache:
+    """Pre-generated first replies to the configured starter prompts.
+
+    A new conversation opens in INITIAL_INTENT with an empty context, so the
+    reply to a starter prompt only depends on the prompt and on the reply
+    templates. `warm` generates one per prompt as speculative model work
+    and stores it under (prompt, `PROMPT_TEMPLATE_VERSION`); bumping the
+    version makes every older reply unreachable. Storage is a provider
+    cache, in process or shared through Redis.
+    """
+
+    def __init__(
+        self,
+        prompts: List[str] = settings.STARTER_PROMPTS,
+        template_version: str = settings.PROMPT_TEMPLATE_VERSION,
+        ttl: float = settings.STARTER_REPLY_TTL_SECONDS,
+        cache: Optional[ProviderCache] = None,
+    ):
+        self.prompts = {normalize_args(prompt): prompt for prompt in prompts}
+        self.template_version = template_version
+        self.cache = cache or ProviderCache(
+            max_entries=max(4 * len(prompts), 16),
+            redis_url=settings.REDIS_URL if settings.STARTER_REPLY_USE_REDIS else None,
+        )
+        self.cache.register(STARTER_PROVIDER, self._generate, ProviderPolicy(ttl=ttl))
+        self._generator: Optional[ReplyGenerator] = None
+
+    async def lookup(self, content: str) -> Optional[Dict[str, Any]]:
+        """The stored first reply to `content`, if it is a starter prompt and one is ready."""
+        prompt = normalize_args(content)
+        if prompt not in self.prompts:
+            return None
+        cached = await self.cache.peek(STARTER_PROVIDER, prompt=prompt, version=self.template_version)
+        return _from_json(cached) if cached is not None else None
+
+    async def warm(self, generate: ReplyGenerator) -> int:
+        """Make sure every starter prompt has a reply; return how many are ready."""
+        self._generator = generate
+        results = await asyncio.gather(
+            *(
+                self.cache.get(STARTER_PROVIDER, prompt=prompt, version=self.template_version)
+                for prompt in self.prompts
+            ),
+            return_exceptions=True
+        )
+        for prompt, result in zip(self.prompts.values(), results):
+            if isinstance(result, Exception):
+                logger.warning("Starter reply warm-up failed for %r: %s", prompt, result)
+        return sum(not isinstance(result, Exception) for result in results)
+
+    async def _generate(self, prompt: str, version: str) -> Dict[str, Any]:
+        conversation = Conversation(state=ConversationState.INITIAL_INTENT, context={})
+        response = await llm_scheduler.run(
+            lambda: self._generator(conversation, self.prompts[prompt]),
+            priority=Priority.SPECULATIVE,
+            tokens=len(prompt) // 4 + settings.LLM_TURN_TOKEN_ESTIMATE
+        )
+        return _to_json(response)
+
+    async def run_forever(
+        self,
+        generate: ReplyGenerator,
+        interval: float = settings.STARTER_WARMUP_INTERVAL_SECONDS,
+    ) -> None:
+        """Warm up now and then periodically until cancelled."""
+        while True:
+            try:
+                ready = await self.warm(generate)
+                logger.info("Starter replies ready: %d of %d", ready, len(self.prompts))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Starter reply warm-up failed")
+            await asyncio.sleep(interval)
+
+    async def close(self) -> None:
+        await self.cache.close()
+
+
+starter_reply_cache = StarterReplyCache()
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.core.metrics import record_cache
+
+ToolFunction = Callable[..., Awaitable[Any]]
+
+
+class ToolStatus(str, Enum):
+    OK = "ok"
+    ERROR = "error"
+    TIMEOUT = "timeout"
+
+
+class ToolCall(BaseModel):
+    name: str
+    arguments: Dict[str, Any] = Field(default_factory=dict)
+
+    def cache_key(self) -> str:
+        """Stable hash of the tool name and its arguments."""
+        payload = json.dumps(
+            {"name": self.name, "arguments": self.arguments},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ToolResult(BaseModel):
+    name: str
+    arguments: Dict[str, Any] = Field(default_factory=dict)
+    status: ToolStatus
+    value: Any = None
+    error: Optional[str] = None
+    cached: bool = False
+    duration_ms: float = 0.0
+
+
+class _InFlight:
+    """A running tool call shared by every caller waiting on the same key."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def duration_ms(self) -> float:
+        """How long the call ran, or has been running if it isn't done."""
+        return ((self.finished or time.perf_counter()) - self.started) * 1000
+
+
+class ToolExecutor:
+    """Run independent tool calls concurrently under a shared deadline.
+
+    Identical calls (same name and arguments) that are already running are
+    joined rather than started again, and successful results are cached by
+    argument hash. Calls still running when the deadline passes are reported
+    as timed out; they keep running only while another caller waits on them.
+    """
+
+    def __init__(
+        self,
+        tools: Optional[Dict[str, ToolFunction]] = None,
+        cache_ttl: float = settings.TOOL_CACHE_TTL_SECONDS,
+        max_cache_entries: int = settings.TOOL_CACHE_MAX_ENTRIES,
+    ):
+        self.tools: Dict[str, ToolFunction] = dict(tools or {})
+        self.cache_ttl = cache_ttl
+        self.max_cache_entries = max_cache_entries
+        self._cache: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, _InFlight] = {}
+
+    def register(self, name: str, func: ToolFunction) -> None:
+        """Register a tool under the name used in tool calls."""
+        self.tools[name] = func
+
+    def clear_cache(self) -> None:
+        """Drop every cached tool result."""
+        self._cache.clear()
+
+    async def run(
+        self,
+        calls: List[ToolCall],
+        deadline: Optional[float] = None,
+    ) -> List[ToolResult]:
+        """Execute tool calls concurrently and return one result per call.
+
+        `deadline` is the number of seconds the whole batch may take; results
+        are returned in the same order as `calls`.
+        """
+        timeout = settings.TOOL_CALL_DEADLINE_SECONDS if deadline is None else deadline
+
+        results: List[Optional[ToolResult]] = [None] * len(calls)
+        pending: Dict[int, tuple[str, _InFlight]] = {}
+        joined: Dict[str, _InFlight] = {}
+
+        for index, call in enumerate(calls):
+            if call.name not in self.tools:
+                results[index] = ToolResult(
+                    name=call.name,
+                    arguments=call.arguments,
+                    status=ToolStatus.ERROR,
+                    error=f"Unknown tool: {call.name}",
+                )
+                continue
+
+            key = call.cache_key()
+            hit, value = self._cache_get(key)
+            record_cache("tool_results", hit)
+            if hit:
+                results[index] = ToolResult(
+                    name=call.name,
+                    arguments=call.arguments,
+                    status=ToolStatus.OK,
+                    value=value,
+                    cached=True,
+                )
+                continue
+
+            if key not in joined:
+                in_flight = self._in_flight.get(key)
+                if in_flight is None:
+                    try:
+                        in_flight = self._start(key, call)
+                    except Exception as e:
+                        # e.g. a model-produced call with a missing or unexpected argument
+                        results[index] = ToolResult(
+                            name=call.name,
+                            arguments=call.arguments,
+                            status=ToolStatus.ERROR,
+                            error=f"Invalid call to {call.name}: {e}",
+                        )
+                        continue
+                in_flight.waiters += 1
+                joined[key] = in_flight
+            pending[index] = (key, joined[key])
+
+        try:
+            if joined:
+                await asyncio.wait(
+                    {in_flight.task for in_flight in joined.values()},
+                    timeout=max(timeout, 0),
+                )
+        finally:
+            for key, in_flight in joined.items():
+                in_flight.waiters -= 1
+                if not in_flight.task.done() and in_flight.waiters <= 0:
+                    in_flight.task.cancel()
+                    self._in_flight.pop(key, None)
+
+        for index, (key, in_flight) in pending.items():
+            results[index] = self._to_result(calls[index], in_flight)
+
+        return results
+
+    def _start(self, key: str, call: ToolCall) -> _InFlight:
+        # Raises here, before anything is shared, if the arguments don't fit the tool
+        task = asyncio.create_task(self.tools[call.name](**call.arguments))
+        in_flight = _InFlight(task)
+        self._in_flight[key] = in_flight
+
+        def _finished(done: asyncio.Task) -> None:
+            in_flight.finished = time.perf_counter()
+            if self._in_flight.get(key) is in_flight:
+                del self._in_flight[key]
+            if not done.cancelled() and done.exception() is None:
+                self._cache_set(key, done.result())
+
+        task.add_done_callback(_finished)
+        return in_flight
+
+    def _to_result(self, call: ToolCall, in_flight: _InFlight) -> ToolResult:
+        task = in_flight.task
+        result = ToolResult(
+            name=call.name,
+            arguments=call.arguments,
+            status=ToolStatus.TIMEOUT,
+            duration_ms=in_flight.duration_ms(),
+        )
+        if not task.done() or task.cancelled():
+            result.error = "Deadline exceeded"
+        elif task.exception() is not None:
+            result.status = ToolStatus.ERROR
+            result.error = str(task.exception()) or type(task.exception()).__name__
+        else:
+            result.status = ToolStatus.OK
+            result.value = task.result()
+        return result
+
+    def _cache_get(self, key: str) -> tuple[bool, Any]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return False, None
+        self._cache.move_to_end(key)
+        return True, value
+
+    def _cache_set(self, key: str, value: Any) -> None:
+        if self.cache_ttl <= 0:
+            return
+        self._cache[key] = (time.monotonic() + self.cache_ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cache_entries:
+            self._cache.popitem(last=False)
+
+
+# Shared executor for model tool calls; generation doesn't call tools yet
+tool_executor = ToolExecutor()
@@ -0,0 +1,117 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import UsageDaily
+
+# USD per million tokens
+MODEL_PRICES_PER_MILLION: Dict[str, Dict[str, Decimal]] = {
+    "gemini-2.0-flash": {"prompt": Decimal("0.075"), "completion": Decimal("0.30")},
+    "gemini-2.5-flash": {"prompt": Decimal("0.15"), "completion": Decimal("0.60")},
+    "gemini-2.5-pro": {"prompt": Decimal("1.25"), "completion": Decimal("5.00")},
+}
+AGGREGATE_GROUPS = ("day", "model", "user")
+
+
+def token_counts(metadata: Dict[str, Any]) -> tuple[int, int]:
+    """(prompt, completion) tokens from a message's `llm_metadata`.
+
+    A bare `tokens` total without the split is counted as completion tokens.
+    """
+    prompt = int(metadata.get("prompt_tokens") or 0)
+    completion = int(metadata.get("completion_tokens") or 0)
+    if not prompt and not completion:
+        completion = int(metadata.get("tokens") or 0)
+    return prompt, completion
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> Decimal:
+    """Price a reply; models without a price (mocks, templates) cost nothing."""
+    prices = MODEL_PRICES_PER_MILLION.get(model)
+    if prices is None:
+        return Decimal(0)
+    return (prompt_tokens * prices["prompt"] + completion_tokens * prices["completion"]) / 1_000_000
+
+
+class UsageService:
+    """Maintain and query the `usage_daily` rollup."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def record(self, user_id: UUID, metadata: Dict[str, Any], day: Optional[date] = None) -> None:
+        """Add one reply's tokens to the user's row for the day (in the caller's transaction)."""
+        prompt, completion = token_counts(metadata)
+        if not prompt and not completion:
+            return
+
+        model = metadata.get("model") or "unknown"
+        stmt = insert(UsageDaily).values(
+            user_id=user_id,
+            day=day or datetime.utcnow().date(),
+            model=model,
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            cost_usd=cost_usd(model, prompt, completion),
+            messages=1,
+            updated_at=datetime.utcnow()
+        )
+        await self.db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[UsageDaily.user_id, UsageDaily.day, UsageDaily.model],
+                set_={
+                    "prompt_tokens": UsageDaily.prompt_tokens + stmt.excluded.prompt_tokens,
+                    "completion_tokens": UsageDaily.completion_tokens + stmt.excluded.completion_tokens,
+                    "cost_usd": UsageDaily.cost_usd + stmt.excluded.cost_usd,
+                    "messages": UsageDaily.messages + 1,
+                    "updated_at": stmt.excluded.updated_at,
+                }
+            )
+        )
+
+    async def get_daily(self, user_id: UUID, start: date, end: date) -> List[UsageDaily]:
+        """The user's rows between `start` and `end` (inclusive)."""
+        result = await self.db.execute(
+            select(UsageDaily)
+            .where(
+                UsageDaily.user_id == user_id,
+                UsageDaily.day.between(start, end)
+            )
+            .order_by(UsageDaily.day, UsageDaily.model)
+        )
+        return list(result.scalars().all())
+
+    async def tokens_on(self, user_id: UUID, day: date) -> int:
+        """Total tokens the user spent on a day, for quota checks (a primary-key range read)."""
+        result = await self.db.execute(
+            select(func.coalesce(func.sum(UsageDaily.prompt_tokens + UsageDaily.completion_tokens), 0))
+            .where(UsageDaily.user_id == user_id, UsageDaily.day == day)
+        )
+        return int(result.scalar_one())
+
+    async def aggregate(self, start: date, end: date, group_by: str = "day") -> List[Dict[str, Any]]:
+        """Totals across all users, grouped by day, model or user."""
+        key = {
+            "day": UsageDaily.day,
+            "model": UsageDaily.model,
+            "user": UsageDaily.user_id,
+        }[group_by]
+        result = await self.db.execute(
+            select(
+                key.label("key"),
+                func.count(func.distinct(UsageDaily.user_id)).label("users"),
+                func.sum(UsageDaily.messages).label("messages"),
+                func.sum(UsageDaily.prompt_tokens).label("prompt_tokens"),
+                func.sum(UsageDaily.completion_tokens).label("completion_tokens"),
+                func.sum(UsageDaily.cost_usd).label("cost_usd")
+            )
+            .where(UsageDaily.day.between(start, end))
+            .group_by(key)
+            .order_by(key)
+        )
+        return [dict(row._mapping) for row in result]
@@ -0,0 +1,385 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, not_, or_, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.metrics import (
+    VIABILITY_ADAPTATIONS,
+    VIABILITY_BATCH_LATENCY,
+    VIABILITY_COMPONENTS_CHECKED,
+    VIABILITY_CONDITION_CHECKS,
+    VIABILITY_LAST_PASS,
+    VIABILITY_TRIPS_CHECKED,
+)
+from app.models import Trip, TripAdaptation
+from app.services.locations import coordinates
+from app.services.provider_cache import ProviderCache, provider_cache
+
+logger = logging.getLogger(__name__)
+
+# Provider cache entries consulted for every planned component, in order
+CONDITION_PROVIDERS = ("weather", "availability")
+# Components the user hasn't committed to are not adapted
+SKIPPED_DECISIONS = {"vetoed", "considering"}
+# Spelled out rather than bound so the planner can use ix_trips_in_progress
+IN_PROGRESS = text("trips.status = 'IN_PROGRESS'")
+
+ConditionKey = Tuple[str, str, date]  # (provider, location, day)
+
+
+@dataclass
+class _Planned:
+    trip_id: UUID
+    day: date
+    component: Dict[str, Any]
+    location: str
+
+    @property
+    def component_id(self) -> str:
+        return str(self.component["id"])
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def location_key(location: Optional[Dict[str, Any]], destination: Optional[str] = None) -> Optional[str]:
+    """Group key for a component's place: its name, else a ~1 km grid cell, else the trip destination."""
+    if not isinstance(location, dict):
+        location = {}
+    name = location.get("name") or location.get("city")
+    if name:
+        return " ".join(str(name).split()).casefold()
+    try:
+        point = coordinates(location)
+    except (TypeError, ValueError):
+        point = None
+    if point is not None:
+        return f"{point[0]:.2f},{point[1]:.2f}"
+    if destination:
+        return " ".join(destination.split()).casefold()
+    return None
+
+
+def _tags(value: Any) -> Set[str]:
+    """Tags from a list, or a single tag; anything else has none."""
+    if isinstance(value, str):
+        return {value}
+    if isinstance(value, (list, tuple)):
+        return {tag for tag in value if isinstance(tag, str)}
+    return set()
+
+
+def _backups(component: Dict[str, Any]) -> List[Dict[str, Any]]:
+    backups = component.get("backups")
+    if not isinstance(backups, list):
+        return []
+    return [backup for backup in backups if isinstance(backup, dict)]
+
+
+def affects(condition: Optional[Dict[str, Any]], component: Dict[str, Any]) -> bool:
+    """Whether a provider's answer rules the component out.
+
+    Providers answer `{"disrupted": bool, "reason": str, "tags": [...]}` for a
+    location and day; a disruption with tags (e.g. `["outdoor"]` for a storm)
+    only affects components sharing one of them, one without tags affects
+    everything there.
+    """
+    if not isinstance(condition, dict) or not condition.get("disrupted"):
+        return False
+    tags = _tags(condition.get("tags"))
+    return not tags or bool(tags & _tags(component.get("tags")))
+
+
+class ViabilityScheduler:
+    """Periodically check the upcoming days of every in-progress trip against current conditions.
+
+    Trips are claimed in keyset batches by taking a lease on them
+    (`FOR UPDATE SKIP LOCKED`), so any number of worker processes can run
+    passes at once and each trip is checked by one of them. Within a batch,
+    components are grouped by (location, date) and each provider is asked
+    once per group through the provider cache. Unviable components are
+    written to `trip_adaptations` in one statement per batch, with the first
+    of their `backups` that is itself viable as the proposed replacement;
+    `detected_at` keeps the first pass that flagged them.
+    """
+
+    def __init__(
+        self,
+        cache: ProviderCache = provider_cache,
+        batch_size: int = settings.VIABILITY_BATCH_SIZE,
+        lease_seconds: int = settings.VIABILITY_LEASE_SECONDS,
+        recheck_seconds: int = settings.VIABILITY_CHECK_INTERVAL_SECONDS,
+        horizon_days: int = settings.VIABILITY_HORIZON_DAYS,
+        concurrency: int = settings.VIABILITY_CHECK_CONCURRENCY,
+        worker: Optional[str] = None,
+    ):
+        self.cache = cache
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.recheck_seconds = recheck_seconds
+        self.horizon_days = horizon_days
+        self.concurrency = concurrency
+        self.worker = worker or worker_id()
+
+    def providers(self) -> List[str]:
+        return [provider for provider in CONDITION_PROVIDERS if self.cache.has_provider(provider)]
+
+    async def run_pass(self) -> int:
+        """Check every due in-progress trip; return how many this worker checked."""
+        providers = self.providers()
+        if not providers:
+            logger.debug("No condition providers registered; skipping viability pass")
+            return 0
+
+        checked = 0
+        after = None
+        while True:
+            trips = await self._claim(after)
+            if not trips:
+                break
+            started = time.perf_counter()
+            adaptations = await self._check(trips, providers)
+            await self._finish([trip.id for trip in trips], adaptations)
+            VIABILITY_BATCH_LATENCY.observe(time.perf_counter() - started)
+            VIABILITY_TRIPS_CHECKED.inc(len(trips))
+            checked += len(trips)
+            after = max(trip.id for trip in trips)
+
+        VIABILITY_LAST_PASS.set_to_current_time()
+        return checked
+
+    async def _claim(self, after: Optional[UUID]) -> List[Any]:
+        now = datetime.utcnow()
+        due = (
+            select(Trip.id)
+            .where(
+                IN_PROGRESS,
+                or_(
+                    Trip.viability_lease_expires_at.is_(None),
+                    Trip.viability_lease_expires_at < now
+                ),
+                or_(
+                    Trip.viability_checked_at.is_(None),
+                    Trip.viability_checked_at < now - timedelta(seconds=self.recheck_seconds)
+                )
+            )
+            .order_by(Trip.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if after is not None:
+            due = due.where(Trip.id > after)
+
+        async with async_session() as session:
+            result = await session.execute(
+                update(Trip)
+                .where(Trip.id.in_(due.scalar_subquery()))
+                .values(
+                    viability_lease_owner=self.worker,
+                    viability_lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    updated_at=Trip.updated_at
+                )
+                .returning(Trip.id, Trip.destination, Trip.itinerary)
+                .execution_options(synchronize_session=False)
+            )
+            trips = list(result.all())
+            await session.commit()
+        return trips
+
+    async def _check(self, trips: List[Any], providers: List[str]) -> List[Dict[str, Any]]:
+        today = datetime.utcnow().date()
+        last_day = today + timedelta(days=self.horizon_days)
+
+        planned: List[_Planned] = []
+        for trip in trips:
+            try:
+                planned.extend(self._planned(trip, today, last_day))
+            except (ValueError, TypeError, AttributeError) as e:
+                # One malformed itinerary mustn't fail the batch on every pass
+                logger.warning("Skipping viability check of trip %s: malformed itinerary (%s)", trip.id, e)
+        VIABILITY_COMPONENTS_CHECKED.inc(len(planned))
+
+        conditions = await self._conditions(
+            {(item.location, item.day) for item in planned},
+            providers
+        )
+
+        disrupted = []
+        for item in planned:
+            for provider in providers:
+                condition = conditions.get((provider, item.location, item.day))
+                if affects(condition, item.component):
+                    disrupted.append((item, provider, condition))
+                    break
+
+        # Backups are only looked at for components that need one
+        backup_groups = set()
+        for item, _, _ in disrupted:
+            for backup in _backups(item.component):
+                location = location_key(backup.get("location"), None) or item.location
+                backup_groups.add((location, item.day))
+        conditions.update(await self._conditions(
+            {group for group in backup_groups if (providers[0], *group) not in conditions},
+            providers
+        ))
+
+        adaptations = []
+        seen = set()
+        for item, provider, condition in disrupted:
+            # A component listed twice on a day would hit the same row twice in one upsert
+            key = (item.trip_id, item.day, item.component_id)
+            if key in seen:
+                continue
+            seen.add(key)
+            VIABILITY_ADAPTATIONS.labels(provider=provider).inc()
+            adaptations.append({
+                "trip_id": item.trip_id,
+                "day": item.day,
+                "component_id": item.component_id,
+                "reason": f"{provider}: {condition.get('reason') or 'disrupted'}",
+                "replacement": self._viable_backup(item, providers, conditions),
+                "conditions": {provider: condition},
+                "detected_at": datetime.utcnow(),
+            })
+        return adaptations
+
+    def _planned(self, trip: Any, today: date, last_day: date) -> List[_Planned]:
+        """The trip's components to check: upcoming, committed to, with an id and a place."""
+        planned = []
+        without_id = 0
+        for day in (trip.itinerary or {}).get("days", []):
+            if not day.get("date"):
+                continue
+            day_date = date.fromisoformat(day["date"])
+            if not today <= day_date <= last_day:
+                continue
+            for component in day.get("components", []):
+                if not isinstance(component, dict) or component.get("decision") in SKIPPED_DECISIONS:
+                    continue
+                if component.get("id") is None:
+                    # Adaptations are keyed by component id
+                    without_id += 1
+                    continue
+                location = location_key(component.get("location"), trip.destination)
+                if location is not None:
+                    planned.append(_Planned(trip.id, day_date, component, location))
+        if without_id:
+            logger.debug("Trip %s has %d upcoming components without an id; not checked", trip.id, without_id)
+        return planned
+
+    def _viable_backup(
+        self,
+        item: _Planned,
+        providers: List[str],
+        conditions: Dict[ConditionKey, Optional[Dict[str, Any]]],
+    ) -> Optional[Dict[str, Any]]:
+        for backup in _backups(item.component):
+            location = location_key(backup.get("location"), None) or item.location
+            if not any(affects(conditions.get((p, location, item.day)), backup) for p in providers):
+                return backup
+        return None
+
+    async def _conditions(
+        self,
+        groups: Iterable[Tuple[str, date]],
+        providers: List[str],
+    ) -> Dict[ConditionKey, Optional[Dict[str, Any]]]:
+        """Ask each provider once per (location, day); a failed or malformed lookup counts as no disruption."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results: Dict[ConditionKey, Optional[Dict[str, Any]]] = {}
+
+        async def lookup(provider: str, location: str, day: date) -> None:
+            async with semaphore:
+                try:
+                    condition = await self.cache.get(provider, location=location, day=day)
+                    if condition is not None and not isinstance(condition, dict):
+                        raise TypeError(f"expected an object, got {type(condition).__name__}")
+                    results[(provider, location, day)] = condition
+                    VIABILITY_CONDITION_CHECKS.labels(provider=provider, result="ok").inc()
+                except Exception as e:
+                    logger.warning("%s lookup failed for %s on %s: %s", provider, location, day, e)
+                    VIABILITY_CONDITION_CHECKS.labels(provider=provider, result="error").inc()
+                    results[(provider, location, day)] = None
+
+        await asyncio.gather(*(
+            lookup(provider, location, day)
+            for location, day in groups
+            for provider in providers
+        ))
+        return results
+
+    async def _finish(self, trip_ids: List[UUID], adaptations: List[Dict[str, Any]]) -> None:
+        """Release the leases and replace the upcoming adaptations of the trips still held."""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            result = await session.execute(
+                update(Trip)
+                .where(Trip.id.in_(trip_ids), Trip.viability_lease_owner == self.worker)
+                .values(
+                    viability_lease_owner=None,
+                    viability_lease_expires_at=None,
+                    viability_checked_at=now,
+                    updated_at=Trip.updated_at
+                )
+                .returning(Trip.id)
+                .execution_options(synchronize_session=False)
+            )
+            # A trip whose lease ran out may be in another worker's batch by now
+            owned: Set[UUID] = set(result.scalars().all())
+            if len(owned) < len(trip_ids):
+                logger.warning("Lost the viability lease on %d trips", len(trip_ids) - len(owned))
+            rows = [row for row in adaptations if row["trip_id"] in owned]
+
+            # Components that are viable again lose their adaptation
+            stale = delete(TripAdaptation).where(
+                TripAdaptation.trip_id.in_(owned),
+                TripAdaptation.day >= now.date()
+            )
+            if rows:
+                stale = stale.where(not_(
+                    tuple_(TripAdaptation.trip_id, TripAdaptation.day, TripAdaptation.component_id)
+                    .in_([(row["trip_id"], row["day"], row["component_id"]) for row in rows])
+                ))
+            if owned:
+                await session.execute(stale)
+
+            if rows:
+                stmt = insert(TripAdaptation).values(rows)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        constraint="uq_trip_adaptations_component",
+                        set_={
+                            "reason": stmt.excluded.reason,
+                            "replacement": stmt.excluded.replacement,
+                            "conditions": stmt.excluded.conditions,
+                        }
+                    )
+                )
+            await session.commit()
+
+    async def run_forever(self, interval: float = settings.VIABILITY_CHECK_INTERVAL_SECONDS) -> None:
+        """Run a pass periodically until cancelled."""
+        while True:
+            try:
+                checked = await self.run_pass()
+                if checked:
+                    logger.info("Checked viability of %d in-progress trips", checked)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Viability pass failed")
+            await asyncio.sleep(interval)
+
+
+viability_scheduler = ViabilityScheduler()
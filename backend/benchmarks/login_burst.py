@@ -0,0 +1,159 @@
+"""Login burst benchmark: legacy lookup-then-write vs single-statement upsert.
+
+Simulates a burst of Google logins (returning users, users linking an
+existing email account, and brand-new users) against the database in
+DATABASE_URL, and reports statements, commits and latency per login.
+Token exchange and id_token verification are skipped; only the database
+part of `authenticate_google_user` is measured.
+
+Run from the backend directory against a disposable database:
+
+    python -m benchmarks.login_burst --logins 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, event, select
+
+from app.core.database import async_session, get_engine
+from app.models.user import User
+from app.services.auth import AuthService
+
+EMAIL_DOMAIN = "login-burst.example.com"
+
+
+class Counter:
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+
+    def attach(self, engine) -> None:
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_statement)
+        event.listen(engine.sync_engine, "commit", self._on_commit)
+
+    def _on_statement(self, *args) -> None:
+        self.statements += 1
+
+    def _on_commit(self, *args) -> None:
+        self.commits += 1
+
+
+async def legacy_login(db, user_info: dict) -> User:
+    """The login path as it was before the upsert: up to two lookups and two commits."""
+    result = await db.execute(select(User).where(User.google_id == user_info["id"]))
+    user = result.scalar_one_or_none()
+    if not user:
+        result = await db.execute(select(User).where(User.email == user_info["email"]))
+        user = result.scalar_one_or_none()
+        if user:
+            user.google_id = user_info["id"]
+            user.profile_picture = user_info.get("picture")
+            user.full_name = user_info.get("name", user.full_name)
+        else:
+            user = User(
+                email=user_info["email"],
+                full_name=user_info.get("name"),
+                google_id=user_info["id"],
+                profile_picture=user_info.get("picture"),
+            )
+            db.add(user)
+            await db.commit()
+            await db.refresh(user)
+    user.last_login = datetime.utcnow()
+    await db.commit()
+    return user
+
+
+async def upsert_login(db, user_info: dict) -> User:
+    user = await AuthService(db).upsert_google_user(user_info)
+    await db.commit()
+    return user
+
+
+async def seed(run: str, count: int) -> list[dict]:
+    """Create users so a third of the burst are returning and a third link by email."""
+    identities = []
+    async with async_session() as db:
+        for i in range(count):
+            kind = ("returning", "link", "new")[i % 3]
+            info = {
+                "id": f"{run}-google-{i}",
+                "email": f"{run}-{i}@{EMAIL_DOMAIN}",
+                "name": f"User {i}",
+                "picture": None,
+            }
+            if kind == "returning":
+                db.add(User(email=info["email"], google_id=info["id"]))
+            elif kind == "link":
+                db.add(User(email=info["email"]))
+            identities.append(info)
+        await db.commit()
+    return identities
+
+
+async def run_burst(name: str, login, logins: int, concurrency: int, counter: Counter) -> dict:
+    run = f"{name}-{uuid.uuid4().hex[:8]}"
+    identities = await seed(run, logins)
+    counter.statements = counter.commits = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(info: dict) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            async with async_session() as db:
+                await login(db, info)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(info) for info in identities))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "path": name,
+        "statements_per_login": counter.statements / logins,
+        "commits_per_login": counter.commits / logins,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "logins_per_s": logins / elapsed,
+    }
+
+
+async def cleanup() -> None:
+    async with async_session() as db:
+        await db.execute(delete(User).where(User.email.like(f"%@{EMAIL_DOMAIN}")))
+        await db.commit()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    counter = Counter()
+    counter.attach(get_engine())
+    try:
+        results = [
+            await run_burst("legacy", legacy_login, args.logins, args.concurrency, counter),
+            await run_burst("upsert", upsert_login, args.logins, args.concurrency, counter),
+        ]
+    finally:
+        await cleanup()
+
+    print(f"logins={args.logins} concurrency={args.concurrency} (1/3 returning, 1/3 link, 1/3 new)")
+    print(f"{'path':8} {'stmts/login':>12} {'commits/login':>14} {'p50 ms':>8} {'p95 ms':>8} {'logins/s':>9}")
+    for r in results:
+        print(
+            f"{r['path']:8} {r['statements_per_login']:12.2f} {r['commits_per_login']:14.2f} "
+            f"{r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['logins_per_s']:9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,180 @@
+"""Drive the provider cache with local fake weather and availability providers.
+
+The fakes sleep for a fixed upstream latency and count their calls. A burst
+of lookups skewed towards a few popular (destination, date) pairs runs
+three times: straight to the providers, through a cold cache, and again
+once every entry has gone stale. For each run the report shows upstream
+calls, latency percentiles and, for the cached runs, the hit ratio:
+
+    python -m benchmarks.provider_cache --lookups 5000 --concurrency 50
+
+Upstream calls in the cold run equal the number of distinct keys (the
+concurrent misses collapse into one request each), and the stale run is
+served at cache latency while one background refresh per key goes out.
+With --redis, a second cache instance sharing REDIS_URL stands in for
+another worker and should need no upstream calls of its own.
+"""
+import argparse
+import asyncio
+import math
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.core.config import settings
+from app.services.provider_cache import ProviderCache, ProviderPolicy, cache_key
+
+DESTINATIONS = ["Lisbon", "Kyoto", "Cape Town", "Reykjavik", "Oaxaca", "Hanoi", "Tbilisi", "Queenstown"]
+
+
+class FakeProvider:
+    """Upstream stand-in: fixed latency, deterministic answers, counted calls."""
+
+    def __init__(self, latency_ms: float, answer: Callable[..., Dict[str, Any]]):
+        self.latency_ms = latency_ms
+        self.answer = answer
+        self.calls = 0
+
+    async def __call__(self, **arguments) -> Dict[str, Any]:
+        self.calls += 1
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self.answer(**arguments)
+
+
+def weather(destination: str, day: str) -> Dict[str, Any]:
+    seed = sum(map(ord, f"{destination}{day}"))
+    return {"condition": ["clear", "rain", "storm"][seed % 3], "temp_c": 10 + seed % 20}
+
+
+def availability(destination: str, day: str) -> Dict[str, Any]:
+    seed = sum(map(ord, f"{day}{destination}"))
+    return {"available": seed % 5 != 0, "slots": seed % 12}
+
+
+def workload(lookups: int, days: int, seed: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """Zipf-ish mix of lookups; destination spelling varies to exercise key normalization."""
+    rng = random.Random(seed)
+    start = date(2026, 11, 1)
+    weights = [1 / (rank + 1) for rank in range(len(DESTINATIONS))]
+    calls = []
+    for _ in range(lookups):
+        destination = rng.choices(DESTINATIONS, weights)[0]
+        if rng.random() < 0.3:
+            destination = f"  {destination.upper()} "
+        day = start + timedelta(days=rng.randrange(days))
+        provider = "weather" if rng.random() < 0.6 else "availability"
+        calls.append((provider, {"destination": destination, "day": day}))
+    return calls
+
+
+async def run(
+    calls: List[Tuple[str, Dict[str, Any]]],
+    lookup: Callable[..., Any],
+    concurrency: int,
+) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(provider: str, arguments: Dict[str, Any]) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await lookup(provider, **arguments)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(one(provider, arguments) for provider, arguments in calls))
+    return latencies
+
+
+def build_cache(
+    providers: Dict[str, FakeProvider],
+    ttl: float,
+    stale_ttl: float,
+    max_entries: int,
+    redis_url: str = None,
+) -> ProviderCache:
+    cache = ProviderCache(max_entries=max_entries, redis_url=redis_url)
+    for name, provider in providers.items():
+        cache.register(name, provider, ProviderPolicy(ttl=ttl, stale_ttl=stale_ttl))
+    return cache
+
+
+def report(label: str, latencies: List[float], upstream: int, hits: int = None) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[max(math.ceil(len(ordered) * 0.95) - 1, 0)]
+    line = (
+        f"{label:14} lookups={len(ordered):6} upstream_calls={upstream:6} "
+        f"p50={statistics.median(ordered):8.2f}ms p95={p95:8.2f}ms"
+    )
+    if hits is not None:
+        line += f" hit_ratio={hits / len(ordered):6.1%}"
+    print(line)
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--days", type=int, default=14, help="distinct dates in the workload")
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="fake provider latency")
+    parser.add_argument("--max-entries", type=int, default=10000)
+    parser.add_argument("--ttl", type=float, default=2.0, help="seconds before entries go stale")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--redis", action="store_true", help="also exercise the Redis tier at REDIS_URL")
+    args = parser.parse_args()
+
+    calls = workload(args.lookups, args.days, args.seed)
+
+    def fresh_providers() -> Dict[str, FakeProvider]:
+        return {
+            "weather": FakeProvider(args.latency_ms, weather),
+            "availability": FakeProvider(args.latency_ms, availability),
+        }
+
+    def upstream(providers: Dict[str, FakeProvider]) -> int:
+        return sum(p.calls for p in providers.values())
+
+    providers = fresh_providers()
+    latencies = await run(calls, lambda name, **kw: providers[name](**kw), args.concurrency)
+    report("uncached", latencies, upstream(providers))
+
+    providers = fresh_providers()
+    redis_url = settings.REDIS_URL if args.redis else None
+    cache = build_cache(providers, ttl=args.ttl, stale_ttl=3600, max_entries=args.max_entries, redis_url=redis_url)
+    hits = Counter()
+
+    async def cached(name: str, **arguments):
+        hits[cache_key(name, arguments) in cache._entries] += 1
+        return await cache.get(name, **arguments)
+
+    latencies = await run(calls, cached, args.concurrency)
+    report("cold cache", latencies, upstream(providers), hits[True])
+    distinct_keys = len(cache._entries)
+
+    # Let every entry go past its TTL (here and in Redis) but stay inside the stale window
+    await asyncio.sleep(max(max(e.fresh_until for e in cache._entries.values()) - time.time(), 0))
+    hits.clear()
+    before = upstream(providers)
+    latencies = await run(calls, cached, args.concurrency)
+    await asyncio.gather(*list(cache._refreshing.values()))
+    report("stale cache", latencies, upstream(providers) - before, hits[True])
+
+    ok = upstream(providers) - before == distinct_keys
+    if args.redis:
+        other = fresh_providers()
+        worker = build_cache(other, ttl=3600, stale_ttl=3600, max_entries=args.max_entries, redis_url=redis_url)
+        latencies = await run(calls, worker.get, args.concurrency)
+        report("second worker", latencies, upstream(other))
+        ok = ok and upstream(other) == 0
+        await worker.close()
+    await cache.close()
+
+    print(f"distinct keys: {distinct_keys}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,267 @@
+"""Replay recorded conversations through the chat pipeline with a stub model.
+
+Each line of the fixture file is a conversation:
+
+    {"id": "...", "turns": [{"message": "...", "expect_state": "gathering_context"}, ...]}
+
+Turns run in-process through `ChatService.process_message` against the
+database in DATABASE_URL, with the model replaced by a deterministic stub
+(fixed latency plus seeded jitter, token counts derived from text length).
+The report groups turns by the conversation state at the start of the turn:
+latency, prompt size, tokens and DB statements per turn. Token and
+statement counts are deterministic, so a change in them is a real change
+in the pipeline.
+
+Run from the backend directory against a disposable, migrated database:
+
+    python -m benchmarks.replay --output replay.json
+    python -m benchmarks.replay --baseline replay.json
+
+With --baseline the run is compared metric by metric and the command exits
+non-zero on a regression, so it can gate CI.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, event, select
+
+from app.core.database import async_session, get_engine
+from app.models import Conversation, Message, User
+from app.services.chat import ChatService, TurnBudget, generate_mock_response
+
+DEFAULT_FIXTURES = Path(__file__).parent / "fixtures" / "replay_conversations.jsonl"
+EMAIL_DOMAIN = "replay.example.com"
+# Metrics where any change counts, and ones compared with a tolerance
+EXACT_METRICS = ("turns", "prompt_tokens", "completion_tokens", "statements_per_turn")
+LATENCY_METRICS = ("p50_ms", "p95_ms")
+
+SYSTEM_PROMPT = (
+    "You are PickedFor.me, a travel planning assistant. Ask focused questions, "
+    "keep replies short and move the conversation towards concrete options."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+class StubModel:
+    """Deterministic stand-in for the LLM.
+
+    Replies and state transitions come from the mock generator; latency is
+    `latency_ms` plus seeded jitter, and token counts are estimated from the
+    prompt it would have sent and the reply text.
+    """
+
+    def __init__(self, latency_ms: float, jitter_ms: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rng = random.Random(seed)
+        self.last_prompt_chars = 0
+
+    def build_prompt(self, conversation: Conversation, user_message: str) -> str:
+        return "\n\n".join([
+            SYSTEM_PROMPT,
+            f"State: {conversation.state.value}",
+            f"Context: {json.dumps(conversation.context or {}, sort_keys=True)}",
+            f"User: {user_message}",
+        ])
+
+    async def __call__(self, conversation: Conversation, user_message: str) -> Dict[str, Any]:
+        prompt = self.build_prompt(conversation, user_message)
+        self.last_prompt_chars = len(prompt)
+        delay = self.latency_ms + self.rng.uniform(0, self.jitter_ms)
+        await asyncio.sleep(delay / 1000)
+
+        reply = await generate_mock_response(conversation, user_message)
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(reply["content"])
+        reply["metadata"] = {
+            "model": "stub",
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens": prompt_tokens + completion_tokens,
+        }
+        return reply
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(get_engine().sync_engine, "before_cursor_execute", self._on_statement)
+
+    def _on_statement(self, *args) -> None:
+        self.count += 1
+
+
+def load_fixtures(path: Path) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(fixtures: List[Dict[str, Any]], model: StubModel) -> Dict[str, Any]:
+    counter = StatementCounter()
+    samples: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+    mismatches = []
+
+    async with async_session() as db:
+        user = User(email=f"replay-{time.time_ns()}@{EMAIL_DOMAIN}", full_name="Replay")
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+
+    try:
+        for fixture in fixtures:
+            async with async_session() as db:
+                chat_service = ChatService(db, generate=model)
+                conversation = await chat_service.create_conversation(user_id)
+                await db.commit()
+
+                for index, turn in enumerate(fixture["turns"]):
+                    state = conversation.state.value
+                    statements_before = counter.count
+                    started = time.perf_counter()
+                    response = await chat_service.process_message(
+                        conversation,
+                        turn["message"],
+                        budget=TurnBudget(3600),
+                        include_metadata=True
+                    )
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+
+                    metadata = response.message.llm_metadata
+                    turn_samples = samples[state]
+                    turn_samples["latency_ms"].append(elapsed_ms)
+                    turn_samples["prompt_chars"].append(model.last_prompt_chars)
+                    turn_samples["prompt_tokens"].append(metadata.get("prompt_tokens", 0))
+                    turn_samples["completion_tokens"].append(metadata.get("completion_tokens", 0))
+                    turn_samples["statements"].append(counter.count - statements_before)
+
+                    expected = turn.get("expect_state")
+                    if expected and response.state.value != expected:
+                        mismatches.append({
+                            "conversation": fixture["id"],
+                            "turn": index,
+                            "expected": expected,
+                            "actual": response.state.value,
+                        })
+    finally:
+        async with async_session() as db:
+            conversation_ids = select(Conversation.id).where(Conversation.user_id == user_id)
+            await db.execute(delete(Message).where(Message.conversation_id.in_(conversation_ids)))
+            await db.execute(delete(Conversation).where(Conversation.user_id == user_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+
+    return {
+        "states": {state: summarize(values) for state, values in sorted(samples.items())},
+        "state_mismatches": mismatches,
+    }
+
+
+def summarize(values: Dict[str, List[float]]) -> Dict[str, Any]:
+    latencies = sorted(values["latency_ms"])
+    turns = len(latencies)
+    return {
+        "turns": turns,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[max(math.ceil(turns * 0.95) - 1, 0)], 2),
+        "mean_prompt_chars": round(statistics.mean(values["prompt_chars"]), 1),
+        "prompt_tokens": int(sum(values["prompt_tokens"])),
+        "completion_tokens": int(sum(values["completion_tokens"])),
+        "statements_per_turn": round(sum(values["statements"]) / turns, 2),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], latency_tolerance: float) -> List[str]:
+    """Describe every regression of `current` against `baseline`."""
+    regressions = []
+    for state in sorted(set(current["states"]) | set(baseline["states"])):
+        now = current["states"].get(state)
+        before = baseline["states"].get(state)
+        if now is None or before is None:
+            regressions.append(f"{state}: only in {'baseline' if now is None else 'current run'}")
+            continue
+        for metric in EXACT_METRICS:
+            if now[metric] != before[metric]:
+                regressions.append(f"{state}.{metric}: {before[metric]} -> {now[metric]}")
+        for metric in LATENCY_METRICS:
+            limit = before[metric] * (1 + latency_tolerance)
+            if now[metric] > limit:
+                regressions.append(
+                    f"{state}.{metric}: {before[metric]} -> {now[metric]} "
+                    f"(over +{latency_tolerance:.0%})"
+                )
+    if current["state_mismatches"]:
+        regressions.append(f"{len(current['state_mismatches'])} turns ended in an unexpected state")
+    return regressions
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    columns = ("turns", "p50_ms", "p95_ms", "mean_prompt_chars", "prompt_tokens",
+               "completion_tokens", "statements_per_turn")
+    print(f"{'state':22}" + "".join(f"{c:>20}" for c in columns))
+    for state, metrics in report["states"].items():
+        old = (baseline or {}).get("states", {}).get(state, {})
+        cells = []
+        for column in columns:
+            cell = f"{metrics[column]}"
+            if column in old and old[column] != metrics[column]:
+                cell = f"{old[column]}->{metrics[column]}"
+            cells.append(f"{cell:>20}")
+        print(f"{state:22}" + "".join(cells))
+    for mismatch in report["state_mismatches"]:
+        print(
+            f"state mismatch: {mismatch['conversation']} turn {mismatch['turn']}: "
+            f"expected {mismatch['expected']}, got {mismatch['actual']}"
+        )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="stub model latency per turn")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="replay the fixtures this many times")
+    parser.add_argument("--output", type=Path, help="write the report as JSON (e.g. a new baseline)")
+    parser.add_argument("--baseline", type=Path, help="compare against a previous --output")
+    parser.add_argument("--latency-tolerance", type=float, default=0.2,
+                        help="allowed relative p50/p95 increase over the baseline")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures) * args.repeat
+    model = StubModel(args.latency_ms, args.jitter_ms, args.seed)
+    report = await replay(fixtures, model)
+    report["config"] = {
+        "fixtures": args.fixtures.name,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "seed": args.seed,
+        "repeat": args.repeat,
+    }
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    print_report(report, baseline)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+    if baseline is None:
+        return 1 if report["state_mismatches"] else 0
+    regressions = compare(report, baseline, args.latency_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,54 @@
+"""Conversation soft delete and message cascade
+
+Revision ID: 04a0195608e2
+Revises: ebe14395c32f
+Create Date: 2026-10-18 09:12:41.502318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '04a0195608e2'
+down_revision: Union[str, None] = 'ebe14395c32f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('conversations', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_conversations_deleted_at',
+        'conversations',
+        ['deleted_at'],
+        postgresql_where=sa.text('deleted_at IS NOT NULL'),
+    )
+
+    op.drop_constraint('messages_conversation_id_fkey', 'messages', type_='foreignkey')
+    op.create_foreign_key(
+        'messages_conversation_id_fkey',
+        'messages',
+        'conversations',
+        ['conversation_id'],
+        ['id'],
+        ondelete='CASCADE',
+    )
+    op.create_index(op.f('ix_messages_conversation_id'), 'messages', ['conversation_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_messages_conversation_id'), table_name='messages')
+    op.drop_constraint('messages_conversation_id_fkey', 'messages', type_='foreignkey')
+    op.create_foreign_key(
+        'messages_conversation_id_fkey',
+        'messages',
+        'conversations',
+        ['conversation_id'],
+        ['id'],
+    )
+
+    op.drop_index('ix_conversations_deleted_at', table_name='conversations')
+    op.drop_column('conversations', 'deleted_at')
@@ -0,0 +1,42 @@
+"""Message full-text search
+
+Revision ID: 1ee9f14c6dc1
+Revises: 04a0195608e2
+Create Date: 2026-10-18 10:03:17.846120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1ee9f14c6dc1'
+down_revision: Union[str, None] = '04a0195608e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'messages',
+        sa.Column(
+            'content_tsv',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english', content)", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        'ix_messages_content_tsv',
+        'messages',
+        ['content_tsv'],
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_content_tsv', table_name='messages')
+    op.drop_column('messages', 'content_tsv')
@@ -0,0 +1,161 @@
+"""Partition messages by month and add message archives
+
+Revision ID: 3954e35543ea
+Revises: fc8079773020
+Create Date: 2026-10-19 18:27:51.604193
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3954e35543ea'
+down_revision: Union[str, None] = 'fc8079773020'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created past the current month; the archiver keeps this many ahead afterwards
+MONTHS_AHEAD = 3
+
+MESSAGE_COLUMNS = "id, conversation_id, role, content, llm_metadata, created_at"
+
+
+def _month(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    # Foreign keys can't point at messages.id once it is only unique together with created_at
+    op.drop_constraint('conversations_fork_point_message_id_fkey', 'conversations', type_='foreignkey')
+    op.drop_constraint('message_traces_message_id_fkey', 'message_traces', type_='foreignkey')
+
+    op.execute("ALTER TABLE messages RENAME TO messages_unpartitioned")
+    op.execute("ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey")
+    op.execute(
+        "ALTER TABLE messages_unpartitioned "
+        "RENAME CONSTRAINT messages_conversation_id_fkey TO messages_unpartitioned_conversation_id_fkey"
+    )
+    op.execute("ALTER INDEX ix_messages_content_tsv RENAME TO ix_messages_unpartitioned_content_tsv")
+    op.execute("ALTER INDEX ix_messages_conversation_id RENAME TO ix_messages_unpartitioned_conversation_id")
+
+    op.execute("""
+        CREATE TABLE messages (
+            id UUID NOT NULL,
+            conversation_id UUID NOT NULL,
+            role messagerole NOT NULL,
+            content TEXT NOT NULL,
+            llm_metadata JSON,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            content_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', content)) STORED,
+            CONSTRAINT messages_pkey PRIMARY KEY (id, created_at),
+            CONSTRAINT messages_conversation_id_fkey FOREIGN KEY (conversation_id)
+                REFERENCES conversations (id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.create_index('ix_messages_conversation_id', 'messages', ['conversation_id'], unique=False)
+    op.create_index('ix_messages_content_tsv', 'messages', ['content_tsv'], unique=False, postgresql_using='gin')
+
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM messages_unpartitioned")).scalar()
+    now = datetime.utcnow()
+    month = _month(oldest or now)
+    last = _month(now)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE messages_{month:%Y_%m} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+        )
+        month = _next_month(month)
+    # Catches rows outside every month (and holds rehydrated archived messages)
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    op.execute(
+        f"INSERT INTO messages ({MESSAGE_COLUMNS}) "
+        f"SELECT {MESSAGE_COLUMNS} FROM messages_unpartitioned"
+    )
+    op.drop_table('messages_unpartitioned')
+
+    op.create_table('message_archives',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('partition', sa.String(), nullable=False),
+    sa.Column('range_start', sa.DateTime(), nullable=False),
+    sa.Column('range_end', sa.DateTime(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('rows', sa.BigInteger(), nullable=False),
+    sa.Column('bytes', sa.BigInteger(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('partition')
+    )
+    op.create_table('message_archive_segments',
+    sa.Column('conversation_id', sa.UUID(), nullable=False),
+    sa.Column('archive_id', sa.Integer(), nullable=False),
+    sa.Column('offset', sa.BigInteger(), nullable=False),
+    sa.Column('length', sa.Integer(), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('rehydrated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['archive_id'], ['message_archives.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('conversation_id', 'archive_id')
+    )
+    op.create_index(op.f('ix_message_archive_segments_archive_id'), 'message_archive_segments', ['archive_id'], unique=False)
+    op.create_index('ix_message_archive_segments_rehydrated_at', 'message_archive_segments', ['rehydrated_at'], unique=False, postgresql_where=sa.text('rehydrated_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    # Messages of archived months that aren't rehydrated stay in their archive files
+    op.drop_index('ix_message_archive_segments_rehydrated_at', table_name='message_archive_segments', postgresql_where=sa.text('rehydrated_at IS NOT NULL'))
+    op.drop_index(op.f('ix_message_archive_segments_archive_id'), table_name='message_archive_segments')
+    op.drop_table('message_archive_segments')
+    op.drop_table('message_archives')
+
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute("ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_pkey TO messages_partitioned_pkey")
+    op.execute(
+        "ALTER TABLE messages_partitioned "
+        "RENAME CONSTRAINT messages_conversation_id_fkey TO messages_partitioned_conversation_id_fkey"
+    )
+    op.execute("ALTER INDEX ix_messages_content_tsv RENAME TO ix_messages_partitioned_content_tsv")
+    op.execute("ALTER INDEX ix_messages_conversation_id RENAME TO ix_messages_partitioned_conversation_id")
+
+    op.execute("""
+        CREATE TABLE messages (
+            id UUID NOT NULL,
+            conversation_id UUID NOT NULL,
+            role messagerole NOT NULL,
+            content TEXT NOT NULL,
+            llm_metadata JSON,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            content_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', content)) STORED,
+            CONSTRAINT messages_pkey PRIMARY KEY (id),
+            CONSTRAINT messages_conversation_id_fkey FOREIGN KEY (conversation_id)
+                REFERENCES conversations (id) ON DELETE CASCADE
+        )
+    """)
+    op.execute(
+        f"INSERT INTO messages ({MESSAGE_COLUMNS}) "
+        f"SELECT {MESSAGE_COLUMNS} FROM messages_partitioned"
+    )
+    op.execute("DROP TABLE messages_partitioned CASCADE")
+    op.create_index('ix_messages_conversation_id', 'messages', ['conversation_id'], unique=False)
+    op.create_index('ix_messages_content_tsv', 'messages', ['content_tsv'], unique=False, postgresql_using='gin')
+
+    # NOT VALID: fork points and traces may refer to messages that stayed archived
+    op.execute(
+        "ALTER TABLE message_traces ADD CONSTRAINT message_traces_message_id_fkey "
+        "FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE NOT VALID"
+    )
+    op.execute(
+        "ALTER TABLE conversations ADD CONSTRAINT conversations_fork_point_message_id_fkey "
+        "FOREIGN KEY (fork_point_message_id) REFERENCES messages (id) NOT VALID"
+    )
@@ -0,0 +1,46 @@
+"""Trip viability leases and adaptations
+
+Revision ID: bfbbadda3fd2
+Revises: e0eadef45a60
+Create Date: 2026-10-19 11:04:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bfbbadda3fd2'
+down_revision: Union[str, None] = 'e0eadef45a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('trip_adaptations',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('trip_id', sa.UUID(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('component_id', sa.String(), nullable=False),
+    sa.Column('reason', sa.String(), nullable=False),
+    sa.Column('replacement', sa.JSON(), nullable=True),
+    sa.Column('conditions', sa.JSON(), nullable=True),
+    sa.Column('detected_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['trip_id'], ['trips.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('trip_id', 'day', 'component_id', name='uq_trip_adaptations_component')
+    )
+    op.add_column('trips', sa.Column('viability_lease_owner', sa.String(), nullable=True))
+    op.add_column('trips', sa.Column('viability_lease_expires_at', sa.DateTime(), nullable=True))
+    op.add_column('trips', sa.Column('viability_checked_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_trips_in_progress', 'trips', ['id'], unique=False, postgresql_where=sa.text("status = 'IN_PROGRESS'"))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_trips_in_progress', table_name='trips')
+    op.drop_column('trips', 'viability_checked_at')
+    op.drop_column('trips', 'viability_lease_expires_at')
+    op.drop_column('trips', 'viability_lease_owner')
+    op.drop_table('trip_adaptations')
@@ -0,0 +1,46 @@
+"""Conversation forks
+
+Revision ID: d471dd37c10f
+Revises: 1ee9f14c6dc1
+Create Date: 2026-10-19 08:41:52.317604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd471dd37c10f'
+down_revision: Union[str, None] = '1ee9f14c6dc1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('conversations', sa.Column('parent_id', sa.UUID(), nullable=True))
+    op.add_column('conversations', sa.Column('fork_point_message_id', sa.UUID(), nullable=True))
+    op.create_foreign_key(
+        'conversations_parent_id_fkey',
+        'conversations',
+        'conversations',
+        ['parent_id'],
+        ['id'],
+    )
+    op.create_foreign_key(
+        'conversations_fork_point_message_id_fkey',
+        'conversations',
+        'messages',
+        ['fork_point_message_id'],
+        ['id'],
+    )
+    op.create_index(op.f('ix_conversations_parent_id'), 'conversations', ['parent_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_conversations_parent_id'), table_name='conversations')
+    op.drop_constraint('conversations_fork_point_message_id_fkey', 'conversations', type_='foreignkey')
+    op.drop_constraint('conversations_parent_id_fkey', 'conversations', type_='foreignkey')
+    op.drop_column('conversations', 'fork_point_message_id')
+    op.drop_column('conversations', 'parent_id')
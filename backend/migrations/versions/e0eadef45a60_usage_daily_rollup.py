@@ -0,0 +1,80 @@
+"""Daily usage rollup
+
+Revision ID: e0eadef45a60
+Revises: d471dd37c10f
+Create Date: 2026-10-19 10:27:08.661930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e0eadef45a60'
+down_revision: Union[str, None] = 'd471dd37c10f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('usage_daily',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('prompt_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('completion_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('cost_usd', sa.Numeric(precision=14, scale=6), nullable=False),
+    sa.Column('messages', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'model')
+    )
+    op.create_index(op.f('ix_usage_daily_day'), 'usage_daily', ['day'], unique=False)
+
+    # Backfill from the assistant messages already stored, priced as of this
+    # migration (USD per million tokens, see app/services/usage.py)
+    op.execute("""
+        WITH prices(model, prompt, completion) AS (
+            VALUES ('gemini-2.0-flash', 0.075, 0.30),
+                   ('gemini-2.5-flash', 0.15, 0.60),
+                   ('gemini-2.5-pro', 1.25, 5.00)
+        ), usage AS (
+            SELECT
+                c.user_id,
+                m.created_at::date AS day,
+                coalesce(m.llm_metadata->>'model', 'unknown') AS model,
+                coalesce((m.llm_metadata->>'prompt_tokens')::bigint, 0) AS prompt_tokens,
+                CASE
+                    WHEN coalesce((m.llm_metadata->>'prompt_tokens')::bigint, 0) = 0
+                     AND coalesce((m.llm_metadata->>'completion_tokens')::bigint, 0) = 0
+                    THEN coalesce((m.llm_metadata->>'tokens')::bigint, 0)
+                    ELSE coalesce((m.llm_metadata->>'completion_tokens')::bigint, 0)
+                END AS completion_tokens
+            FROM messages m
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE m.role = 'ASSISTANT'
+        )
+        INSERT INTO usage_daily (
+            user_id, day, model, prompt_tokens, completion_tokens, cost_usd, messages, updated_at
+        )
+        SELECT
+            u.user_id,
+            u.day,
+            u.model,
+            sum(u.prompt_tokens),
+            sum(u.completion_tokens),
+            coalesce(sum(u.prompt_tokens * p.prompt + u.completion_tokens * p.completion) / 1000000, 0),
+            count(*),
+            now() AT TIME ZONE 'utc'
+        FROM usage u
+        LEFT JOIN prices p ON p.model = u.model
+        WHERE u.prompt_tokens + u.completion_tokens > 0
+        GROUP BY u.user_id, u.day, u.model
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_usage_daily_day'), table_name='usage_daily')
+    op.drop_table('usage_daily')
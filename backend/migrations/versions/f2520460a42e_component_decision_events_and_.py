@@ -0,0 +1,55 @@
+"""Component decision events and preference weights
+
+Revision ID: f2520460a42e
+Revises: bfbbadda3fd2
+Create Date: 2026-10-19 11:48:13.092731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2520460a42e'
+down_revision: Union[str, None] = 'bfbbadda3fd2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_preference_weights',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('tag_sums', sa.JSON(), nullable=False),
+    sa.Column('price_sums', sa.JSON(), nullable=False),
+    sa.Column('timing_sums', sa.JSON(), nullable=False),
+    sa.Column('decisions', sa.Integer(), nullable=False),
+    sa.Column('last_event_id', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('component_decisions',
+    sa.Column('id', sa.BigInteger(), sa.Identity(always=False), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('trip_id', sa.UUID(), nullable=True),
+    sa.Column('component_id', sa.String(), nullable=False),
+    sa.Column('decision', sa.Enum('CHOSEN', 'VETOED', 'CONSIDERING', name='componentdecision'), nullable=False),
+    sa.Column('tags', sa.JSON(), nullable=True),
+    sa.Column('price_level', sa.Integer(), nullable=True),
+    sa.Column('time_slot', sa.String(), nullable=True),
+    sa.Column('reason', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['trip_id'], ['trips.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_component_decisions_user_id_id', 'component_decisions', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_component_decisions_user_id_id', table_name='component_decisions')
+    op.drop_table('component_decisions')
+    op.drop_table('user_preference_weights')
+    sa.Enum(name='componentdecision').drop(op.get_bind(), checkfirst=True)
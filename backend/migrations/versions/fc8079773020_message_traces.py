@@ -0,0 +1,79 @@
+"""Message traces for bulky LLM metadata
+
+Revision ID: fc8079773020
+Revises: f2520460a42e
+Create Date: 2026-10-19 15:42:08.371514
+
+"""
+from typing import Sequence, Union
+
+import json
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fc8079773020'
+down_revision: Union[str, None] = 'f2520460a42e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# app.services.message_traces.SUMMARY_KEYS at the time of this migration
+SUMMARY_KEYS = "ARRAY['model', 'tokens', 'prompt_tokens', 'completion_tokens', 'degraded', 'starter_cache']"
+
+
+def upgrade() -> None:
+    op.create_table('message_traces',
+    sa.Column('message_id', sa.UUID(), nullable=False),
+    sa.Column('encoding', sa.String(length=8), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('raw_bytes', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('message_id')
+    )
+    # Everything but the summary moves out of the messages rows, uncompressed.
+    # JSON null, arrays and scalars stay put; the CASE keeps `-` off them even
+    # when the planner evaluates it before the WHERE
+    op.execute(f"""
+        INSERT INTO message_traces (message_id, encoding, payload, raw_bytes, created_at)
+        SELECT id, 'json', convert_to(trace::text, 'UTF8'), octet_length(trace::text), created_at
+        FROM (
+            SELECT id, created_at, CASE
+                WHEN jsonb_typeof(llm_metadata::jsonb) = 'object' THEN llm_metadata::jsonb - {SUMMARY_KEYS}
+            END AS trace
+            FROM messages
+            WHERE llm_metadata IS NOT NULL AND jsonb_typeof(llm_metadata::jsonb) = 'object'
+        ) AS split
+        WHERE trace <> '{{}}'::jsonb
+    """)
+    op.execute(f"""
+        UPDATE messages
+        SET llm_metadata = (
+            SELECT COALESCE(jsonb_object_agg(key, value), '{{}}'::jsonb)
+            FROM jsonb_each(messages.llm_metadata::jsonb)
+            WHERE key = ANY({SUMMARY_KEYS})
+        )::json
+        WHERE id IN (SELECT message_id FROM message_traces)
+          AND jsonb_typeof(llm_metadata::jsonb) = 'object'
+    """)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    traces = bind.execute(sa.text(
+        "SELECT t.message_id, t.encoding, t.payload, m.llm_metadata "
+        "FROM message_traces t JOIN messages m ON m.id = t.message_id"
+    ))
+    for message_id, encoding, payload, summary in traces.all():
+        payload = bytes(payload)
+        if encoding == 'zlib':
+            payload = zlib.decompress(payload)
+        metadata = {**json.loads(payload), **(summary or {})}
+        bind.execute(
+            sa.text("UPDATE messages SET llm_metadata = CAST(:metadata AS json) WHERE id = :id"),
+            {"metadata": json.dumps(metadata), "id": message_id}
+        )
+    op.drop_table('message_traces')
\ No newline at end of file
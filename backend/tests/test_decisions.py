@@ -0,0 +1,55 @@
+import asyncio
+from uuid import uuid4
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.models import ComponentDecision
+from app.services.decisions import DecisionRecorder
+
+
+class StubRecorder(DecisionRecorder):
+    """Keeps written batches in memory; a batch holding a `bad` component fails like a foreign key would."""
+
+    def __init__(self, error=IntegrityError, **kwargs):
+        super().__init__(**kwargs)
+        self.error = error
+        self.written = []
+
+    async def _write(self, events):
+        if any(event["component_id"] == "bad" for event in events):
+            raise self.error("INSERT INTO component_decision_events ...", {}, Exception("trip is gone"))
+        self.written.append([event["component_id"] for event in events])
+
+
+def record(recorder, component_id):
+    return recorder.record(uuid4(), component_id, ComponentDecision.CHOSEN)
+
+
+async def test_events_arriving_together_share_a_batch():
+    recorder = StubRecorder(flush_interval=0.01)
+
+    await asyncio.gather(*(record(recorder, name) for name in ("a", "b", "c")))
+
+    assert recorder.written == [["a", "b", "c"]]
+
+
+async def test_a_rejected_event_fails_only_its_own_caller():
+    recorder = StubRecorder(flush_interval=0.01)
+
+    results = await asyncio.gather(
+        *(record(recorder, name) for name in ("a", "bad", "c")),
+        return_exceptions=True,
+    )
+
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], IntegrityError)
+    assert recorder.written == [["a"], ["c"]]
+
+
+async def test_an_unavailable_database_fails_the_batch_without_retrying():
+    recorder = StubRecorder(error=OperationalError, flush_interval=0.01)
+
+    results = await asyncio.gather(*(record(recorder, name) for name in ("a", "bad")), return_exceptions=True)
+
+    assert all(isinstance(result, OperationalError) for result in results)
+    assert recorder.written == []
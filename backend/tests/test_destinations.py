@@ -0,0 +1,55 @@
+import asyncio
+import json
+import logging
+
+from app.schemas.destination import Destination
+from app.services.destinations import DestinationCatalog, DestinationIndex, load_catalog
+
+
+def make_index():
+    return DestinationIndex([
+        Destination(id="porto", name="Porto", popularity=78, aliases=["Oporto"]),
+        Destination(id="lisbon", name="Lisbon", popularity=90, aliases=["Lisboa"]),
+        Destination(id="munich", name="Munich", popularity=70, aliases=["München"]),
+    ])
+
+
+def test_prefix_matches_names_and_aliases():
+    index = make_index()
+
+    assert index.search("lis")[0].id == "lisbon"
+    assert index.search("munch")[0].id == "munich"
+    assert index.search("Porto")[0].id == "porto"
+
+
+def test_fuzzy_matches_misspelled_names_and_aliases():
+    index = make_index()
+
+    assert index.search("Lisbonn")[0].id == "lisbon"
+    # Too far from "Munich" to match by name; only the alias is close
+    assert [r.id for r in index.search("Munchenn")] == ["munich"]
+
+
+def test_load_catalog(tmp_path):
+    path = tmp_path / "destinations.json"
+    path.write_text(json.dumps({"destinations": [{"id": "rome", "name": "Rome"}]}))
+    assert [d.id for d in load_catalog(str(path))] == ["rome"]
+
+    path.write_text("")
+    assert load_catalog(str(path)) == []
+
+
+async def test_failed_reload_is_logged_and_keeps_the_index(tmp_path, caplog):
+    path = tmp_path / "destinations.json"
+    path.write_text(json.dumps([{"id": "rome", "name": "Rome"}]))
+    catalog = DestinationCatalog(path=str(path), reload_interval=0)
+    catalog.load()
+
+    path.write_text("{not json")
+    with caplog.at_level(logging.ERROR):
+        assert catalog.search("rome")[0].id == "rome"
+        await asyncio.gather(catalog._reload_task, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    assert "Reloading destination catalog" in caplog.text
+    assert catalog.index.search("rome")[0].id == "rome"
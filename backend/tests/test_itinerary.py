@@ -0,0 +1,89 @@
+from datetime import time
+
+from app.schemas.itinerary import ItineraryStop
+from app.services.itinerary import ItineraryOptimizer, _to_time
+
+
+def component(lat, lng, **extra):
+    return {"location": {"lat": lat, "lng": lng}, **extra}
+
+
+def test_components_without_ids_are_kept():
+    optimizer = ItineraryOptimizer()
+    itinerary = {"days": [{"components": [
+        component(48.86, 2.29, name="Eiffel Tower"),
+        component(48.86, 2.34, name="Louvre"),
+        component(48.85, 2.35, id="nd", name="Notre-Dame"),
+        {"name": "Dinner, somewhere"},
+    ]}]}
+
+    day = optimizer.optimize_itinerary(itinerary)["days"][0]
+
+    assert sorted(c["name"] for c in day["components"]) == [
+        "Dinner, somewhere", "Eiffel Tower", "Louvre", "Notre-Dame",
+    ]
+    assert day["components"][-1]["name"] == "Dinner, somewhere"
+    assert day["unscheduled"] == []
+
+
+def test_unscheduled_components_are_reported_by_id():
+    optimizer = ItineraryOptimizer()
+    itinerary = {"days": [{"components": [
+        component(48.86, 2.29, id="a"),
+        component(48.86, 2.34, id="closed", timing={"opens_at": "06:00", "closes_at": "07:00"}),
+    ]}]}
+
+    day = optimizer.optimize_itinerary(itinerary)["days"][0]
+
+    assert day["unscheduled"] == ["closed"]
+    assert [c["id"] for c in day["components"]] == ["a", "closed"]
+
+
+def test_first_stop_without_start_respects_closing_time():
+    optimizer = ItineraryOptimizer(day_start=time(9))
+    stops = [
+        # Opens earliest, but has closed before the day starts
+        ItineraryStop(id="bakery", latitude=48.85, longitude=2.35, opens_at=time(5), closes_at=time(8)),
+        ItineraryStop(id="museum", latitude=48.86, longitude=2.34, opens_at=time(10)),
+    ]
+
+    plan = optimizer.optimize_day(stops)
+
+    assert [stop.id for stop in plan.stops] == ["museum"]
+    assert plan.unscheduled == ["bakery"]
+    assert plan.stops[0].arrival == time(10)
+
+
+def test_two_opt_uncrosses_the_route():
+    optimizer = ItineraryOptimizer()
+    # Corners of a square, visited in a crossing order from the start
+    stops = [
+        ItineraryStop(id=name, latitude=lat, longitude=lng, duration_minutes=0)
+        for name, lat, lng in [("ne", 48.9, 2.4), ("sw", 48.8, 2.3), ("se", 48.8, 2.4), ("nw", 48.9, 2.3)]
+    ]
+
+    plan = optimizer.optimize_day(stops, start=(48.9, 2.3))
+
+    assert [stop.id for stop in plan.stops] in (["nw", "ne", "se", "sw"], ["nw", "sw", "se", "ne"])
+
+
+def test_times_past_midnight_wrap():
+    assert _to_time(23 * 60 + 30) == time(23, 30)
+    assert _to_time(24 * 60 + 15) == time(0, 15)
+
+
+def test_fractional_durations_are_rounded():
+    optimizer = ItineraryOptimizer(day_start=time(9))
+    itinerary = {"days": [{"components": [
+        component(48.86, 2.34, id="louvre", duration_minutes=90.0),
+        component(48.85, 2.35, id="cafe", timing={"duration_minutes": "44.6"}),
+    ]}]}
+
+    day = optimizer.optimize_itinerary(itinerary)["days"][0]
+
+    def minutes(value):
+        hours, mins = value.split(":")
+        return int(hours) * 60 + int(mins)
+
+    stays = {c["id"]: minutes(c["departure"]) - minutes(c["arrival"]) for c in day["components"]}
+    assert stays == {"louvre": 90, "cafe": 45}
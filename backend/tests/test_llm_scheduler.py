@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_scheduler import LLMScheduler, Priority
+
+
+def make_scheduler(**kwargs):
+    options = dict(
+        max_concurrency=2,
+        interactive_slots=1,
+        tokens_per_minute=1000,
+        interactive_token_reserve=0.0,
+        max_preemptions=3,
+    )
+    return LLMScheduler(**{**options, **kwargs})
+
+
+async def call_until(event, result="done"):
+    await event.wait()
+    return result
+
+
+async def until(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0)
+    raise AssertionError("condition not reached")
+
+
+async def until_running(scheduler, count):
+    await until(lambda: len(scheduler._running) == count)
+
+
+async def test_interactive_calls_go_first():
+    scheduler = make_scheduler(max_concurrency=1, interactive_slots=0)
+    release = asyncio.Event()
+    order = []
+
+    async def record(name):
+        order.append(name)
+
+    blocker = asyncio.create_task(scheduler.run(lambda: call_until(release), tokens=10))
+    await until_running(scheduler, 1)
+    queued = [
+        asyncio.create_task(scheduler.run(lambda: record("background"), priority=Priority.BACKGROUND, tokens=10)),
+        asyncio.create_task(scheduler.run(lambda: record("interactive"), tokens=10)),
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(blocker, *queued)
+
+    assert order == ["interactive", "background"]
+
+
+async def test_preempted_call_is_refunded_and_retried():
+    scheduler = make_scheduler()
+    background_done, first_done, second_done = asyncio.Event(), asyncio.Event(), asyncio.Event()
+
+    background = asyncio.create_task(scheduler.run(
+        lambda: call_until(background_done, "summary"), priority=Priority.BACKGROUND, tokens=400
+    ))
+    await until_running(scheduler, 1)
+    first = asyncio.create_task(scheduler.run(lambda: call_until(first_done), tokens=100))
+    await until_running(scheduler, 2)
+    assert scheduler._tokens == pytest.approx(500, abs=5)
+
+    # Both slots are busy: the background call makes way for this one
+    second = asyncio.create_task(scheduler.run(lambda: call_until(second_done), tokens=100))
+    await until(lambda: scheduler.queue_depth(Priority.BACKGROUND) == 1)
+    await until_running(scheduler, 2)
+
+    # Only the two interactive calls are charged while the background one waits
+    assert scheduler._tokens == pytest.approx(800, abs=5)
+
+    first_done.set()
+    second_done.set()
+    await asyncio.gather(first, second)
+    await until_running(scheduler, 1)
+
+    # Charged once more on restart, not twice
+    assert scheduler._tokens == pytest.approx(400, abs=5)
+
+    background_done.set()
+    assert await background == "summary"
+
+
+async def test_settles_actual_tokens():
+    scheduler = make_scheduler()
+
+    async def reply():
+        return {"tokens": 50}
+
+    await scheduler.run(reply, tokens=300, actual_tokens=lambda result: result["tokens"])
+
+    assert scheduler._tokens == pytest.approx(950, abs=5)
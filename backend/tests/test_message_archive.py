@@ -0,0 +1,86 @@
+import gzip
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from app.services.message_archive import (
+    ArchiveMismatch,
+    MessageArchiver,
+    _finish_file,
+    _read_segment,
+    _scrub_segment,
+    _SegmentWriter,
+)
+
+
+class NothingArchived:
+    async def scalar(self, statement):
+        return None
+
+
+async def write(path, conversations):
+    writer = _SegmentWriter(str(path))
+    for conversation_id, lines in conversations:
+        for line in lines:
+            await writer.add(conversation_id, line)
+    await writer.close()
+    return writer
+
+
+async def test_segments_are_verified_and_read_back(tmp_path):
+    first, second = uuid4(), uuid4()
+    writer = await write(tmp_path / "export.tmp", [(first, [b"a\n", b"b\n"]), (second, [b"c\n"])])
+
+    _finish_file(str(tmp_path / "export.tmp"), str(tmp_path / "month.jsonl.gz"), writer.segments, writer.checksums)
+
+    path = str(tmp_path / "month.jsonl.gz")
+    assert [_read_segment(path, s["offset"], s["length"]) for s in writer.segments] == [[b"a", b"b"], [b"c"]]
+    assert gzip.decompress(open(path, "rb").read()) == b"a\nb\nc\n"
+
+
+async def test_a_segment_that_does_not_read_back_is_refused(tmp_path):
+    writer = await write(tmp_path / "export.tmp", [(uuid4(), [b"a\n"])])
+    writer.segments[0]["rows"] = 2
+
+    with pytest.raises(ArchiveMismatch):
+        _finish_file(str(tmp_path / "export.tmp"), str(tmp_path / "month.jsonl.gz"), writer.segments, writer.checksums)
+    assert not (tmp_path / "month.jsonl.gz").exists()
+
+
+async def test_a_purged_segment_is_erased_in_place(tmp_path):
+    kept, purged, large = uuid4(), uuid4(), uuid4()
+    big = [f"{i:08x}{uuid4().hex * 4}\n".encode() for i in range(2000)]
+    writer = await write(tmp_path / "export.tmp", [(kept, [b"a\n"]), (purged, [b"secret\n"]), (large, big)])
+    path = str(tmp_path / "month.jsonl.gz")
+    _finish_file(str(tmp_path / "export.tmp"), path, writer.segments, writer.checksums)
+    size = (tmp_path / "month.jsonl.gz").stat().st_size
+
+    _scrub_segment(path, writer.segments[1]["offset"], writer.segments[1]["length"])
+    _scrub_segment(path, writer.segments[2]["offset"], writer.segments[2]["length"])
+
+    data = open(path, "rb").read()
+    assert len(data) == size and b"secret" not in gzip.decompress(data)
+    assert gzip.decompress(data) == b"a\n"
+    assert _read_segment(path, writer.segments[0]["offset"], writer.segments[0]["length"]) == [b"a"]
+    assert _read_segment(path, writer.segments[1]["offset"], writer.segments[1]["length"]) == []
+
+
+async def test_archiving_needs_an_absolute_directory(tmp_path):
+    assert not MessageArchiver(archive_dir="").archiving
+    assert not MessageArchiver(archive_dir="archive/messages").archiving
+    with pytest.raises(ValueError):
+        await MessageArchiver(archive_dir="archive/messages").archive_partition(
+            "messages_2025_01", datetime(2025, 1, 1), datetime(2025, 2, 1)
+        )
+    assert MessageArchiver(archive_dir=str(tmp_path)).archiving
+
+
+async def test_old_conversations_are_checked_even_when_nothing_was_archived():
+    # Another worker may archive the month right after this one looked
+    archiver = MessageArchiver(archive_dir="/srv/archive", retention_months=12)
+
+    archived_up_to = await archiver._archived_up_to(NothingArchived())
+
+    assert archived_up_to == archiver._cutoff(datetime.utcnow())
+    assert datetime(2000, 1, 1) < archived_up_to
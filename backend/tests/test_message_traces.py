@@ -0,0 +1,48 @@
+from datetime import datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+from app.models import MessageRole
+from app.schemas.conversation import Message as MessageSchema
+from app.services.message_traces import encode_trace, load_metadata
+
+
+class Rows:
+    """Stands in for a session: every query returns the given rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def execute(self, statement):
+        return SimpleNamespace(all=lambda: self.rows)
+
+
+async def test_trace_is_merged_under_the_summary():
+    message_id = uuid4()
+    trace = encode_trace(message_id, {"raw_prompt": "p" * 2000, "model": "stale"})
+
+    metadata = await load_metadata(
+        Rows([(message_id, {"model": "gemini-2.5-flash"}, trace.encoding, trace.payload)]),
+        [message_id],
+    )
+
+    assert metadata[message_id] == {"raw_prompt": "p" * 2000, "model": "gemini-2.5-flash"}
+
+
+async def test_legacy_non_object_metadata_is_returned_as_is():
+    listed, scalar, missing = uuid4(), uuid4(), uuid4()
+
+    metadata = await load_metadata(
+        Rows([(listed, ["a", "b"], None, None), (scalar, "note", None, None), (missing, None, None, None)]),
+        [listed, scalar, missing],
+    )
+
+    assert metadata == {listed: ["a", "b"], scalar: "note", missing: {}}
+    message = SimpleNamespace(
+        id=listed,
+        conversation_id=uuid4(),
+        role=MessageRole.ASSISTANT,
+        content="hi",
+        created_at=datetime.utcnow(),
+    )
+    assert MessageSchema.from_model(message, llm_metadata=metadata[listed]).llm_metadata == ["a", "b"]
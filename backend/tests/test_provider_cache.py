@@ -0,0 +1,166 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+from app.services import provider_cache as provider_cache_module
+from app.services.provider_cache import ProviderCache, ProviderPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeProvider:
+    """Local provider: answers with a call counter, optionally after a delay or with an error."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self, city):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("provider down")
+        return {"city": city, "version": self.calls}
+
+
+class FakeRedis:
+    """Just the GET/SET the cache uses, in memory."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, px=None):
+        self.values[key] = value
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(
+        provider_cache_module,
+        "time",
+        types.SimpleNamespace(time=clock.time, monotonic=time.monotonic)
+    )
+    return clock
+
+
+def make_cache(provider, redis=None, **kwargs):
+    cache = ProviderCache(redis_url="redis://fake" if redis else None, **kwargs)
+    cache._redis = redis
+    cache.register("weather", provider, ProviderPolicy(ttl=60, stale_ttl=120))
+    return cache
+
+
+async def settle(cache):
+    """Wait for background refreshes to finish."""
+    while cache._refreshing:
+        await asyncio.gather(*cache._refreshing.values(), return_exceptions=True)
+
+
+async def test_fresh_values_are_served_from_cache(clock):
+    provider = FakeProvider()
+    cache = make_cache(provider)
+
+    first = await cache.get("weather", city="Lisbon")
+    clock.advance(59)
+    again = await cache.get("weather", city="  lisbon ")
+
+    assert first == again == {"city": "Lisbon", "version": 1}
+    assert provider.calls == 1
+
+
+async def test_expired_values_are_fetched_again(clock):
+    provider = FakeProvider()
+    cache = make_cache(provider)
+
+    await cache.get("weather", city="Lisbon")
+    clock.advance(60 + 120)
+
+    assert (await cache.get("weather", city="Lisbon"))["version"] == 2
+    assert provider.calls == 2
+
+
+async def test_stale_values_are_served_while_refreshed(clock):
+    provider = FakeProvider(delay=0.05)
+    cache = make_cache(provider)
+    await cache.get("weather", city="Kyoto")
+    clock.advance(90)
+
+    started = time.perf_counter()
+    stale = await cache.get("weather", city="Kyoto")
+
+    assert stale["version"] == 1
+    assert time.perf_counter() - started < 0.04
+    await settle(cache)
+    assert (await cache.get("weather", city="Kyoto"))["version"] == 2
+    assert provider.calls == 2
+
+
+async def test_failed_refresh_keeps_serving_stale(clock):
+    provider = FakeProvider()
+    cache = make_cache(provider)
+    await cache.get("weather", city="Hanoi")
+    clock.advance(90)
+    provider.fail = True
+
+    assert (await cache.get("weather", city="Hanoi"))["version"] == 1
+    await settle(cache)
+    assert (await cache.get("weather", city="Hanoi"))["version"] == 1
+
+
+async def test_concurrent_misses_share_one_call(clock):
+    provider = FakeProvider(delay=0.02)
+    cache = make_cache(provider)
+
+    results = await asyncio.gather(*(cache.get("weather", city="Oaxaca") for _ in range(20)))
+
+    assert provider.calls == 1
+    assert all(result == results[0] for result in results)
+
+
+async def test_least_recently_used_entries_are_evicted(clock):
+    provider = FakeProvider()
+    cache = make_cache(provider, max_entries=2)
+
+    for city in ("A", "B", "A", "C"):
+        await cache.get("weather", city=city)
+    assert provider.calls == 3
+
+    await cache.get("weather", city="A")
+    await cache.get("weather", city="C")
+    assert provider.calls == 3
+    await cache.get("weather", city="B")
+    assert provider.calls == 4
+
+
+async def test_stale_shared_entry_is_served_and_refreshed(clock):
+    redis = FakeRedis()
+    provider = FakeProvider(delay=0.05)
+    await make_cache(provider, redis=redis).get("weather", city="Tbilisi")
+    clock.advance(90)
+
+    # Another worker, with nothing local: the stale Redis entry is used at once
+    other = make_cache(provider, redis=redis)
+    started = time.perf_counter()
+    stale = await other.get("weather", city="Tbilisi")
+
+    assert stale["version"] == 1
+    assert time.perf_counter() - started < 0.04
+    await settle(other)
+    assert provider.calls == 2
+    assert (await other.get("weather", city="Tbilisi"))["version"] == 2
@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from app.schemas.ranking import PreferenceWeights, RankingCandidate
+from app.services.ranking import RankingEngine, rank_reference
+
+WEIGHTS = PreferenceWeights(
+    tag_weights={"beach": 0.8, "museum": -0.5, "food": 0.3},
+    price_weights={0: 0.2, 4: -0.6},
+    timing_weights={"evening": 0.4, "morning": -0.1},
+)
+
+
+def candidate(id, *tags, price_level=0, time_slot=None):
+    return RankingCandidate(id=id, tags=list(tags), price_level=price_level, time_slot=time_slot)
+
+
+def test_scores_add_tag_price_and_timing_weights():
+    engine = RankingEngine()
+    candidates = [
+        candidate("beach-dinner", "beach", "food", price_level=0, time_slot="evening"),
+        candidate("museum", "museum", "museum", price_level=4, time_slot="morning"),
+        candidate("unknown", "karaoke", price_level=9, time_slot="brunch"),
+    ]
+
+    scores = engine.score(engine.encode(candidates), WEIGHTS)
+
+    # Repeated tags count once; out-of-range prices clamp to the nearest level; unknown slots score nothing
+    assert scores.tolist() == pytest.approx([0.8 + 0.3 + 0.2 + 0.4, -0.5 - 0.6 - 0.1, -0.6])
+
+
+def test_top_k_is_best_first_and_skips_excluded():
+    engine = RankingEngine()
+    encoded = engine.encode([
+        candidate("museum", "museum"),
+        candidate("beach", "beach"),
+        candidate("food", "food"),
+        candidate("beach-evening", "beach", time_slot="evening"),
+    ])
+
+    assert [c.id for c in engine.top_k(encoded, WEIGHTS, k=3)] == ["beach-evening", "beach", "food"]
+    assert [c.id for c in engine.top_k(encoded, WEIGHTS, k=2, exclude_ids={"beach-evening"})] == ["beach", "food"]
+    assert [c.id for c in engine.top_k(encoded, WEIGHTS, k=10, exclude_ids={"beach", "food"})] == [
+        "beach-evening", "museum"
+    ]
+    assert engine.top_k(encoded, WEIGHTS, k=0) == []
+
+
+def test_empty_inputs():
+    engine = RankingEngine()
+
+    assert engine.rank([], WEIGHTS) == []
+    assert [c.score for c in engine.rank([candidate("a", "beach")], PreferenceWeights())] == [0.0]
+
+
+def test_matches_the_reference_ranking():
+    generator = random.Random(7)
+    tags = [f"tag{i}" for i in range(40)]
+    slots = ["morning", "afternoon", "evening", "night", None]
+    candidates = [
+        candidate(
+            f"c{i}",
+            *generator.sample(tags, 4),
+            price_level=generator.randrange(5),
+            time_slot=generator.choice(slots),
+        )
+        for i in range(2000)
+    ]
+    weights = PreferenceWeights(
+        tag_weights={tag: generator.uniform(-1, 1) for tag in tags},
+        price_weights={level: generator.uniform(-1, 1) for level in range(5)},
+        timing_weights={slot: generator.uniform(-1, 1) for slot in slots if slot},
+    )
+
+    ranked = RankingEngine().rank(candidates, weights, k=20)
+    expected = rank_reference(candidates, weights, k=20)
+
+    assert [c.id for c in ranked] == [c.id for c in expected]
+    assert [c.score for c in ranked] == pytest.approx([c.score for c in expected], abs=1e-5)
@@ -0,0 +1,177 @@
+import asyncio
+
+from app.services.tools import ToolCall, ToolExecutor, ToolStatus
+
+
+class StubTools:
+    """Local stand-ins for tools, counting how often each one really runs."""
+
+    def __init__(self):
+        self.calls = {}
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    async def weather(self, city, delay=0.01):
+        self._count("weather")
+        await asyncio.sleep(delay)
+        return {"city": city, "forecast": "sunny"}
+
+    async def slow(self, seconds):
+        self._count("slow")
+        await asyncio.sleep(seconds)
+        return "late"
+
+    async def broken(self):
+        self._count("broken")
+        raise ValueError("provider unavailable")
+
+    def executor(self, **kwargs):
+        return ToolExecutor(
+            {"weather": self.weather, "slow": self.slow, "broken": self.broken},
+            **kwargs
+        )
+
+
+async def test_identical_calls_in_a_batch_run_once():
+    stubs = StubTools()
+    executor = stubs.executor()
+    calls = [ToolCall(name="weather", arguments={"city": "Lisbon"})] * 3
+
+    results = await executor.run(calls, deadline=1)
+
+    assert stubs.calls == {"weather": 1}
+    assert [r.status for r in results] == [ToolStatus.OK] * 3
+    assert all(r.value == {"city": "Lisbon", "forecast": "sunny"} for r in results)
+
+
+async def test_concurrent_batches_join_the_running_call():
+    stubs = StubTools()
+    executor = stubs.executor()
+    call = ToolCall(name="weather", arguments={"city": "Porto", "delay": 0.05})
+
+    first, second = await asyncio.gather(executor.run([call], deadline=1), executor.run([call], deadline=1))
+
+    assert stubs.calls == {"weather": 1}
+    assert first[0].value == second[0].value
+
+
+async def test_results_are_cached_by_arguments():
+    stubs = StubTools()
+    executor = stubs.executor()
+
+    await executor.run([ToolCall(name="weather", arguments={"city": "Rome"})], deadline=1)
+    again = await executor.run([ToolCall(name="weather", arguments={"city": "Rome"})], deadline=1)
+    other = await executor.run([ToolCall(name="weather", arguments={"city": "Oslo"})], deadline=1)
+
+    assert again[0].cached and again[0].status == ToolStatus.OK
+    assert again[0].duration_ms == 0
+    assert not other[0].cached
+    assert stubs.calls == {"weather": 2}
+
+
+async def test_cache_expires_and_can_be_disabled():
+    stubs = StubTools()
+    call = ToolCall(name="weather", arguments={"city": "Paris", "delay": 0})
+
+    expiring = stubs.executor(cache_ttl=0.01)
+    await expiring.run([call], deadline=1)
+    await asyncio.sleep(0.02)
+    assert not (await expiring.run([call], deadline=1))[0].cached
+
+    uncached = stubs.executor(cache_ttl=0)
+    await uncached.run([call], deadline=1)
+    assert not (await uncached.run([call], deadline=1))[0].cached
+    assert stubs.calls == {"weather": 4}
+
+
+async def test_cache_evicts_least_recently_used():
+    stubs = StubTools()
+    executor = stubs.executor(max_cache_entries=2)
+    for city in ("A", "B", "A", "C"):
+        await executor.run([ToolCall(name="weather", arguments={"city": city, "delay": 0})], deadline=1)
+
+    hits = await executor.run(
+        [ToolCall(name="weather", arguments={"city": city, "delay": 0}) for city in ("A", "B", "C")],
+        deadline=1
+    )
+
+    assert [r.cached for r in hits] == [True, False, True]
+
+
+async def test_deadline_returns_partial_results():
+    stubs = StubTools()
+    executor = stubs.executor()
+
+    results = await executor.run(
+        [
+            ToolCall(name="weather", arguments={"city": "Madrid"}),
+            ToolCall(name="slow", arguments={"seconds": 5}),
+        ],
+        deadline=0.1
+    )
+
+    assert results[0].status == ToolStatus.OK
+    assert results[1].status == ToolStatus.TIMEOUT
+    assert results[1].error == "Deadline exceeded"
+    # Nobody else waits on the slow call, so it is cancelled rather than left running
+    await asyncio.sleep(0)
+    assert not executor._in_flight
+
+
+async def test_duration_is_measured_per_call():
+    stubs = StubTools()
+    executor = stubs.executor()
+
+    fast, slow = await executor.run(
+        [
+            ToolCall(name="weather", arguments={"city": "Fast", "delay": 0}),
+            ToolCall(name="weather", arguments={"city": "Slow", "delay": 0.2}),
+        ],
+        deadline=1
+    )
+
+    assert fast.duration_ms < 100
+    assert slow.duration_ms >= 200
+
+
+async def test_errors_and_unknown_tools_are_reported_per_call():
+    stubs = StubTools()
+    executor = stubs.executor()
+
+    results = await executor.run(
+        [
+            ToolCall(name="broken"),
+            ToolCall(name="teleport", arguments={"to": "Mars"}),
+            ToolCall(name="weather", arguments={"city": "Athens"}),
+        ],
+        deadline=1
+    )
+
+    assert results[0].status == ToolStatus.ERROR
+    assert results[0].error == "provider unavailable"
+    assert results[1].status == ToolStatus.ERROR
+    assert results[1].error == "Unknown tool: teleport"
+    assert results[2].status == ToolStatus.OK
+    # Failures aren't cached
+    await executor.run([ToolCall(name="broken")], deadline=1)
+    assert stubs.calls["broken"] == 2
+
+
+async def test_invalid_arguments_fail_only_their_call():
+    stubs = StubTools()
+    executor = stubs.executor()
+    shared = ToolCall(name="slow", arguments={"seconds": 0.05})
+    running = asyncio.create_task(executor.run([shared], deadline=0.01))
+    await asyncio.sleep(0)
+
+    results = await executor.run([
+        shared,
+        ToolCall(name="weather", arguments={"town": "Lisbon"}),
+        ToolCall(name="weather", arguments={"city": "Lisbon"}),
+    ], deadline=1)
+    await running
+
+    assert [r.status for r in results] == [ToolStatus.OK, ToolStatus.ERROR, ToolStatus.OK]
+    assert "town" in results[1].error
+    assert executor._in_flight == {}
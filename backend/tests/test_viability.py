@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+
+from app.services.provider_cache import ProviderCache, ProviderPolicy
+from app.services.viability import ViabilityScheduler
+
+
+async def storm(location, day):
+    return {"disrupted": True, "reason": "storm", "tags": ["outdoor"]}
+
+
+def make_scheduler():
+    cache = ProviderCache(redis_url=None)
+    cache.register("weather", storm, ProviderPolicy(ttl=60))
+    return ViabilityScheduler(cache=cache, worker="test")
+
+
+def trip(*days):
+    return SimpleNamespace(id=uuid4(), destination="Lisbon", itinerary={"days": list(days)})
+
+
+def day(offset, *components):
+    return {"date": (datetime.utcnow().date() + timedelta(days=offset)).isoformat(), "components": list(components)}
+
+
+def outdoor(**extra):
+    return {"tags": ["outdoor"], "location": {"name": "Belém"}, **extra}
+
+
+async def test_components_are_adapted_once_per_id():
+    scheduler = make_scheduler()
+    planned = trip(day(1, outdoor(id="tower"), outdoor(id="tower"), outdoor(id="park"), {"id": "museum"}))
+
+    adaptations = await scheduler._check([planned], ["weather"])
+
+    assert sorted(row["component_id"] for row in adaptations) == ["park", "tower"]
+
+
+async def test_components_without_an_id_are_skipped():
+    scheduler = make_scheduler()
+    planned = trip(day(1, outdoor(), outdoor(name="picnic"), outdoor(id="beach")))
+
+    adaptations = await scheduler._check([planned], ["weather"])
+
+    assert [row["component_id"] for row in adaptations] == ["beach"]
+
+
+async def test_malformed_itinerary_only_skips_its_trip():
+    scheduler = make_scheduler()
+    broken = trip({"date": "next tuesday", "components": [outdoor(id="tower")]})
+    fine = trip(day(2, outdoor(id="beach")))
+
+    adaptations = await scheduler._check([broken, fine], ["weather"])
+
+    assert [(row["trip_id"], row["component_id"]) for row in adaptations] == [(fine.id, "beach")]
+
+
+async def test_malformed_provider_answers_and_backups_are_ignored():
+    async def weather(location, day):
+        if location == "sintra":
+            return ["storm"]
+        return {"disrupted": True, "reason": "storm", "tags": "outdoor"}
+
+    cache = ProviderCache(redis_url=None)
+    cache.register("weather", weather, ProviderPolicy(ttl=60))
+    scheduler = ViabilityScheduler(cache=cache, worker="test")
+    planned = trip(day(
+        1,
+        outdoor(id="palace", location={"name": "Sintra"}),
+        outdoor(id="tower", backups=["museum", {"name": "gallery", "location": "Belém"}, {"name": "aquarium"}]),
+    ))
+
+    adaptations = await scheduler._check([planned], ["weather"])
+
+    assert [(row["component_id"], row["replacement"]) for row in adaptations] == [
+        ("tower", {"name": "gallery", "location": "Belém"})
+    ]